@@ -0,0 +1,43 @@
+"""Create kline_coverage table for the persistent gap index.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+
+Stores contiguous filled open_time ranges per (symbol_id, bar_interval) so
+internal gap detection no longer scans every kline row. Rows are built lazily
+on the first gap lookup of each series, so no backfill is needed here.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "kline_coverage",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("symbol_id", sa.Integer(), nullable=False),
+        sa.Column("bar_interval", sa.String(length=8), nullable=False),
+        sa.Column("start_time", sa.Integer(), nullable=False),
+        sa.Column("end_time", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["symbol_id"], ["symbols.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "idx_kline_coverage_series",
+        "kline_coverage",
+        ["symbol_id", "bar_interval", "start_time"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_kline_coverage_series", table_name="kline_coverage")
+    op.drop_table("kline_coverage")
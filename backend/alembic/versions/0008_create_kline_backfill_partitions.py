@@ -0,0 +1,40 @@
+"""Create kline_backfill_partitions table for resumable backfills.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+
+One row per time-range partition of an in-flight historical backfill, holding
+the next open_time to fetch. Rows are removed once the backfill completes.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "kline_backfill_partitions",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("symbol_id", sa.Integer(), nullable=False),
+        sa.Column("bar_interval", sa.String(length=8), nullable=False),
+        sa.Column("range_start", sa.Integer(), nullable=False),
+        sa.Column("range_end", sa.Integer(), nullable=False),
+        sa.Column("cursor_time", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["symbol_id"], ["symbols.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "symbol_id", "bar_interval", "range_start", name="uk_backfill_partition"
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("kline_backfill_partitions")
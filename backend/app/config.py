@@ -38,10 +38,26 @@ class Settings:
     REDIS_PUBSUB_CHANNELS = (
         "market:ticker",
         "market:kline",
+        "market:kline_stream",
         "market:cmd_kline_sub",
+        "market:cmd_kline_unsub",
         "market:cmd_ticker_sub",
     )
 
+    # ── Client WebSocket fan-out ──
+    # Max seconds one client may take to accept a broadcast frame before it is dropped.
+    WS_SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "5"))
+    # Per-client outbound queue bound (frames after conflation), and how long it
+    # may stay full before the client is disconnected as too slow.
+    WS_OUTBOX_MAX_FRAMES = int(os.getenv("WS_OUTBOX_MAX_FRAMES", "256"))
+    WS_SLOW_CLIENT_DROP_S = float(os.getenv("WS_SLOW_CLIENT_DROP_S", "10"))
+    # Ticker updates are merged for this long and sent as one frame per client (0 = no window).
+    WS_TICKER_CONFLATE_MS = int(os.getenv("WS_TICKER_CONFLATE_MS", "500"))
+    # Kline rooms one multiplexed /market/ws connection may join.
+    WS_MUX_MAX_KLINE_ROOMS = int(os.getenv("WS_MUX_MAX_KLINE_ROOMS", "20"))
+    # Clients that received nothing for this long get a {"type": "heartbeat"} frame.
+    WS_HEARTBEAT_S = float(os.getenv("WS_HEARTBEAT_S", "25"))
+
     # ── Monitor / health JSON payloads (caps avoid huge responses on busy servers) ──
     MONITOR_STATUS_SYMBOLS_CAP = int(os.getenv("MONITOR_STATUS_SYMBOLS_CAP", "50"))
     MONITOR_STATUS_STREAMS_CAP = int(os.getenv("MONITOR_STATUS_STREAMS_CAP", "50"))
@@ -52,6 +68,12 @@ class Settings:
     BINANCE_FUTURES_WS_URL = os.getenv("BINANCE_FUTURES_WS_URL", "wss://fstream.binance.com")
     BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com/api/v3")
     BINANCE_FUTURES_API_URL = os.getenv("BINANCE_FUTURES_API_URL", "https://fapi.binance.com/fapi/v1")
+    # Streams per upstream combined-stream connection; more streams open more shards.
+    BINANCE_WS_MAX_STREAMS_PER_CONN = int(os.getenv("BINANCE_WS_MAX_STREAMS_PER_CONN", "200"))
+    # SUBSCRIBE/UNSUBSCRIBE: streams per command and commands per second per connection
+    # (Binance allows 5 incoming control messages per second, pings included).
+    BINANCE_WS_SUBSCRIBE_BATCH = int(os.getenv("BINANCE_WS_SUBSCRIBE_BATCH", "100"))
+    BINANCE_WS_COMMANDS_PER_S = float(os.getenv("BINANCE_WS_COMMANDS_PER_S", "3"))
 
     # ── External APIs ──
     ALPHA_VANTAGE_API_KEY = os.getenv("ALPHAVANTAGE_API_KEY", "demo")
@@ -17,9 +17,15 @@ DB_NAME = os.getenv("DB_NAME", "viewingchart")
 
 DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Each process (API worker, streamer, scheduler, ingest) builds its own pool.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
 engine = create_engine(
     DATABASE_URL, 
     pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     # echo=True # Uncomment for SQL logging
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
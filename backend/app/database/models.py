@@ -116,3 +116,44 @@ class Kline(Base):
     )
 
     symbol = relationship("Symbol", back_populates="klines")
+
+
+class KlineCoverage(Base):
+    """Contiguous filled open_time ranges per (symbol_id, bar_interval) series.
+
+    Maintained on every kline write; holes between consecutive ranges are the
+    series' internal gaps.
+    """
+
+    __tablename__ = "kline_coverage"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    symbol_id = Column(Integer, ForeignKey("symbols.id", ondelete="CASCADE"), nullable=False)
+    bar_interval = Column(String(8), nullable=False)
+    start_time = Column(Integer, nullable=False)
+    end_time = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("idx_kline_coverage_series", "symbol_id", "bar_interval", "start_time"),
+    )
+
+
+class KlineBackfillPartition(Base):
+    """Resume point of one time-range partition of a historical backfill."""
+
+    __tablename__ = "kline_backfill_partitions"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    symbol_id = Column(Integer, ForeignKey("symbols.id", ondelete="CASCADE"), nullable=False)
+    bar_interval = Column(String(8), nullable=False)
+    range_start = Column(Integer, nullable=False)
+    range_end = Column(Integer, nullable=False)
+    # Next open_time to fetch; the partition is finished once it passes range_end.
+    cursor_time = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "symbol_id", "bar_interval", "range_start", name="uk_backfill_partition",
+        ),
+    )
@@ -38,12 +38,20 @@ async def lifespan(app: FastAPI):
     # Validate secrets and log config summary
     validate_secrets()
 
-    logger.info("Starting Binance stream manager...")
-    task = asyncio.create_task(manager.start_binance_stream())
+    # EMBEDDED_WORKERS=false: the streamer, scheduler and ingesters run as
+    # their own processes (python -m app.workers.<name>); this process only
+    # serves clients from Redis Pub/Sub and can run with many uvicorn workers.
+    embedded = os.getenv("EMBEDDED_WORKERS", "true").lower() in {"1", "true", "yes", "on"}
+    if embedded:
+        logger.info("Starting Binance stream manager...")
+        task = asyncio.create_task(manager.start_binance_stream())
+    else:
+        logger.info("Background workers run externally; starting Redis listener only...")
+        task = asyncio.create_task(manager.start_listener())
 
     # Background kline scheduler (honours KLINE_SCHEDULER_ENABLED env var).
     scheduler_task: asyncio.Task | None = None
-    if os.getenv("KLINE_SCHEDULER_ENABLED", "true").lower() in {"1", "true", "yes", "on"}:
+    if embedded and os.getenv("KLINE_SCHEDULER_ENABLED", "true").lower() in {"1", "true", "yes", "on"}:
         from app.services.kline_scheduler import kline_scheduler
 
         logger.info("Starting kline background scheduler...")
@@ -1,6 +1,7 @@
 import os
 import time
 import logging
+from collections import deque
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.config import get_redis, settings
 from app.services.stock_service import stock_service
@@ -31,10 +32,11 @@ async def health_check():
         checks["redis"] = f"error: {e}"
         logger.error(f"Health check — Redis unreachable: {e}")
 
-    # ── Binance WS ──
+    # ── Binance WS (only checked where the streamer runs in-process) ──
     ws_status = manager.get_status()
-    checks["binance_spot_ws"] = "ok" if ws_status["spot_connected"] else "disconnected"
-    checks["binance_futures_ws"] = "ok" if ws_status["futures_connected"] else "disconnected"
+    if manager.streams_upstream:
+        checks["binance_spot_ws"] = "ok" if ws_status["spot_connected"] else "disconnected"
+        checks["binance_futures_ws"] = "ok" if ws_status["futures_connected"] else "disconnected"
 
     # ── Overall ──
     all_ok = all(v == "ok" for v in checks.values())
@@ -59,6 +61,26 @@ async def ws_status(_=Depends(require_superadmin)):
     return status
 
 
+@router.get("/scheduler/status")
+async def scheduler_status(
+    runs: int = Query(20, ge=1, le=200),
+    _=Depends(require_superadmin),
+):
+    """Kline scheduler state and the last N fast-cycle / deep-slice summaries.
+
+    State comes from this process when it runs the scheduler (embedded
+    workers), else from the snapshots scheduler workers keep in Redis; every
+    live replica is listed under `instances`. Summaries come from every
+    replica (shared Redis list), newest first. Duration, per-stage seconds,
+    upstream calls and weight, rows written and rate-limiter wait are also
+    exported as Prometheus metrics on /metrics (embedded) or on the scheduler
+    worker's SCHEDULER_METRICS_PORT.
+    """
+    from app.services.kline_scheduler import kline_scheduler
+
+    return await kline_scheduler.status(runs)
+
+
 @router.get("/scheduler/log")
 async def scheduler_log(
     lines: int = Query(100, ge=1, le=1000),
@@ -75,13 +97,17 @@ async def scheduler_log(
     if not os.path.isfile(log_path):
         raise HTTPException(status_code=404, detail="Scheduler log file not found")
     try:
+        # Stream the file so only the requested tail is held in memory.
+        tail: deque[str] = deque(maxlen=lines)
+        total_lines = 0
         with open(log_path, "r") as f:
-            all_lines = f.readlines()
-        tail = all_lines[-lines:]
+            for line in f:
+                tail.append(line)
+                total_lines += 1
         return {
             "path": log_path,
             "lines": [l.rstrip("\n") for l in tail],
-            "total_lines": len(all_lines),
+            "total_lines": total_lines,
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read log: {e}")
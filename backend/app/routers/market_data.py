@@ -1,16 +1,19 @@
-import asyncio
 import json
 import logging
-import time
 from typing import Literal
 from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, Request, Depends
 from slowapi import Limiter
 from app.rate_limit_key import rate_limit_client_ip
 from app.services.binance_service import binance_service
 from app.services.stock_service import stock_service
-from app.services.klines_db_service import get_klines_db_first
+from app.services.klines_db_service import (
+    derived_base_interval,
+    get_klines_db_first,
+    get_klines_derived,
+)
 from app.services.websocket_manager import manager
-from app.config import VALID_INTERVALS, VALID_ASSET_TYPES, SYMBOL_PATTERN, MAX_SYMBOLS_PER_REQUEST, MAX_SEARCH_QUERY_LENGTH
+from app.services import ws_codec
+from app.config import settings, VALID_INTERVALS, VALID_ASSET_TYPES, SYMBOL_PATTERN, MAX_SYMBOLS_PER_REQUEST, MAX_SEARCH_QUERY_LENGTH
 from app.auth.security import decode_token
 from app.database.connection import get_db
 from app.database.models import User, Watchlist, WatchlistItem
@@ -38,14 +41,20 @@ def validate_symbol(symbol: str) -> str:
     return symbol
 
 
-def validate_interval(interval: str) -> str:
-    """Validate interval is one of the allowed values."""
-    if interval not in VALID_INTERVALS:
-        raise HTTPException(
-            status_code=422,
-            detail=f"Invalid interval '{interval}'. Must be one of: {', '.join(sorted(VALID_INTERVALS))}"
-        )
-    return interval
+def validate_interval(interval: str, allow_derived: bool = False) -> str:
+    """Validate interval is one of the allowed values.
+
+    With `allow_derived`, also accept on-demand timeframes (e.g. 2h, 6h, 12h,
+    3d, 2w) that can be resampled from a stored base interval.
+    """
+    if interval in VALID_INTERVALS:
+        return interval
+    if allow_derived and derived_base_interval(interval):
+        return interval
+    detail = f"Invalid interval '{interval}'. Must be one of: {', '.join(sorted(VALID_INTERVALS))}"
+    if allow_derived:
+        detail += ", or an on-demand multiple of a stored interval (e.g. 2h, 6h, 12h, 3d, 2w)"
+    raise HTTPException(status_code=422, detail=detail)
 
 
 def validate_asset_type(asset_type: str) -> str:
@@ -79,60 +88,204 @@ def parse_symbol_list(raw: str) -> list[str]:
 
 # ── WebSocket endpoints (no rate limit — persistent connections) ──
 
-@router.websocket("/ws/tickers")
-async def websocket_tickers(
+# ── WebSocket helpers ──
+
+async def _ws_authenticate(
     websocket: WebSocket,
-    token: str | None = Query(default=None),
-    watchlist_id: int | None = Query(default=None),
-    db: Session = Depends(get_db),
-):
-    user_id: int | None = None
-    if token:
+    token: str | None,
+    db: Session,
+    anonymous_on_invalid: bool = False,
+) -> tuple[bool, int | None]:
+    """Resolve an optional ?token= to a user id; closes the socket (ok=False) if invalid.
+
+    With anonymous_on_invalid, a bad/expired token or unknown user is treated as
+    no token instead (ok=True, user_id=None) and the socket stays open.
+    """
+    if not token:
+        return True, None
+    try:
         payload = decode_token(token)
-        sub = payload.get("sub")
-        try:
-            user_id = int(sub)
-        except Exception:
-            await websocket.close(code=1008, reason="Invalid token")
-            return
-
-        user = db.query(User).filter(User.id == user_id, User.is_active == True).first()  # noqa: E712
-        if not user:
-            await websocket.close(code=1008, reason="User not found")
-            return
+        user_id = int(payload.get("sub"))
+    except Exception:
+        if anonymous_on_invalid:
+            return True, None
+        await websocket.close(code=1008, reason="Invalid token")
+        return False, None
+
+    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()  # noqa: E712
+    if not user:
+        if anonymous_on_invalid:
+            return True, None
+        await websocket.close(code=1008, reason="User not found")
+        return False, None
+    return True, user_id
+
+
+def _default_watchlist_id(db: Session, user_id: int | None) -> int | None:
+    if user_id is None:
+        return None
+    wl = (
+        db.query(Watchlist)
+        .filter(Watchlist.user_id == user_id)
+        .order_by(Watchlist.is_default.desc(), Watchlist.id.asc())
+        .first()
+    )
+    return wl.id if wl else None
 
-    await manager.connect_tickers(websocket)
-    hb_task = asyncio.create_task(_ticker_ws_heartbeat(websocket))
 
-    def _default_watchlist_id() -> int | None:
-        if user_id is None:
-            return None
-        wl = (
-            db.query(Watchlist)
-            .filter(Watchlist.user_id == user_id)
-            .order_by(Watchlist.is_default.desc(), Watchlist.id.asc())
-            .first()
-        )
-        return wl.id if wl else None
+async def _subscribe_tickers_from_msg(websocket: WebSocket, msg: dict, db: Session, user_id: int | None) -> None:
+    """Apply a ticker subscribe message: {"watchlistId": id} or {"symbols": [...]}.
 
-    async def _subscribe_from_watchlist(wl_id: int) -> None:
+    Symbols sent along with a watchlistId are used instead when the client is
+    anonymous (e.g. its token expired), so it still gets prices.
+    """
+    req_wl_id = msg.get("watchlistId")
+    if isinstance(req_wl_id, int) and (user_id is not None or "symbols" not in msg):
         if user_id is None:
             await websocket.close(code=1008, reason="Auth required for watchlist subscription")
             return
         items = (
             db.query(WatchlistItem)
             .join(Watchlist, WatchlistItem.watchlist_id == Watchlist.id)
-            .filter(Watchlist.user_id == user_id, Watchlist.id == wl_id, WatchlistItem.asset_type == "crypto")
+            .filter(Watchlist.user_id == user_id, Watchlist.id == req_wl_id, WatchlistItem.asset_type == "crypto")
             .all()
         )
         syms = [i.symbol for i in items if i.symbol and SYMBOL_PATTERN.match(i.symbol)]
         await manager.subscribe_tickers(websocket, syms)
+        return
+
+    # Back-compat: allow symbols subscribe.
+    requested = msg.get("symbols", [])
+    if not isinstance(requested, list):
+        requested = []
+    requested_syms = []
+    for s in requested:
+        if not isinstance(s, str):
+            continue
+        s2 = s.strip().upper()
+        if SYMBOL_PATTERN.match(s2):
+            requested_syms.append(s2)
+
+    # If authenticated: restrict to user's own watchlist items (prevents arbitrary symbol probing).
+    # If anonymous: allow requesting symbols directly (validated/capped by client & regex).
+    if user_id is not None:
+        allowed_items = (
+            db.query(WatchlistItem.symbol)
+            .join(Watchlist, WatchlistItem.watchlist_id == Watchlist.id)
+            .filter(Watchlist.user_id == user_id, WatchlistItem.asset_type == "crypto")
+            .all()
+        )
+        allowed = {row[0].upper() for row in allowed_items if row and row[0]}
+        valid = [s for s in requested_syms if s in allowed]
+    else:
+        valid = requested_syms[:MAX_SYMBOLS_PER_REQUEST]
+
+    await manager.subscribe_tickers(websocket, valid)
+
+
+# ── WebSocket endpoints ──
+
+@router.websocket("/ws")
+async def websocket_multiplexed(
+    websocket: WebSocket,
+    token: str | None = Query(default=None),
+    encoding: str | None = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    """One socket per browser session for kline rooms and tickers.
+
+    Client messages:
+      {"action": "subscribe"|"unsubscribe", "channel": "kline", "symbol": "BTCUSDT", "interval": "1m"}
+      {"action": "subscribe", "channel": "tickers", "watchlistId": 3}  (or "symbols": [...];
+        symbols sent with a watchlistId are the anonymous fallback for a bad token)
+      {"action": "unsubscribe", "channel": "tickers"}
+    Data frames are {"channel": "kline:BTCUSDT:1m" | "tickers", "data": ...}; heartbeats
+    and {"type": "error", ...} replies are JSON text.
+    """
+    negotiated = ws_codec.negotiate(websocket, encoding)
+    if negotiated is None:
+        await websocket.close(code=1008, reason=f"Invalid encoding: {encoding}")
+        return
+    # A stale token must not take the session's charts down with it: fall back to
+    # anonymous and refuse only a watchlist subscription without fallback symbols.
+    _, user_id = await _ws_authenticate(websocket, token, db, anonymous_on_invalid=True)
+
+    await manager.connect_multiplexed(websocket, *negotiated)
+    kline_rooms: set[tuple[str, str]] = set()
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                msg = json.loads(data)
+                action = msg.get("action")
+                channel = msg.get("channel")
+                if action not in ("subscribe", "unsubscribe"):
+                    continue
+
+                if channel == "tickers":
+                    if action == "subscribe":
+                        if "watchlistId" in msg and "symbols" not in msg and user_id is None:
+                            manager.send_control(websocket, {"type": "error", "message": "Auth required for watchlist subscription"})
+                            continue
+                        manager.join_tickers(websocket)
+                        await _subscribe_tickers_from_msg(websocket, msg, db, user_id)
+                    else:
+                        await manager.leave_tickers(websocket)
+                    continue
+
+                if channel != "kline":
+                    manager.send_control(websocket, {"type": "error", "message": f"Unknown channel: {channel}"})
+                    continue
+                symbol = str(msg.get("symbol", "")).strip().upper()
+                interval = msg.get("interval")
+                if not SYMBOL_PATTERN.match(symbol) or interval not in VALID_INTERVALS:
+                    manager.send_control(websocket, {"type": "error", "message": "Invalid kline symbol/interval"})
+                    continue
+                room = (symbol, interval)
+                if action == "unsubscribe":
+                    kline_rooms.discard(room)
+                    manager.leave_kline(websocket, symbol, interval)
+                elif room not in kline_rooms:
+                    if len(kline_rooms) >= settings.WS_MUX_MAX_KLINE_ROOMS:
+                        manager.send_control(websocket, {"type": "error", "message": "Too many kline subscriptions"})
+                        continue
+                    kline_rooms.add(room)
+                    await manager.join_kline(websocket, symbol, interval)
+            except json.JSONDecodeError:
+                logger.warning("WS mux: received non-JSON message")
+            except Exception as e:
+                logger.error(f"WS mux: error processing message: {e}")
+    except WebSocketDisconnect as e:
+        logger.warning(f"WS mux disconnected gracefully: code={e.code}, reason={e.reason}")
+    except Exception as e:
+        logger.error(f"WS mux disconnected unexpectedly: {e}")
+    finally:
+        await manager.disconnect_multiplexed(websocket, kline_rooms)
+
+
+@router.websocket("/ws/tickers")
+async def websocket_tickers(
+    websocket: WebSocket,
+    token: str | None = Query(default=None),
+    watchlist_id: int | None = Query(default=None),
+    encoding: str | None = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    negotiated = ws_codec.negotiate(websocket, encoding)
+    if negotiated is None:
+        await websocket.close(code=1008, reason=f"Invalid encoding: {encoding}")
+        return
+    ok, user_id = await _ws_authenticate(websocket, token, db)
+    if not ok:
+        return
+
+    await manager.connect_tickers(websocket, *negotiated)
 
     # Auto-subscribe on connect (default watchlist or explicit watchlist_id)
-    wl_id = watchlist_id or _default_watchlist_id()
+    wl_id = watchlist_id or _default_watchlist_id(db, user_id)
     if wl_id:
         try:
-            await _subscribe_from_watchlist(wl_id)
+            await _subscribe_tickers_from_msg(websocket, {"watchlistId": wl_id}, db, user_id)
         except Exception as e:
             logger.error(f"WS ticker: initial watchlist subscribe failed: {e}")
     try:
@@ -141,38 +294,7 @@ async def websocket_tickers(
             try:
                 msg = json.loads(data)
                 if msg.get("action") == "subscribe":
-                    req_wl_id = msg.get("watchlistId")
-                    if isinstance(req_wl_id, int):
-                        await _subscribe_from_watchlist(req_wl_id)
-                        continue
-
-                    # Back-compat: allow symbols subscribe.
-                    requested = msg.get("symbols", [])
-                    if not isinstance(requested, list):
-                        requested = []
-                    requested_syms = []
-                    for s in requested:
-                        if not isinstance(s, str):
-                            continue
-                        s2 = s.strip().upper()
-                        if SYMBOL_PATTERN.match(s2):
-                            requested_syms.append(s2)
-
-                    # If authenticated: restrict to user's own watchlist items (prevents arbitrary symbol probing).
-                    # If anonymous: allow requesting symbols directly (validated/capped by client & regex).
-                    if user_id is not None:
-                        allowed_items = (
-                            db.query(WatchlistItem.symbol)
-                            .join(Watchlist, WatchlistItem.watchlist_id == Watchlist.id)
-                            .filter(Watchlist.user_id == user_id, WatchlistItem.asset_type == "crypto")
-                            .all()
-                        )
-                        allowed = {row[0].upper() for row in allowed_items if row and row[0]}
-                        valid = [s for s in requested_syms if s in allowed]
-                    else:
-                        valid = requested_syms[:MAX_SYMBOLS_PER_REQUEST]
-
-                    await manager.subscribe_tickers(websocket, valid)
+                    await _subscribe_tickers_from_msg(websocket, msg, db, user_id)
             except json.JSONDecodeError:
                 logger.warning("WS ticker: received non-JSON message")
             except Exception as e:
@@ -182,36 +304,16 @@ async def websocket_tickers(
     except Exception as e:
         logger.error(f"WS ticker disconnected unexpectedly: {e}")
     finally:
-        hb_task.cancel()
-        try:
-            await hb_task
-        except asyncio.CancelledError:
-            pass
         await manager.disconnect_tickers(websocket)
 
 
-async def _ticker_ws_heartbeat(websocket: WebSocket) -> None:
-    """Ping clients on an interval so foreground watchdogs reset without ticker traffic."""
-    while True:
-        await asyncio.sleep(25)
-        try:
-            await websocket.send_json({"type": "heartbeat", "ts": int(time.time())})
-        except Exception:
-            return
-
-
-async def _kline_ws_heartbeat(websocket: WebSocket) -> None:
-    """Keep client connections alive when Binance kline updates are sparse (e.g. 1d)."""
-    while True:
-        await asyncio.sleep(25)
-        try:
-            await websocket.send_json({"type": "heartbeat", "ts": int(time.time())})
-        except Exception:
-            return
-
-
 @router.websocket("/ws/{symbol}/{interval}")
-async def websocket_endpoint(websocket: WebSocket, symbol: str, interval: str):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    symbol: str,
+    interval: str,
+    encoding: str | None = Query(default=None),
+):
     # Validate params before accepting the connection
     symbol = symbol.strip().upper()
     if not SYMBOL_PATTERN.match(symbol):
@@ -220,9 +322,12 @@ async def websocket_endpoint(websocket: WebSocket, symbol: str, interval: str):
     if interval not in VALID_INTERVALS:
         await websocket.close(code=1008, reason=f"Invalid interval: {interval}")
         return
+    negotiated = ws_codec.negotiate(websocket, encoding)
+    if negotiated is None:
+        await websocket.close(code=1008, reason=f"Invalid encoding: {encoding}")
+        return
 
-    await manager.connect(websocket, symbol, interval)
-    hb_task = asyncio.create_task(_kline_ws_heartbeat(websocket))
+    await manager.connect(websocket, symbol, interval, *negotiated)
     try:
         while True:
             await websocket.receive_text()
@@ -231,11 +336,6 @@ async def websocket_endpoint(websocket: WebSocket, symbol: str, interval: str):
     except Exception as e:
         logger.error(f"WS kline {symbol}@{interval} disconnected unexpectedly: {e}")
     finally:
-        hb_task.cancel()
-        try:
-            await hb_task
-        except asyncio.CancelledError:
-            pass
         manager.disconnect(websocket, symbol, interval)
 
 
@@ -253,15 +353,20 @@ async def get_klines(
         description="Include pre/post market candles when supported by upstream",
     ),
 ):
-    """Get historical k-lines for a symbol."""
+    """Get historical k-lines for a symbol.
+
+    Intervals outside VALID_INTERVALS (e.g. 2h, 6h, 12h, 3d, 2w) are resampled
+    on demand from stored base bars.
+    """
     symbol = validate_symbol(symbol)
-    interval = validate_interval(interval)
+    interval = validate_interval(interval, allow_derived=True)
     asset_type = validate_asset_type(asset_type)
 
     if asset_type == "stock":
         include_extended = False
 
-    data = await get_klines_db_first(
+    fetch = get_klines_db_first if interval in VALID_INTERVALS else get_klines_derived
+    data = await fetch(
         symbol,
         bar_interval=interval,
         asset_type=asset_type,
@@ -0,0 +1,326 @@
+"""
+Sharded Binance combined-stream connections for one market (spot or futures).
+
+Binance caps the streams per connection and the control messages per second,
+so one connection per market stops accepting subscriptions once a few hundred
+kline/ticker streams are live. A pool spreads streams over as many shard
+connections as needed, at most `max_streams` each: new streams go to the
+least-loaded shard with room, and a new shard is opened when all are full.
+A shard emptied while connected is closing and takes no new streams until
+it has disconnected.
+
+Every shard runs its own reconnect loop and connects with its whole stream
+set in the URL, so a reconnect restores exactly that shard's subscriptions
+without touching the others. A shard with no streams stays disconnected.
+
+Later changes are not sent one frame per stream. Each connected shard has a
+command sender that diffs the wanted streams against the ones live upstream
+and sends SUBSCRIBE/UNSUBSCRIBE with up to `batch_size` params per frame,
+paced under `commands_per_s`. A stream added and removed again before the
+next frame costs nothing. Every command is tracked by its `id` until Binance
+acknowledges it: an error result drops the rejected streams and reports
+them through `on_reject` (so the owner stops counting them as subscribed and
+a later request can retry), and a missing ack after ACK_TIMEOUT_S re-queues
+them.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import websockets
+
+from app.config import ws_id_counter
+
+logger = logging.getLogger(__name__)
+
+# Seconds without any frame before a shard is considered dead.
+RECV_TIMEOUT_S = 90
+# Seconds to wait for a command's {"result", "id"} before re-queueing it.
+ACK_TIMEOUT_S = 10
+
+
+class _Shard:
+    def __init__(self, index: int):
+        self.index = index
+        # Streams this shard should carry (live or restored on connect).
+        self.streams: Set[str] = set()
+        self.ws = None
+        self.connected = False
+        self.reconnect_count = 0
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        # Streams subscribed on the current connection (URL or acked/in-flight commands).
+        self.live: Set[str] = set()
+        # Commands awaiting an ack: id -> (method, streams, sent_at monotonic)
+        self.inflight: Dict[int, tuple] = {}
+        # Set when `streams` and `live` may differ.
+        self.dirty = asyncio.Event()
+        # Emptied while connected: closing, not eligible for new streams.
+        self.draining = False
+
+
+class BinanceStreamPool:
+    def __init__(
+        self,
+        tag: str,
+        base_url: str,
+        max_streams: int,
+        batch_size: int,
+        commands_per_s: float,
+        on_message: Callable[[dict, str], Awaitable[None]],
+        on_connect: Callable[[str, int], Awaitable[None]],
+        on_reject: Optional[Callable[[str, List[str]], None]] = None,
+    ):
+        self.tag = tag
+        self.base_url = base_url
+        self.max_streams = max(1, max_streams)
+        self.batch_size = max(1, batch_size)
+        self.command_interval = 1.0 / max(commands_per_s, 0.1)
+        self._on_message = on_message
+        self._on_connect = on_connect
+        self._on_reject = on_reject
+        self._shards: List[_Shard] = []
+        self._owner: Dict[str, _Shard] = {}
+        self.running = False
+
+    # ── State ──
+
+    @property
+    def connected(self) -> bool:
+        """True when every shard that carries streams is connected."""
+        busy = [s for s in self._shards if s.streams]
+        return bool(busy) and all(s.connected for s in busy)
+
+    @property
+    def reconnect_count(self) -> int:
+        return sum(s.reconnect_count for s in self._shards)
+
+    def shard_loads(self) -> List[int]:
+        return [len(s.streams) for s in self._shards]
+
+    def pending_commands(self) -> int:
+        """Commands sent upstream and not yet acknowledged."""
+        return sum(len(s.inflight) for s in self._shards)
+
+    def start(self):
+        self.running = True
+        for shard in self._shards:
+            self._ensure_task(shard)
+
+    # ── Subscriptions ──
+
+    async def subscribe(self, streams: Iterable[str]):
+        """Place new streams on the least-loaded shards; their senders subscribe them."""
+        touched: Set[_Shard] = set()
+        for stream in streams:
+            if stream in self._owner:
+                continue
+            shard = self._least_loaded()
+            shard.streams.add(stream)
+            self._owner[stream] = shard
+            touched.add(shard)
+        for shard in touched:
+            if shard.connected:
+                shard.dirty.set()
+            else:
+                # Picked up by the shard's connect URL.
+                shard.wake.set()
+                self._ensure_task(shard)
+
+    async def unsubscribe(self, streams: Iterable[str]):
+        touched: Set[_Shard] = set()
+        for stream in streams:
+            shard = self._owner.pop(stream, None)
+            if shard is None:
+                continue
+            shard.streams.discard(stream)
+            touched.add(shard)
+        for shard in touched:
+            if not shard.connected:
+                continue
+            if shard.streams:
+                shard.dirty.set()
+            else:
+                # Nothing left on this shard: drop its connection.
+                shard.draining = True
+                try:
+                    await shard.ws.close()
+                except Exception as e:
+                    # The recv loop still ends on the broken socket.
+                    logger.warning(f"[{self.tag}#{shard.index}] Closing emptied shard failed: {e}")
+
+    def _least_loaded(self) -> _Shard:
+        open_shards = [
+            s for s in self._shards if not s.draining and len(s.streams) < self.max_streams
+        ]
+        if open_shards:
+            return min(open_shards, key=lambda s: (len(s.streams), s.index))
+        shard = _Shard(len(self._shards))
+        self._shards.append(shard)
+        logger.info(f"[{self.tag}] Opening upstream shard #{shard.index} ({self.max_streams} streams per connection)")
+        return shard
+
+    # ── Command queue ──
+
+    async def _run_sender(self, shard: _Shard):
+        """Send batched, paced SUBSCRIBE/UNSUBSCRIBE until `live` matches `streams`."""
+        tag = f"{self.tag}#{shard.index}"
+        while True:
+            timeout = self._expire_acks(shard)
+            try:
+                await asyncio.wait_for(shard.dirty.wait(), timeout)
+            except asyncio.TimeoutError:
+                continue
+            shard.dirty.clear()
+            while True:
+                to_unsub = sorted(shard.live - shard.streams)[: self.batch_size]
+                to_sub = sorted(shard.streams - shard.live)[: self.batch_size]
+                if not to_unsub and not to_sub:
+                    break
+                method, batch = ("UNSUBSCRIBE", to_unsub) if to_unsub else ("SUBSCRIBE", to_sub)
+                command_id = next(ws_id_counter)
+                payload = {"method": method, "params": batch, "id": command_id}
+                try:
+                    await shard.ws.send(json.dumps(payload))
+                except Exception as e:
+                    # The shard reconnects with its full stream set.
+                    logger.error(f"[{tag}] {method} failed for {batch[:5]}: {e}")
+                    return
+                if method == "SUBSCRIBE":
+                    shard.live.update(batch)
+                else:
+                    shard.live.difference_update(batch)
+                shard.inflight[command_id] = (method, batch, time.monotonic())
+                logger.info(f"[{tag}] {method} {len(batch)} stream(s) id={command_id}: {batch[:5]}")
+                await asyncio.sleep(self.command_interval)
+
+    def _expire_acks(self, shard: _Shard) -> Optional[float]:
+        """Re-queue commands whose ack is overdue; return seconds until the next deadline."""
+        now = time.monotonic()
+        next_deadline: Optional[float] = None
+        for command_id, (method, batch, sent_at) in list(shard.inflight.items()):
+            wait = sent_at + ACK_TIMEOUT_S - now
+            if wait > 0:
+                next_deadline = wait if next_deadline is None else min(next_deadline, wait)
+                continue
+            del shard.inflight[command_id]
+            logger.warning(f"[{self.tag}#{shard.index}] No ack for {method} id={command_id} — re-queueing {len(batch)} stream(s)")
+            if method == "SUBSCRIBE":
+                shard.live.difference_update(batch)
+            else:
+                shard.live.update(s for s in batch if s not in shard.streams)
+            shard.dirty.set()
+        return next_deadline
+
+    def _on_ack(self, shard: _Shard, reply: dict):
+        command = shard.inflight.pop(reply.get("id"), None)
+        if command is None:
+            return
+        method, batch, _ = command
+        error = reply.get("error")
+        if not error:
+            return
+        logger.error(f"[{self.tag}#{shard.index}] {method} id={reply.get('id')} rejected: {error}")
+        if method == "SUBSCRIBE":
+            # Not retried: drop the rejected streams that are still on this shard.
+            rejected = [s for s in batch if self._owner.get(s) is shard]
+            for stream in rejected:
+                shard.live.discard(stream)
+                shard.streams.discard(stream)
+                del self._owner[stream]
+            if rejected and self._on_reject is not None:
+                try:
+                    self._on_reject(self.tag, rejected)
+                except Exception as e:
+                    logger.error(f"[{self.tag}#{shard.index}] Reject callback failed: {e}")
+
+    # ── Connection loop ──
+
+    def _ensure_task(self, shard: _Shard):
+        if self.running and (shard.task is None or shard.task.done()):
+            shard.task = asyncio.create_task(self._run_shard(shard))
+
+    async def _run_shard(self, shard: _Shard):
+        """Independent reconnect loop for one shard connection."""
+        tag = f"{self.tag}#{shard.index}"
+        reconnect_attempt = 0
+        sender: Optional[asyncio.Task] = None
+
+        while self.running:
+            if not shard.streams:
+                shard.wake.clear()
+                await shard.wake.wait()
+                continue
+
+            url_streams = set(shard.streams)
+            url = f"{self.base_url}/stream?streams={'/'.join(sorted(url_streams))}"
+            logger.info(f"[{tag}] Connecting to WS with {len(url_streams)} streams...")
+
+            try:
+                async with websockets.connect(url, ping_interval=20, ping_timeout=20, close_timeout=10) as ws:
+                    logger.info(f"[{tag}] WebSocket connected!")
+                    reconnect_attempt = 0
+                    shard.ws = ws
+                    shard.connected = True
+                    shard.live = url_streams
+                    shard.inflight.clear()
+                    # Streams that changed while the handshake was in flight.
+                    shard.dirty.set()
+                    sender = asyncio.create_task(self._run_sender(shard))
+
+                    await self._on_connect(self.tag, shard.index)
+
+                    while self.running:
+                        try:
+                            msg = await asyncio.wait_for(ws.recv(), timeout=RECV_TIMEOUT_S)
+                        except asyncio.TimeoutError:
+                            logger.error(f"[{tag}] No data received in {RECV_TIMEOUT_S}s — forcing reconnect")
+                            break
+                        except websockets.exceptions.ConnectionClosed as e:
+                            if shard.streams:
+                                logger.error(f"[{tag}] Binance closed connection: code={e.code}, reason={e.reason}")
+                            break
+
+                        raw_data = json.loads(msg)
+                        if isinstance(raw_data, dict) and "id" in raw_data and "stream" not in raw_data:
+                            self._on_ack(shard, raw_data)
+                            continue
+                        await self._on_message(raw_data.get("data", raw_data), tag)
+
+            except websockets.exceptions.InvalidURI as e:
+                logger.error(f"[{tag}] Invalid WS URI: {url[:120]} - Error: {e}")
+            except websockets.exceptions.InvalidHandshake as e:
+                logger.error(f"[{tag}] WS Handshake Failed (Check IP Bans!): {e}")
+            except asyncio.CancelledError:
+                logger.warning(f"[{tag}] Stream loop cancelled cleanly.")
+                break
+            except Exception as e:
+                logger.error(f"[{tag}] Unhandled WS connection error: type={type(e).__name__}, err={e}")
+            finally:
+                if sender is not None:
+                    sender.cancel()
+                    sender = None
+                shard.connected = False
+                shard.draining = False
+                shard.ws = None
+                shard.live = set()
+                shard.inflight.clear()
+
+            if not shard.streams:
+                # Closed because it was emptied; wait for new streams.
+                reconnect_attempt = 0
+                continue
+
+            # Exponential backoff with jitter: 5s, 10s, 20s, … capped at 60s
+            if self.running:
+                shard.reconnect_count += 1
+                base_delay = min(5 * (2 ** reconnect_attempt), 60)
+                jitter = random.uniform(0, base_delay * 0.3)
+                delay = base_delay + jitter
+                reconnect_attempt += 1
+                logger.info(f"[{tag}] Reconnecting in {delay:.1f}s (attempt {reconnect_attempt})")
+                await asyncio.sleep(delay)
@@ -0,0 +1,256 @@
+"""
+Resumable, range-partitioned historical kline backfill.
+
+The target [start, end] open_time range is split into partitions that are
+fetched concurrently, each walking forward one API page at a time. Every page
+is upserted as soon as it arrives and the partition's cursor is checkpointed in
+`kline_backfill_partitions`, so a crash or restart resumes each partition where
+it stopped instead of refetching everything. A partition's row is deleted once
+it is finished: its cursor passed range_end, or a short page showed upstream
+history has run out. An empty page is not proof of either (binance_service
+returns [] on errors and 429s), so it leaves the checkpoint for the next deep
+pass, unless another partition's data shows the range predates the listing.
+
+Pages are upserted before the checkpoint moves, so a crash between the two only
+refetches one page (upserts are idempotent). Every request first awaits the
+caller's `throttle` so concurrency stays inside the caller's rate budget.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable
+
+from app.database.connection import SessionLocal
+from app.database.models import KlineBackfillPartition
+from app.services.klines_db_service import (
+    _to_unix_seconds,
+    fetch_klines_from_api,
+    save_klines,
+)
+
+# Child of the scheduler logger so backfill progress lands in scheduler.log too.
+logger = logging.getLogger("app.services.kline_scheduler.backfill")
+
+# Binance returns at most 1000 klines per request.
+PAGE_BARS = 1000
+
+
+def pending_backfills(db, symbol_ids: Iterable[int]) -> set[tuple[int, str]]:
+    """(symbol_id, bar_interval) series with unfinished backfill partitions."""
+    ids = list(symbol_ids)
+    if not ids:
+        return set()
+    rows = (
+        db.query(KlineBackfillPartition.symbol_id, KlineBackfillPartition.bar_interval)
+        .filter(KlineBackfillPartition.symbol_id.in_(ids))
+        .distinct()
+        .all()
+    )
+    return {(int(sid), iv) for sid, iv in rows}
+
+
+def _plan_partitions(
+    db,
+    symbol_id: int,
+    bar_interval: str,
+    step: int,
+    start_time: int,
+    end_time: int,
+    partitions: int,
+) -> list[KlineBackfillPartition]:
+    """Pending partitions of a series, planning new ones if none exist."""
+    existing = (
+        db.query(KlineBackfillPartition)
+        .filter(
+            KlineBackfillPartition.symbol_id == symbol_id,
+            KlineBackfillPartition.bar_interval == bar_interval,
+        )
+        .order_by(KlineBackfillPartition.range_start.asc())
+        .all()
+    )
+    if existing:
+        logger.info(
+            "Backfill: resuming %d partition(s) for symbol_id=%d @ %s",
+            len(existing), symbol_id, bar_interval,
+        )
+        return existing
+
+    start_time = start_time // step * step
+    end_time = end_time // step * step
+    if end_time < start_time:
+        return []
+    n_bars = (end_time - start_time) // step + 1
+    # Never split below one page per partition.
+    count = max(1, min(partitions, -(-n_bars // PAGE_BARS)))
+    per = -(-n_bars // count)
+
+    parts: list[KlineBackfillPartition] = []
+    for i in range(count):
+        lo = start_time + i * per * step
+        if lo > end_time:
+            break
+        hi = min(end_time, lo + (per - 1) * step)
+        parts.append(
+            KlineBackfillPartition(
+                symbol_id=symbol_id,
+                bar_interval=bar_interval,
+                range_start=lo,
+                range_end=hi,
+                cursor_time=lo,
+            )
+        )
+    db.add_all(parts)
+    db.commit()
+    return parts
+
+
+async def _run_partition(
+    symbol: str,
+    asset_type: str,
+    symbol_id: int,
+    bar_interval: str,
+    step: int,
+    partition_id: int,
+    cursor: int,
+    range_end: int,
+    throttle: Callable[[], Awaitable[None]],
+    semaphore: asyncio.Semaphore,
+) -> tuple[int, int | None, int | None, bool]:
+    """Walk one partition forward; returns (saved, first_t, last_t, finished)."""
+    saved = 0
+    first_t: int | None = None
+    last_t: int | None = None
+    async with semaphore:
+        while cursor <= range_end:
+            await throttle()
+            page = await fetch_klines_from_api(
+                symbol, asset_type, bar_interval,
+                limit=PAGE_BARS, start_time=cursor, end_time=range_end,
+            )
+            page = [
+                k for k in page
+                if cursor <= _to_unix_seconds(k["time"]) <= range_end
+            ]
+            if not page:
+                # Upstream error or no bars at all: keep the checkpoint.
+                logger.warning(
+                    "Backfill: empty page for %s @ %s at %d, partition kept for resume",
+                    symbol, bar_interval, cursor,
+                )
+                return saved, first_t, last_t, False
+            times = [_to_unix_seconds(k["time"]) for k in page]
+
+            db = SessionLocal()
+            try:
+                saved += save_klines(db, symbol_id, bar_interval, page)
+                cursor = max(times) + step
+                db.query(KlineBackfillPartition).filter(
+                    KlineBackfillPartition.id == partition_id,
+                ).update({"cursor_time": cursor}, synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+            first_t = min(times) if first_t is None else min(first_t, min(times))
+            last_t = max(times) if last_t is None else max(last_t, max(times))
+            if len(page) < PAGE_BARS:
+                break
+
+        # Reached range_end or the end of upstream history: partition done.
+        _delete_partitions([partition_id])
+    return saved, first_t, last_t, True
+
+
+def _delete_partitions(partition_ids: list[int]) -> None:
+    db = SessionLocal()
+    try:
+        db.query(KlineBackfillPartition).filter(
+            KlineBackfillPartition.id.in_(partition_ids),
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def backfill_range(
+    symbol: str,
+    asset_type: str,
+    symbol_id: int,
+    bar_interval: str,
+    step: int,
+    start_time: int,
+    end_time: int,
+    throttle: Callable[[], Awaitable[None]],
+    partitions: int = 4,
+    concurrency: int = 4,
+) -> tuple[int, int | None, int | None]:
+    """Backfill [start_time, end_time] (or resume a pending backfill).
+
+    Only for APIs with start/end-bounded paging (Binance). A series with
+    pending partitions resumes those and ignores the requested range.
+    Returns (rows_saved, first_open_time, last_open_time) of what was written.
+    """
+    db = SessionLocal()
+    try:
+        parts = [
+            (p.id, int(p.cursor_time), int(p.range_end))
+            for p in _plan_partitions(
+                db, symbol_id, bar_interval, step, start_time, end_time, partitions,
+            )
+        ]
+    finally:
+        db.close()
+    if not parts:
+        return 0, None, None
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(
+        *(
+            _run_partition(
+                symbol, asset_type, symbol_id, bar_interval, step,
+                partition_id, cursor, range_end, throttle, semaphore,
+            )
+            for partition_id, cursor, range_end in parts
+        ),
+        return_exceptions=True,
+    )
+
+    saved = 0
+    first_t: int | None = None
+    last_t: int | None = None
+    failed = 0
+    unfinished: list[tuple[int, int]] = []
+    # Binance pages start at the listing when asked for earlier bars, so a
+    # partition whose first bar lies past its cursor begins at the listing.
+    listed_at: int | None = None
+    for (partition_id, cursor, range_end), result in zip(parts, results):
+        if isinstance(result, BaseException):
+            failed += 1
+            logger.error(
+                "Backfill: partition failed for %s @ %s (will resume): %s",
+                symbol, bar_interval, result,
+            )
+            continue
+        n, lo, hi, finished = result
+        saved += n
+        if lo is not None:
+            first_t = lo if first_t is None else min(first_t, lo)
+            last_t = hi if last_t is None else max(last_t, hi)
+            if lo > cursor:
+                listed_at = lo if listed_at is None else min(listed_at, lo)
+        if not finished:
+            unfinished.append((partition_id, range_end))
+
+    # Empty partitions wholly before the listing have nothing to fetch.
+    prelisting = [
+        pid for pid, range_end in unfinished
+        if listed_at is not None and range_end < listed_at
+    ]
+    if prelisting:
+        _delete_partitions(prelisting)
+    failed += len(unfinished) - len(prelisting)
+    logger.info(
+        "Backfill: %s %s @ %s — %d partition(s), saved=%d, failed=%d",
+        symbol, asset_type, bar_interval, len(parts), saved, failed,
+    )
+    return saved, first_t, last_t
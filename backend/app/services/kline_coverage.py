@@ -0,0 +1,311 @@
+"""
+Persistent coverage index for stored klines.
+
+Each (symbol_id, bar_interval) series keeps its contiguous filled open_time
+ranges in `kline_coverage`, merged on every kline write. Internal gaps are the
+holes between consecutive ranges, so gap detection reads a handful of rows
+instead of scanning every open_time in the series.
+
+A series without coverage rows is unindexed. Writes leave it alone, and the
+first gap lookup builds its ranges with a `LAG(open_time)` window query that
+covers every requested symbol of an interval in one pass. Deleting klines
+invalidates the series so the next lookup rebuilds it.
+"""
+
+from typing import Iterable
+
+from sqlalchemy import func, insert
+
+from app.database.models import Kline, KlineCoverage
+from app.services.resampler import INTERVAL_SECONDS
+
+# Fixed-length intervals only; calendar months have no constant step.
+COVERAGE_STEPS: dict[str, int] = {
+    iv: step for iv, step in INTERVAL_SECONDS.items() if iv != "1M"
+}
+
+Range = tuple[int, int]
+
+
+def runs_from_times(times: Iterable[int], step: int) -> list[Range]:
+    """Collapse open_times into inclusive (first, last) runs with no hole > step."""
+    runs: list[Range] = []
+    for t in sorted(set(times)):
+        if runs and t - runs[-1][1] <= step:
+            runs[-1] = (runs[-1][0], t)
+        else:
+            runs.append((t, t))
+    return runs
+
+
+def _merge_ranges(ranges: Iterable[Range], step: int) -> list[Range]:
+    """Union of overlapping or adjacent (≤ one step apart) ranges, ascending."""
+    merged: list[Range] = []
+    for lo, hi in sorted(ranges):
+        if merged and lo - merged[-1][1] <= step:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _insert_ranges(db, symbol_id: int, bar_interval: str, ranges: list[Range]) -> None:
+    if ranges:
+        db.execute(
+            insert(KlineCoverage),
+            [
+                {
+                    "symbol_id": symbol_id,
+                    "bar_interval": bar_interval,
+                    "start_time": lo,
+                    "end_time": hi,
+                }
+                for lo, hi in ranges
+            ],
+        )
+
+
+def _merge_into(db, symbol_id: int, bar_interval: str, step: int, runs: list[Range]) -> None:
+    lo, hi = runs[0][0] - step, runs[-1][1] + step
+    existing = (
+        db.query(KlineCoverage)
+        .filter(
+            KlineCoverage.symbol_id == symbol_id,
+            KlineCoverage.bar_interval == bar_interval,
+            KlineCoverage.end_time >= lo,
+            KlineCoverage.start_time <= hi,
+        )
+        .with_for_update()
+        .all()
+    )
+    current = sorted((int(r.start_time), int(r.end_time)) for r in existing)
+    merged = _merge_ranges(current + runs, step)
+    if merged == current:
+        return
+    if existing:
+        db.query(KlineCoverage).filter(
+            KlineCoverage.id.in_([r.id for r in existing])
+        ).delete(synchronize_session=False)
+    _insert_ranges(db, symbol_id, bar_interval, merged)
+
+
+def update_coverage(db, series_times: dict[tuple[int, str], Iterable[int]]) -> None:
+    """Merge freshly written open_times into the coverage of indexed series.
+
+    Runs inside the caller's transaction (no commit) so coverage and klines
+    land together. Unindexed series are skipped until their first lookup.
+    """
+    tracked: dict[tuple[int, str], list[int]] = {}
+    for key, times in series_times.items():
+        if key[1] in COVERAGE_STEPS:
+            times = list(times)
+            if times:
+                tracked[key] = times
+    if not tracked:
+        return
+    indexed = {
+        (int(sid), iv)
+        for sid, iv in (
+            db.query(KlineCoverage.symbol_id, KlineCoverage.bar_interval)
+            .filter(
+                KlineCoverage.symbol_id.in_({sid for sid, _ in tracked}),
+                KlineCoverage.bar_interval.in_({iv for _, iv in tracked}),
+            )
+            .distinct()
+            .all()
+        )
+    }
+    for (sid, iv), times in tracked.items():
+        if (sid, iv) not in indexed:
+            continue
+        step = COVERAGE_STEPS[iv]
+        _merge_into(db, sid, iv, step, runs_from_times(times, step))
+
+
+def invalidate_coverage(db, symbol_id: int, bar_interval: str) -> None:
+    """Drop a series' coverage after klines were deleted (no commit)."""
+    db.query(KlineCoverage).filter(
+        KlineCoverage.symbol_id == symbol_id,
+        KlineCoverage.bar_interval == bar_interval,
+    ).delete(synchronize_session=False)
+
+
+def scan_runs(
+    db,
+    symbol_ids: Iterable[int],
+    bar_interval: str,
+    step: int,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> dict[int, list[Range]]:
+    """Filled runs of several series of one interval, computed inside MariaDB.
+
+    One `LAG(open_time)` window pass returns only the gap boundaries (rows
+    whose predecessor is more than `step` away) and one GROUP BY returns each
+    series' extent, so no per-row timestamps are streamed to Python.
+    Optionally bounded to [start_time, end_time].
+    """
+    ids = list(symbol_ids)
+    if not ids:
+        return {}
+
+    def _bounded(q):
+        q = q.filter(Kline.symbol_id.in_(ids), Kline.bar_interval == bar_interval)
+        if start_time is not None:
+            q = q.filter(Kline.open_time >= start_time)
+        if end_time is not None:
+            q = q.filter(Kline.open_time <= end_time)
+        return q
+
+    extents = _bounded(
+        db.query(Kline.symbol_id, func.min(Kline.open_time), func.max(Kline.open_time))
+    ).group_by(Kline.symbol_id).all()
+
+    prev_t = func.lag(Kline.open_time).over(
+        partition_by=Kline.symbol_id, order_by=Kline.open_time,
+    )
+    lagged = _bounded(
+        db.query(
+            Kline.symbol_id.label("symbol_id"),
+            Kline.open_time.label("open_time"),
+            prev_t.label("prev_t"),
+        )
+    ).subquery()
+    boundaries = (
+        db.query(lagged.c.symbol_id, lagged.c.prev_t, lagged.c.open_time)
+        .filter(lagged.c.open_time - lagged.c.prev_t > step)
+        .order_by(lagged.c.symbol_id, lagged.c.open_time)
+        .all()
+    )
+
+    gaps_by_sid: dict[int, list[Range]] = {}
+    for sid, left_t, right_t in boundaries:
+        gaps_by_sid.setdefault(int(sid), []).append((int(left_t), int(right_t)))
+
+    runs: dict[int, list[Range]] = {}
+    for sid, first_t, last_t in extents:
+        sid = int(sid)
+        series_runs: list[Range] = []
+        lo = int(first_t)
+        for left_t, right_t in gaps_by_sid.get(sid, []):
+            series_runs.append((lo, left_t))
+            lo = right_t
+        series_runs.append((lo, int(last_t)))
+        runs[sid] = series_runs
+    return runs
+
+
+def rebuild_coverage(
+    db, symbol_ids: Iterable[int], bar_interval: str, step: int,
+) -> dict[int, list[Range]]:
+    """Rebuild coverage of several series of one interval and commit it.
+
+    Intervals without a fixed step are computed but not persisted.
+    """
+    ids = list(symbol_ids)
+    runs = scan_runs(db, ids, bar_interval, step)
+    if bar_interval in COVERAGE_STEPS and ids:
+        db.query(KlineCoverage).filter(
+            KlineCoverage.symbol_id.in_(ids),
+            KlineCoverage.bar_interval == bar_interval,
+        ).delete(synchronize_session=False)
+        for sid, series_runs in runs.items():
+            _insert_ranges(db, sid, bar_interval, series_runs)
+        db.commit()
+    return runs
+
+
+def _clip(ranges: list[Range], start_time: int | None, end_time: int | None) -> list[Range]:
+    out: list[Range] = []
+    for lo, hi in ranges:
+        if start_time is not None:
+            if hi < start_time:
+                continue
+            lo = max(lo, start_time)
+        if end_time is not None:
+            if lo > end_time:
+                continue
+            hi = min(hi, end_time)
+        out.append((lo, hi))
+    return out
+
+
+def coverage_ranges_many(
+    db,
+    symbol_ids: Iterable[int],
+    bar_interval: str,
+    step: int,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> dict[int, list[Range]]:
+    """Filled ranges of several series of one interval, clipped to [start_time, end_time].
+
+    Indexed series are read from `kline_coverage` in one query. The rest are
+    computed in one SQL pass: an unbounded lookup also persists them as their
+    new index, while a range-bounded one only scans the requested window.
+    """
+    ids = list(symbol_ids)
+    if not ids:
+        return {}
+    stored: dict[int, list[Range]] = {}
+    if bar_interval in COVERAGE_STEPS:
+        q = db.query(
+            KlineCoverage.symbol_id, KlineCoverage.start_time, KlineCoverage.end_time,
+        ).filter(
+            KlineCoverage.symbol_id.in_(ids),
+            KlineCoverage.bar_interval == bar_interval,
+        )
+        for sid, lo, hi in q.all():
+            stored.setdefault(int(sid), []).append((int(lo), int(hi)))
+
+    missing = [sid for sid in ids if sid not in stored]
+    if missing:
+        if start_time is None and end_time is None:
+            stored.update(rebuild_coverage(db, missing, bar_interval, step))
+        else:
+            stored.update(scan_runs(db, missing, bar_interval, step, start_time, end_time))
+
+    # Concurrent writers may leave touching ranges; merging on read keeps
+    # them from showing up as zero-length gaps.
+    return {
+        sid: _clip(_merge_ranges(ranges, step), start_time, end_time)
+        for sid, ranges in stored.items()
+    }
+
+
+def coverage_ranges(
+    db,
+    symbol_id: int,
+    bar_interval: str,
+    step: int,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> list[Range]:
+    """Filled ranges of one series, ascending, clipped to [start_time, end_time]."""
+    return coverage_ranges_many(
+        db, [symbol_id], bar_interval, step, start_time, end_time,
+    ).get(symbol_id, [])
+
+
+def gaps_between(ranges: list[Range], step: int) -> list[tuple[int, int, int]]:
+    """(left_open_time, right_open_time, missing_count) for each hole between ranges."""
+    gaps: list[tuple[int, int, int]] = []
+    for (_, left_t), (right_t, _) in zip(ranges, ranges[1:]):
+        delta = right_t - left_t
+        if delta > step:
+            gaps.append((left_t, right_t, delta // step - 1))
+    return gaps
+
+
+def find_gaps_many(
+    db,
+    symbol_ids: Iterable[int],
+    bar_interval: str,
+    step: int,
+    start_time: int | None = None,
+    end_time: int | None = None,
+) -> dict[int, list[tuple[int, int, int]]]:
+    """Internal gaps of several series of one interval, keyed by symbol id."""
+    ranges = coverage_ranges_many(db, symbol_ids, bar_interval, step, start_time, end_time)
+    return {sid: gaps_between(r, step) for sid, r in ranges.items()}
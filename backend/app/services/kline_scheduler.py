@@ -3,35 +3,79 @@ Background scheduler that periodically fetches klines for all symbols in the
 superadmin's watchlists and persists them to MariaDB.
 
 Main intervals (1m, 15m, 1h, 4h, 1d) are fetched directly from APIs.
-Derived intervals (3m, 5m, 30m, 1w, 1M) are aggregated from stored data.
+Derived intervals (3m, 5m, 30m, 1w, 1M) are aggregated from stored data into
+epoch-aligned buckets. Only buckets touched by newly written or corrected
+source bars (plus the newest, possibly partial, derived bucket) are recomputed.
 
 Two-tier cycle:
-  - Fast cycle (every CYCLE_INTERVAL_SECONDS, default 15min): tail-fill + aggregation
-  - Deep cycle (every DEEP_CYCLE_INTERVAL_SECONDS, default 24h): full-history backfill
-    for new symbols, early-gap backfill, internal gap scan, and auto-correct.
+  - Fast cycle (close-driven): every (symbol, interval) series sits on a due-time
+    heap at its next bar close + CLOSE_GRACE_SECONDS. Whatever is due is
+    tail-filled together, then the derived intervals it feeds are aggregated.
+    Stock series keep a CYCLE_INTERVAL_SECONDS floor since market hours are
+    not modelled. Crypto series with a live Binance kline stream are kept
+    current by its closed-bar events (market:kline_stream); REST tail fill
+    runs only without a stream or after a stream gap/reconnect.
+  - Deep work (full-history backfill for new symbols, early-gap backfill,
+    internal gap scan, auto-correct) runs in its own task, time-sliced: each
+    slice gives at most DEEP_TASKS_PER_CYCLE symbols their deep pass, rotating
+    so every symbol is visited once per DEEP_CYCLE_INTERVAL_SECONDS (default
+    24h) and load stays flat. Symbols with empty series or an unfinished
+    backfill jump the rotation. A long backfill therefore never delays a fast
+    cycle, and deep requests leave DEEP_RATE_HEADROOM of each upstream rate
+    limit free for the fast cycle.
+
+With several replicas, symbols are sharded over a consistent-hash ring of
+live instances (Redis heartbeats + a leader lease, see scheduler_cluster) and
+rebalanced whenever an instance joins or leaves.
+
+Writes are buffered per series and flushed through one session with multi-row
+upserts at stage boundaries (or once WRITE_FLUSH_ROWS rows are pending), so a
+cycle costs a handful of commits instead of one per (symbol, interval).
+Internal gaps come from the persistent coverage index (kline_coverage), which
+every write keeps up to date, rather than from a full-history scan.
+
+Auto-correct hashes the API window in aligned blocks of
+CORRECTION_BLOCK_BARS bars and remembers each block's digest once the DB is
+known to match it. Later passes only load and diff blocks whose digest
+changed, or that were written to since.
 """
 
 import asyncio
+import contextvars
+import hashlib
+import heapq
 import logging
 import os
 import time
 from collections import deque
-from datetime import datetime, timezone
 from logging.handlers import TimedRotatingFileHandler
 from typing import Any
 
+from sqlalchemy import func
+
 from app.database.connection import SessionLocal
-from app.database.models import Symbol, Kline, User, Watchlist, WatchlistItem
+from app.database.models import Kline, User, Watchlist, WatchlistItem
+from app.services.kline_backfill import backfill_range, pending_backfills
+from app.services.kline_coverage import find_gaps_many, invalidate_coverage
 from app.services.klines_db_service import (
     fetch_klines_from_api,
-    save_klines,
-    load_klines_from_db,
-    upsert_symbol,
-    infer_symbol_row,
+    save_klines_multi,
+    load_klines_range,
+    resolve_symbol_ids,
     _bar_interval_seconds,
     _to_unix_seconds,
     use_stock_kline_api,
 )
+from app.services.scheduler_cluster import SchedulerCluster
+from app.services.scheduler_metrics import SchedulerMetrics
+from app.services.websocket_manager import manager
+from app.services.resampler import (
+    bucket_start,
+    from_candles,
+    next_bucket_start,
+    resample_interval,
+    to_candles,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -52,14 +96,15 @@ logger.addHandler(_file_handler)
 # ── Intervals fetched from API ────────────────────────────────────────────
 MAIN_INTERVALS = ("1m", "15m", "1h", "4h", "1d")
 
-# Derived interval → (source_interval, factor | "calendar_month")
-DERIVED_MAP: dict[str, tuple[str, int | str]] = {
-    "3m": ("1m", 3),
-    "5m": ("1m", 5),
-    "30m": ("15m", 2),
-    "1w": ("1d", 7),
-    "1M": ("1d", "calendar_month"),
+# Derived interval → source interval. Buckets are aligned by bucket_start().
+DERIVED_MAP: dict[str, str] = {
+    "3m": "1m",
+    "5m": "1m",
+    "30m": "15m",
+    "1w": "1d",
+    "1M": "1d",
 }
+SOURCE_INTERVALS = tuple(sorted(set(DERIVED_MAP.values())))
 
 # Binance-style intervals → seconds (same as klines_db_service).
 _BAR_INTERVAL_SECONDS: dict[str, int] = {
@@ -75,104 +120,560 @@ _BAR_INTERVAL_SECONDS: dict[str, int] = {
     "1M": 30 * 86_400,
 }
 
+# Set inside the deep-work task (and the backfill tasks it spawns) so upstream
+# requests made there leave rate-limit headroom for the fast cycle.
+_deep_work: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "kline_scheduler_deep_work", default=False,
+)
+
+
+def _merge_spans(spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Merge overlapping inclusive (lo, hi) spans."""
+    merged: list[tuple[int, int]] = []
+    for lo, hi in sorted(spans):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _block_digests(klines: list[dict[str, Any]], block_seconds: int) -> dict[int, str]:
+    """Digest of the OHLCV of each aligned block, keyed by block open time.
+
+    Values are rounded to the stored precision (8 decimals) so float noise
+    from the API does not register as a change.
+    """
+    blocks: dict[int, Any] = {}
+    for k in sorted(klines, key=lambda k: int(k["time"])):
+        t = int(k["time"])
+        h = blocks.get(t // block_seconds * block_seconds)
+        if h is None:
+            h = blocks[t // block_seconds * block_seconds] = hashlib.blake2b(digest_size=16)
+        h.update(
+            (
+                f"{t}:{float(k['open']):.8f}:{float(k['high']):.8f}:"
+                f"{float(k['low']):.8f}:{float(k['close']):.8f}:{float(k['volume']):.8f};"
+            ).encode()
+        )
+    return {start: h.hexdigest() for start, h in blocks.items()}
+
 
 class RateLimiter:
-    """Sliding-window per-minute call cap for a single async consumer."""
+    """Sliding-window per-minute call cap, safe to share between coroutines."""
 
     def __init__(self, max_calls_per_minute: int, name: str = "rate_limiter") -> None:
         self.max_calls = max_calls_per_minute
         self.name = name
         self._timestamps: deque[float] = deque()
 
-    async def acquire(self) -> None:
+    async def acquire(self, reserve: int = 0) -> None:
+        """Wait for a free call slot, leaving the last `reserve` slots unused."""
         now = time.monotonic()
         while self._timestamps and self._timestamps[0] < now - 60.0:
             self._timestamps.popleft()
-        if len(self._timestamps) >= self.max_calls:
-            wait = self._timestamps[0] + 60.0 - now + 0.1
+        cap = max(1, self.max_calls - reserve)
+        if len(self._timestamps) >= cap:
+            wait = self._timestamps[len(self._timestamps) - cap] + 60.0 - now + 0.1
             if wait > 0:
                 logger.debug(
                     "RateLimiter[%s]: waiting %.1fs (%d/%d used)",
-                    self.name, wait, len(self._timestamps), self.max_calls,
+                    self.name, wait, len(self._timestamps), cap,
                 )
                 await asyncio.sleep(wait)
-                return await self.acquire()
+                return await self.acquire(reserve)
         self._timestamps.append(time.monotonic())
 
 
 class KlineScheduler:
     """Periodically fetches & persists klines for superadmin watchlist symbols."""
 
+    # Minimum spacing between checks of one stock series (market hours unknown).
     CYCLE_INTERVAL_SECONDS = int(os.getenv("KLINE_SCHEDULER_CYCLE_S", "900"))  # 15 min
+    # Series are fetched this long after each bar close, once upstream has it.
+    CLOSE_GRACE_SECONDS = int(os.getenv("KLINE_SCHEDULER_CLOSE_GRACE_S", "5"))
+    # Retry delay when a fetch failed or the closed bar was not published yet.
+    RETRY_SECONDS = int(os.getenv("KLINE_SCHEDULER_RETRY_S", "30"))
+    # How often the superadmin watchlists are re-read for added/removed symbols.
+    SYMBOL_REFRESH_SECONDS = int(os.getenv("KLINE_SCHEDULER_SYMBOL_REFRESH_S", "60"))
+    # Period in which every owned symbol gets one deep pass (0 disables deep work).
     DEEP_CYCLE_INTERVAL_SECONDS = int(os.getenv("KLINE_SCHEDULER_DEEP_CYCLE_S", "86400"))  # 24h
+    # Max symbols given a deep pass in one deep slice.
+    DEEP_TASKS_PER_CYCLE = int(os.getenv("KLINE_SCHEDULER_DEEP_TASKS_PER_CYCLE", "2"))
     TAIL_FETCH_LIMIT = int(os.getenv("KLINE_SCHEDULER_TAIL_LIMIT", "100"))
     BACKFILL_LIMIT_1M = int(os.getenv("KLINE_SCHEDULER_BACKFILL_LIMIT_1M", "1000000"))
     BACKFILL_LIMIT = int(os.getenv("KLINE_SCHEDULER_BACKFILL_LIMIT", "200000"))
-    SCAN_WINDOW = int(os.getenv("KLINE_SCHEDULER_SCAN_WINDOW", "5000"))
+    # Full backfills are split into this many time ranges, fetched concurrently.
+    BACKFILL_PARTITIONS = int(os.getenv("KLINE_SCHEDULER_BACKFILL_PARTITIONS", "8"))
+    BACKFILL_CONCURRENCY = int(os.getenv("KLINE_SCHEDULER_BACKFILL_CONCURRENCY", "4"))
     CORRECTION_LIMIT = int(os.getenv("KLINE_SCHEDULER_CORRECTION_LIMIT", "200"))
+    # Auto-correct compares the API window in blocks of this many bars and only
+    # diffs blocks whose digest changed; verified digests expire after the TTL.
+    CORRECTION_BLOCK_BARS = int(os.getenv("KLINE_SCHEDULER_CORRECTION_BLOCK_BARS", "50"))
+    CORRECTION_DIGEST_TTL_SECONDS = int(os.getenv("KLINE_SCHEDULER_CORRECTION_DIGEST_TTL_S", "604800"))
+    # Share of each upstream rate limit deep work leaves free for the fast cycle.
+    DEEP_RATE_HEADROOM = float(os.getenv("KLINE_SCHEDULER_DEEP_HEADROOM", "0.25"))
     BINANCE_RATE_LIMIT = int(os.getenv("KLINE_SCHEDULER_BINANCE_RPM", "600"))
     YFINANCE_RATE_LIMIT = int(os.getenv("KLINE_SCHEDULER_YFINANCE_RPM", "20"))
+    WRITE_FLUSH_ROWS = int(os.getenv("KLINE_SCHEDULER_WRITE_FLUSH_ROWS", "20000"))
+    WRITE_CHUNK_ROWS = int(os.getenv("KLINE_SCHEDULER_WRITE_CHUNK_ROWS", "5000"))
+    DERIVED_BOOTSTRAP_BARS = int(os.getenv("KLINE_SCHEDULER_DERIVED_BOOTSTRAP_BARS", "2000"))
+    DERIVED_PAGE_BARS = int(os.getenv("KLINE_SCHEDULER_DERIVED_PAGE_BARS", "50000"))
+    # Wall-clock budget for the fast-cycle tail-fill queue (0 = drain it fully).
+    FAST_CYCLE_BUDGET_SECONDS = float(os.getenv("KLINE_SCHEDULER_FAST_BUDGET_S", "0"))
 
     def __init__(self) -> None:
         self.running = False
         self._binance_limiter = RateLimiter(self.BINANCE_RATE_LIMIT, "binance")
         self._yfinance_limiter = RateLimiter(self.YFINANCE_RATE_LIMIT, "yfinance")
-        self._last_deep_cycle_time: float = 0.0
+        # Deep-work rotation: symbols in visit order, urgent ones (empty series
+        # or pending backfill) first, and fractional credit earned over time.
+        self._deep_rotation: deque[tuple[str, str]] = deque()
+        self._deep_urgent: list[tuple[str, str]] = []
+        self._deep_done_at: dict[tuple[str, str], float] = {}
+        self._deep_credit = 0.0
+        self._deep_accrued_at = time.monotonic()
+        # Set when urgent symbols are queued so the deep task starts at once.
+        self._deep_wake = asyncio.Event()
+        # (symbol, asset_type) → symbols.id, refreshed once per cycle.
+        self._symbol_ids: dict[tuple[str, str], int] = {}
+        # (symbol, asset_type, interval) → {open_time: candle}, pending flush.
+        self._write_buffer: dict[tuple[str, str, str], dict[int, dict]] = {}
+        self._buffered_rows = 0
+        # (symbol, asset_type, source_interval) → open_time spans written since
+        # the last aggregation; drives incremental derived-interval rebuilds.
+        self._dirty_spans: dict[tuple[str, str, str], list[tuple[int, int]]] = {}
+        # (symbol, asset_type, interval) → {block open_time: (digest, verified_at)}
+        # for auto-correct blocks whose DB rows matched the API.
+        self._block_digests: dict[tuple[str, str, str], dict[int, tuple[str, float]]] = {}
+        # (symbol, asset_type, interval) → next due unix time; the heap holds
+        # (due, series) entries and skips ones that no longer match _due_at.
+        self._due_at: dict[tuple[str, str, str], float] = {}
+        self._due_heap: list[tuple[float, tuple[str, str, str]]] = []
+        self._watched: set[tuple[str, str, str]] = set()
+        # (SYMBOL, interval) → watched non-stock (symbol, asset_type) series a
+        # live stream event for that upper-cased symbol may belong to.
+        self._stream_series: dict[tuple[str, str], list[tuple[str, str]]] = {}
+        # Replica membership / symbol ownership (Redis leases + hash ring).
+        self._cluster = SchedulerCluster()
+        self._metrics = SchedulerMetrics(self._cluster.instance_id)
+        self._ring_epoch = 0
+        # Owned watchlist symbols and when to re-read them (monotonic).
+        self._symbols: list[dict[str, str]] = []
+        self._next_refresh = 0.0
+        # Live Binance kline stream: newest closed open_time per (SYMBOL, interval),
+        # and the series whose stream is known to continue the stored history.
+        self._stream_last: dict[tuple[str, str], int] = {}
+        self._stream_synced: set[tuple[str, str]] = set()
 
     # ── Main loop ─────────────────────────────────────────────────────────
 
     async def run(self) -> None:
         self.running = True
         logger.info(
-            "KlineScheduler started (cycle=%ds, deep_cycle=%ds, "
-            "binance_rpm=%d, yfinance_rpm=%d)",
-            self.CYCLE_INTERVAL_SECONDS,
+            "KlineScheduler started (close_grace=%ds, symbol_refresh=%ds, "
+            "deep_cycle=%ds, deep_tasks=%d, binance_rpm=%d, yfinance_rpm=%d)",
+            self.CLOSE_GRACE_SECONDS,
+            self.SYMBOL_REFRESH_SECONDS,
             self.DEEP_CYCLE_INTERVAL_SECONDS,
+            self.DEEP_TASKS_PER_CYCLE,
             self.BINANCE_RATE_LIMIT,
             self.YFINANCE_RATE_LIMIT,
         )
 
-        while self.running:
-            cycle_start = time.monotonic()
-            now_ts = time.time()
-            is_deep = (
-                self.DEEP_CYCLE_INTERVAL_SECONDS > 0
-                and (now_ts - self._last_deep_cycle_time) >= self.DEEP_CYCLE_INTERVAL_SECONDS
-            )
+        manager.add_kline_stream_listener(self.on_stream_event)
+        await self._cluster.heartbeat()
+        cluster_task = asyncio.create_task(self._cluster.run())
+        self._ring_epoch = self._cluster.epoch
+        deep_task = asyncio.create_task(self._run_deep())
+        status_task = asyncio.create_task(self._status_loop())
 
+        while self.running:
             try:
-                symbols = self._load_superadmin_symbols_sync()
-                if not symbols:
-                    logger.info(
-                        "KlineScheduler: no superadmin watchlist symbols, sleeping…"
-                    )
-                else:
-                    logger.info(
-                        "KlineScheduler %s cycle: %d symbols",
-                        "DEEP" if is_deep else "fast", len(symbols),
-                    )
-                    await self._process_fast_cycle(symbols)
-                    if is_deep:
-                        logger.info("KlineScheduler: starting deep cycle work…")
-                        await self._process_deep_cycle(symbols)
-                        self._last_deep_cycle_time = time.time()
+                sleep_for = await self.step()
+                await asyncio.sleep(sleep_for)
             except asyncio.CancelledError:
                 break
-            except Exception:
-                logger.exception("KlineScheduler cycle failed")
 
-            elapsed = time.monotonic() - cycle_start
-            sleep_for = max(0.0, self.CYCLE_INTERVAL_SECONDS - elapsed)
+        cluster_task.cancel()
+        deep_task.cancel()
+        status_task.cancel()
+        await asyncio.gather(cluster_task, deep_task, status_task, return_exceptions=True)
+        logger.info("KlineScheduler stopped")
+
+    async def step(self) -> float:
+        """One scheduler iteration: refresh symbols when due and run the due
+        fast cycle. Returns how long to sleep before the next one.
+        """
+        due: list[tuple[str, str, str]] = []
+        try:
+            # Rebalance as soon as a replica joins or leaves.
+            if self._cluster.epoch != self._ring_epoch:
+                self._ring_epoch = self._cluster.epoch
+                self._next_refresh = 0.0
+            if time.monotonic() >= self._next_refresh:
+                self._symbols = self._owned_symbols(self._load_superadmin_symbols_sync())
+                self._sync_due(self._symbols)
+                self._sync_deep(self._symbols)
+                self._next_refresh = time.monotonic() + self.SYMBOL_REFRESH_SECONDS
+                if not self._symbols:
+                    logger.info(
+                        "KlineScheduler: no superadmin watchlist symbols owned, sleeping…"
+                    )
+
+            due = self._pop_due(time.time())
+            if due:
+                cycle_start = time.monotonic()
+                async with self._metrics.cycle("fast", due=len(due)) as summary:
+                    retry = await self._process_fast_cycle(due)
+                    summary["retry"] = len(retry)
+                self._reschedule(due, retry)
+                logger.info(
+                    "KlineScheduler fast cycle: %d due series in %.1fs (%d to retry)",
+                    len(due), time.monotonic() - cycle_start, len(retry),
+                )
+                due = []
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("KlineScheduler cycle failed")
+            self._reschedule(due, set(due))
+
+        return self._seconds_until_due(
+            min(
+                max(0.0, self._next_refresh - time.monotonic()),
+                self._cluster.heartbeat_seconds,
+            ),
+        )
+
+    async def _run_deep(self) -> None:
+        """Deep slices in their own task, so they never hold up a fast cycle."""
+        _deep_work.set(True)
+        while self.running:
+            sleep_for = await self.deep_step()
+            try:
+                await asyncio.wait_for(self._deep_wake.wait(), sleep_for)
+            except asyncio.TimeoutError:
+                pass
+            self._deep_wake.clear()
+
+    async def deep_step(self) -> float:
+        """Run one deep slice if one is due. Returns how long until the next."""
+        deep_batch = self._next_deep_batch()
+        if deep_batch:
             logger.info(
-                "KlineScheduler cycle finished in %.1fs (sleeping %.1fs)",
-                elapsed, sleep_for,
+                "KlineScheduler: deep slice %s",
+                ", ".join(f"{e['symbol']} ({e['asset_type']})" for e in deep_batch),
             )
             try:
-                await asyncio.sleep(sleep_for)
+                async with self._metrics.cycle(
+                    "deep", symbols=[e["symbol"] for e in deep_batch],
+                ):
+                    await self._process_deep_cycle(deep_batch)
             except asyncio.CancelledError:
-                break
+                raise
+            except Exception:
+                logger.exception("KlineScheduler deep slice failed")
+        return self._seconds_until_deep()
+
+    def _local_status(self) -> dict[str, Any]:
+        """This process's cluster role, queues and settings."""
+        now = time.time()
+        next_due = self._due_heap[0][0] if self._due_heap else None
+        return {
+            "running": self.running,
+            "instance_id": self._cluster.instance_id,
+            "is_leader": self._cluster.is_leader,
+            "members": self._cluster.members,
+            "watched_series": len(self._watched),
+            "due_series": len(self._due_at),
+            "next_due_in_s": round(max(0.0, next_due - now), 1) if next_due else None,
+            "deep_rotation": len(self._deep_rotation),
+            "deep_urgent": len(self._deep_urgent),
+            "buffered_rows": self._buffered_rows,
+            "settings": {
+                "close_grace_s": self.CLOSE_GRACE_SECONDS,
+                "retry_s": self.RETRY_SECONDS,
+                "fast_budget_s": self.FAST_CYCLE_BUDGET_SECONDS,
+                "deep_cycle_s": self.DEEP_CYCLE_INTERVAL_SECONDS,
+                "deep_tasks_per_cycle": self.DEEP_TASKS_PER_CYCLE,
+                "deep_headroom": self.DEEP_RATE_HEADROOM,
+                "binance_rpm": self.BINANCE_RATE_LIMIT,
+                "yfinance_rpm": self.YFINANCE_RATE_LIMIT,
+            },
+            "updated_at": round(now, 3),
+        }
+
+    def _status_ttl(self) -> float:
+        return 3 * self._cluster.heartbeat_seconds
+
+    async def _status_loop(self) -> None:
+        """Keep this replica's snapshot in Redis for /scheduler/status in other processes."""
+        while self.running:
+            await self._metrics.publish_status(self._local_status(), self._status_ttl())
+            await asyncio.sleep(self._cluster.heartbeat_seconds)
 
-        logger.info("KlineScheduler stopped")
+    async def status(self, runs: int = 20) -> dict[str, Any]:
+        """Snapshot for /scheduler/status: cluster role, queues, recent runs.
+
+        Top-level fields describe this process when it runs the scheduler,
+        else the leader (or first) replica that published to Redis, so a
+        standalone scheduler worker is reported by the API process.
+        """
+        instances = await self._metrics.instance_statuses(self._status_ttl())
+        if self.running:
+            local = self._local_status()
+            instances = sorted(
+                [s for s in instances if s.get("instance_id") != local["instance_id"]] + [local],
+                key=lambda s: s.get("instance_id", ""),
+            )
+            primary = local
+        elif instances:
+            primary = next((s for s in instances if s.get("is_leader")), instances[0])
+        else:
+            primary = self._local_status()
+        return {
+            **primary,
+            "instances": instances,
+            "runs": await self._metrics.recent_runs(runs),
+        }
+
+    def _owned_symbols(self, symbols: list[dict[str, str]]) -> list[dict[str, str]]:
+        """This replica's shard of the watchlist symbols."""
+        owned = [
+            entry for entry in symbols
+            if self._cluster.owns(entry["symbol"], entry["asset_type"])
+        ]
+        if len(owned) != len(symbols):
+            logger.info(
+                "KlineScheduler: owning %d of %d symbols (%d replica(s), leader=%s)",
+                len(owned), len(symbols), len(self._cluster.members), self._cluster.is_leader,
+            )
+        return owned
+
+    # ── Due-time heap ─────────────────────────────────────────────────────
+
+    def _next_due(self, series: tuple[str, str, str], now: float) -> float:
+        """Close of the current bar plus CLOSE_GRACE_SECONDS.
+
+        Market hours are not modelled, so stock series are additionally held
+        to at most one check per CYCLE_INTERVAL_SECONDS.
+        """
+        _, asset_type, interval = series
+        step = _bar_interval_seconds(interval) or self.CYCLE_INTERVAL_SECONDS
+        due = (int(now) // step + 1) * step + self.CLOSE_GRACE_SECONDS
+        if asset_type == "stock":
+            due = max(due, now + self.CYCLE_INTERVAL_SECONDS)
+        return float(due)
+
+    def _schedule(self, series: tuple[str, str, str], at: float) -> None:
+        self._due_at[series] = at
+        heapq.heappush(self._due_heap, (at, series))
+
+    def _sync_due(self, symbols: list[dict[str, str]]) -> None:
+        """Track exactly the watchlist's series; new ones are due immediately."""
+        wanted = {
+            (entry["symbol"], entry["asset_type"], interval)
+            for entry in symbols
+            for interval in MAIN_INTERVALS
+        }
+        self._watched = wanted
+        self._stream_series = {}
+        for symbol, asset_type, interval in wanted:
+            if asset_type != "stock":
+                self._stream_series.setdefault((symbol.upper(), interval), []).append(
+                    (symbol, asset_type),
+                )
+        for series in list(self._due_at):
+            if series not in wanted:
+                del self._due_at[series]
+        now = time.time()
+        for series in wanted:
+            if series not in self._due_at:
+                self._schedule(series, now)
+        # Drop heap entries for removed or rescheduled series once they pile up.
+        if len(self._due_heap) > 4 * max(1, len(self._due_at)):
+            self._due_heap = [(at, s) for s, at in self._due_at.items()]
+            heapq.heapify(self._due_heap)
+
+    def _pop_due(self, now: float) -> list[tuple[str, str, str]]:
+        """Remove and return every series whose due time has passed."""
+        due: list[tuple[str, str, str]] = []
+        while self._due_heap and self._due_heap[0][0] <= now:
+            at, series = heapq.heappop(self._due_heap)
+            # Stale entry: series was removed or rescheduled since it was pushed.
+            if self._due_at.get(series) != at:
+                continue
+            del self._due_at[series]
+            due.append(series)
+        return due
+
+    def _reschedule(
+        self,
+        due: list[tuple[str, str, str]],
+        retry: set[tuple[str, str, str]],
+    ) -> None:
+        """Queue processed series at their next bar close; `retry` ones sooner."""
+        now = time.time()
+        for series in due:
+            if series in self._due_at:
+                continue
+            next_due = self._next_due(series, now)
+            if series in retry:
+                next_due = min(next_due, now + self.RETRY_SECONDS)
+            self._schedule(series, next_due)
+
+    # ── Deep-work rotation ────────────────────────────────────────────────
+
+    def _sync_deep(self, symbols: list[dict[str, str]]) -> None:
+        """Align the deep rotation with the owned symbols and flag urgent ones.
+
+        A symbol is urgent when a main series is still empty or has pending
+        backfill partitions, at most once per DEEP_CYCLE_INTERVAL_SECONDS so
+        series the API cannot fill are not retried every refresh.
+        """
+        if self.DEEP_CYCLE_INTERVAL_SECONDS <= 0:
+            return
+        pairs = [(entry["symbol"], entry["asset_type"]) for entry in symbols]
+        owned = set(pairs)
+        self._deep_rotation = deque(p for p in self._deep_rotation if p in owned)
+        known = set(self._deep_rotation)
+        self._deep_rotation.extend(p for p in pairs if p not in known)
+        self._deep_urgent = [p for p in self._deep_urgent if p in owned]
+
+        ids = self._resolve_symbol_ids(symbols)
+        ranges = self._query_db_ranges(list(ids.values()), MAIN_INTERVALS)
+        db = SessionLocal()
+        try:
+            pending = pending_backfills(db, ids.values())
+        finally:
+            db.close()
+
+        now = time.monotonic()
+        for pair in pairs:
+            if pair in self._deep_urgent or self._is_alphavantage(*pair):
+                continue
+            done_at = self._deep_done_at.get(pair)
+            if done_at is not None and now - done_at < self.DEEP_CYCLE_INTERVAL_SECONDS:
+                continue
+            sid = ids.get(pair)
+            if any(
+                (sid, interval) not in ranges or (sid, interval) in pending
+                for interval in MAIN_INTERVALS
+            ):
+                self._deep_urgent.append(pair)
+        if self._deep_urgent:
+            self._deep_wake.set()
+
+    def _next_deep_batch(self) -> list[dict[str, str]]:
+        """Symbols due a deep pass now, at most DEEP_TASKS_PER_CYCLE.
+
+        Credit accrues at len(rotation) / DEEP_CYCLE_INTERVAL_SECONDS symbols
+        per second (capped at one batch, so idle time never causes a burst);
+        urgent symbols are served first and do not spend credit.
+        """
+        if self.DEEP_CYCLE_INTERVAL_SECONDS <= 0 or not self._deep_rotation:
+            return []
+        now = time.monotonic()
+        budget = max(1, self.DEEP_TASKS_PER_CYCLE)
+        self._deep_credit = min(
+            float(budget),
+            self._deep_credit
+            + len(self._deep_rotation) * (now - self._deep_accrued_at)
+            / self.DEEP_CYCLE_INTERVAL_SECONDS,
+        )
+        self._deep_accrued_at = now
+
+        batch: list[tuple[str, str]] = []
+        while self._deep_urgent and len(batch) < budget:
+            batch.append(self._deep_urgent.pop(0))
+        while self._deep_credit >= 1 and len(batch) < budget:
+            pair = self._deep_rotation.popleft()
+            self._deep_rotation.append(pair)
+            self._deep_credit -= 1
+            if pair not in batch:
+                batch.append(pair)
+        for pair in batch:
+            self._deep_done_at[pair] = now
+        return [{"symbol": s, "asset_type": a} for s, a in batch]
+
+    def _seconds_until_deep(self) -> float:
+        """Time until the next deep slice is due, at most SYMBOL_REFRESH_SECONDS
+        (a refresh may queue urgent symbols)."""
+        cap = float(self.SYMBOL_REFRESH_SECONDS)
+        if self.DEEP_CYCLE_INTERVAL_SECONDS <= 0 or not self._deep_rotation:
+            return cap
+        if self._deep_urgent:
+            return 0.0
+        per_symbol = self.DEEP_CYCLE_INTERVAL_SECONDS / len(self._deep_rotation)
+        elapsed = time.monotonic() - self._deep_accrued_at
+        return min(cap, max(0.0, (1 - self._deep_credit) * per_symbol - elapsed))
+
+    # ── Live stream events ────────────────────────────────────────────────
+
+    def on_stream_event(self, event: dict) -> None:
+        """Handle a market:kline_stream event from the Binance streamer.
+
+        A closed bar that directly follows the previous streamed bar keeps the
+        series current without REST; its candle is buffered like any fetched
+        one. A jump of more than one bar, or a stream reconnect, means bars may
+        have been missed, so those series go back to REST tail fills.
+        """
+        if event.get("event") == "reset":
+            if self._stream_synced:
+                logger.info(
+                    "KlineScheduler: %s stream reconnected — %d series back on REST",
+                    event.get("market"), len(self._stream_synced),
+                )
+            self._stream_synced.clear()
+            return
+        if event.get("event") != "closed":
+            return
+
+        interval = event.get("interval")
+        step = _bar_interval_seconds(interval) if interval in MAIN_INTERVALS else None
+        if not step:
+            return
+        symbol = str(event.get("symbol", "")).upper()
+        candle = event.get("data") or {}
+        open_time = int(candle.get("time", 0))
+        key = (symbol, interval)
+
+        prev = self._stream_last.get(key)
+        if prev is not None and open_time <= prev:
+            return
+        if prev is not None and open_time - prev > step and key in self._stream_synced:
+            logger.info(
+                "KlineScheduler: stream gap %s @ %s (%d bar(s) missed) — back on REST",
+                symbol, interval, (open_time - prev) // step - 1,
+            )
+            self._stream_synced.discard(key)
+        self._stream_last[key] = open_time
+
+        # Older publishers omit asset_type; match every watched series then.
+        event_type = event.get("asset_type")
+        for watched_symbol, asset_type in self._stream_series.get(key, ()):
+            if event_type is None or asset_type == event_type:
+                self._persist_klines(watched_symbol, asset_type, interval, [candle])
+
+    def _stream_current(self, symbol: str, interval: str, latest_closed: int) -> bool:
+        key = (symbol.upper(), interval)
+        return key in self._stream_synced and self._stream_last.get(key, 0) >= latest_closed
+
+    def _mark_stream_synced(self, symbol: str, interval: str, latest_closed: int) -> None:
+        """After REST brought a series current, trust its live stream from here on."""
+        step = _bar_interval_seconds(interval) or 0
+        key = (symbol.upper(), interval)
+        if self._stream_last.get(key, 0) >= latest_closed - step:
+            self._stream_synced.add(key)
+
+    def _seconds_until_due(self, cap: float) -> float:
+        """Sleep until the earliest live due time, at most `cap` seconds."""
+        while self._due_heap and self._due_at.get(self._due_heap[0][1]) != self._due_heap[0][0]:
+            heapq.heappop(self._due_heap)
+        if self._due_heap:
+            cap = min(cap, self._due_heap[0][0] - time.time())
+        return max(0.5, cap)
 
     # ── Symbol discovery ──────────────────────────────────────────────────
 
@@ -223,54 +724,204 @@ class KlineScheduler:
 
     # ── Fast cycle ────────────────────────────────────────────────────────
 
-    async def _process_fast_cycle(self, symbols: list[dict[str, str]]) -> None:
-        """Tail-fill main intervals, then aggregate derived intervals."""
-        for entry in symbols:
-            symbol = entry["symbol"]
-            asset_type = entry["asset_type"]
-            logger.info(
-                "KlineScheduler: fast cycle %s %s — start", symbol, asset_type,
-            )
+    async def _process_fast_cycle(
+        self, due: list[tuple[str, str, str]],
+    ) -> set[tuple[str, str, str]]:
+        """Tail-fill the due (symbol, asset_type, interval) series, then
+        aggregate the derived intervals they feed.
+
+        DB ranges for every series come from one grouped query, and each stage
+        flushes its buffered writes through a single session. Tail fills run
+        from a priority queue (live viewers first, then staleness) so watched
+        series are refreshed first when FAST_CYCLE_BUDGET_SECONDS cuts a cycle
+        short. Returns the series that should be retried soon: failed, still
+        short of the latest closed bar, or deferred by the budget.
+        """
+        symbols: list[dict[str, str]] = []
+        due_intervals: dict[tuple[str, str], set[str]] = {}
+        for symbol, asset_type, interval in due:
+            if (symbol, asset_type) not in due_intervals:
+                due_intervals[(symbol, asset_type)] = set()
+                symbols.append({"symbol": symbol, "asset_type": asset_type})
+            due_intervals[(symbol, asset_type)].add(interval)
+
+        ids = self._resolve_symbol_ids(symbols)
+        ranges = self._query_db_ranges(list(ids.values()), MAIN_INTERVALS)
+
+        viewers = await manager.shared_viewer_counts()
+        queue = self._fast_cycle_queue(due, ids, ranges, viewers)
+        deadline = (
+            time.monotonic() + self.FAST_CYCLE_BUDGET_SECONDS
+            if self.FAST_CYCLE_BUDGET_SECONDS > 0
+            else None
+        )
+        retry: set[tuple[str, str, str]] = set()
+        filled = 0
+        stage_start = time.monotonic()
+        while queue:
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info(
+                    "KlineScheduler: fast cycle budget spent after %d series, "
+                    "deferring %d",
+                    filled, len(queue),
+                )
+                retry.update((s, a, i) for _, s, a, i, _ in queue)
+                break
+            _, symbol, asset_type, interval, newest_db_t = heapq.heappop(queue)
             try:
-                for interval in MAIN_INTERVALS:
-                    await self._tail_fill(symbol, interval, asset_type)
-
-                for target_interval, (src_interval, factor) in DERIVED_MAP.items():
-                    await self._aggregate_derived(
-                        symbol, src_interval, factor, target_interval, asset_type,
-                    )
+                if await self._tail_fill(symbol, interval, asset_type, newest_db_t):
+                    if asset_type != "stock":
+                        step = _bar_interval_seconds(interval) or 0
+                        latest_closed = (int(time.time()) // step) * step - step
+                        self._mark_stream_synced(symbol, interval, latest_closed)
+                else:
+                    retry.add((symbol, asset_type, interval))
             except Exception:
                 logger.exception(
-                    "KlineScheduler: failed symbol %s (%s)", symbol, asset_type,
+                    "KlineScheduler: tail fill failed %s (%s) @ %s",
+                    symbol, asset_type, interval,
                 )
+                retry.add((symbol, asset_type, interval))
+            filled += 1
+        self._flush_writes()
+        self._metrics.stage("tail_fill", time.monotonic() - stage_start)
+
+        stage_start = time.monotonic()
+        agg_ranges = self._query_db_ranges(
+            list(ids.values()), SOURCE_INTERVALS + tuple(DERIVED_MAP),
+        )
+        db = SessionLocal()
+        try:
+            for entry in symbols:
+                symbol = entry["symbol"]
+                asset_type = entry["asset_type"]
+                sid = ids.get((symbol, asset_type))
+                if sid is None:
+                    continue
+                # Rebuild targets whose source was just due or has pending
+                # writes (e.g. from the deep cycle).
+                sources = {
+                    src for src in SOURCE_INTERVALS
+                    if src in due_intervals[(symbol, asset_type)]
+                    or self._dirty_spans.get((symbol, asset_type, src))
+                }
+                try:
+                    for target_interval, src_interval in DERIVED_MAP.items():
+                        if src_interval not in sources:
+                            continue
+                        spans = self._derived_spans(
+                            sid, symbol, asset_type,
+                            src_interval, target_interval, agg_ranges,
+                        )
+                        await self._aggregate_derived(
+                            db, sid, symbol, asset_type,
+                            src_interval, target_interval, spans,
+                        )
+                    for src_interval in sources:
+                        self._dirty_spans.pop((symbol, asset_type, src_interval), None)
+                except Exception:
+                    db.rollback()
+                    logger.exception(
+                        "KlineScheduler: aggregation failed for %s (%s)",
+                        symbol, asset_type,
+                    )
+            db.commit()
+        finally:
+            db.close()
+        self._flush_writes()
+        self._metrics.stage("aggregation", time.monotonic() - stage_start)
+        return retry
+
+    def _fast_cycle_queue(
+        self,
+        due: list[tuple[str, str, str]],
+        ids: dict[tuple[str, str], int],
+        ranges: dict[tuple[int, str], tuple[int | None, int | None]],
+        viewers: dict[tuple[str, str], int],
+    ) -> list[tuple]:
+        """Heap of stale due series, most wanted first.
+
+        Ordered by live viewers of the series (derived-interval rooms count
+        toward their source interval), then viewers of the symbol on any
+        interval, then bars behind the latest closed bar. Series that are
+        already current, in the DB or via a synced live stream, are left out.
+        """
+        series_viewers: dict[tuple[str, str], int] = {}
+        symbol_viewers: dict[str, int] = {}
+        for (symbol, interval), n in viewers.items():
+            source = interval if interval in MAIN_INTERVALS else DERIVED_MAP.get(interval)
+            if source:
+                series_viewers[(symbol, source)] = series_viewers.get((symbol, source), 0) + n
+            symbol_viewers[symbol] = symbol_viewers.get(symbol, 0) + n
+
+        now = int(time.time())
+        queue: list[tuple] = []
+        stream_served = 0
+        for symbol, asset_type, interval in due:
+            step = _bar_interval_seconds(interval)
+            if not step:
+                continue
+            sid = ids.get((symbol, asset_type))
+            newest_db_t, _ = ranges.get((sid, interval), (None, None))
+            latest_closed = (now // step) * step - step
+            if asset_type != "stock" and self._stream_current(symbol, interval, latest_closed):
+                stream_served += 1
+                continue
+            if newest_db_t is None:
+                # Empty series rank as maximally stale.
+                behind = now // step
+            else:
+                behind = (latest_closed - newest_db_t) // step
+                if behind <= 0:
+                    continue
+            priority = (
+                -series_viewers.get((symbol.upper(), interval), 0),
+                -symbol_viewers.get(symbol.upper(), 0),
+                -behind,
+                len(queue),
+            )
+            queue.append((priority, symbol, asset_type, interval, newest_db_t))
+        heapq.heapify(queue)
+        if stream_served:
             logger.info(
-                "KlineScheduler: fast cycle %s %s — done", symbol, asset_type,
+                "KlineScheduler: %d due series already current from the live stream",
+                stream_served,
             )
+        return queue
 
     # ── Deep cycle ────────────────────────────────────────────────────────
 
     async def _process_deep_cycle(self, symbols: list[dict[str, str]]) -> None:
         """Full-history backfill for new symbols, early-gap backfill, internal
-        gap scan, and auto-correct."""
+        gap scan, and auto-correct — each stage across the given slice."""
+        ids = self._resolve_symbol_ids(symbols)
+        ranges = self._query_db_ranges(list(ids.values()), MAIN_INTERVALS)
+        db = SessionLocal()
+        try:
+            pending = pending_backfills(db, ids.values())
+        finally:
+            db.close()
+
+        # 1) Backfill: full history for new series (or resume an interrupted
+        # one), early gaps otherwise.
+        stage_start = time.monotonic()
         for entry in symbols:
             symbol = entry["symbol"]
             asset_type = entry["asset_type"]
+            sid = ids.get((symbol, asset_type))
+            if self._is_alphavantage(symbol, asset_type):
+                continue
             logger.info(
-                "KlineScheduler: deep cycle %s %s — start", symbol, asset_type,
+                "KlineScheduler: deep cycle %s %s — backfill", symbol, asset_type,
             )
             try:
                 for interval in MAIN_INTERVALS:
-                    if self._is_alphavantage(symbol, asset_type):
-                        continue
-
                     # Full backfill if DB still empty (newly added symbol).
                     step = _bar_interval_seconds(interval)
                     if not step:
                         continue
-                    newest, earliest = self._query_db_range(
-                        symbol, asset_type, interval,
-                    )
-                    if newest is None:
+                    newest, earliest = ranges.get((sid, interval), (None, None))
+                    if newest is None or (sid, interval) in pending:
                         await self._full_backfill(symbol, interval, asset_type)
                         continue
 
@@ -280,41 +931,80 @@ class KlineScheduler:
                         await self._backfill_early_gap(
                             symbol, interval, asset_type, step, earliest,
                         )
+            except Exception:
+                logger.exception(
+                    "KlineScheduler: deep backfill failed for %s (%s)",
+                    symbol, asset_type,
+                )
+        # Gap scan and auto-correct read the DB, so land backfills first.
+        self._flush_writes()
+        self._metrics.stage("backfill", time.monotonic() - stage_start)
+
+        # 2) Internal gap scan (crypto only): one lookup per interval for all symbols.
+        stage_start = time.monotonic()
+        crypto_ids = {
+            pair: sid for pair, sid in ids.items() if pair[1] != "stock"
+        }
+        for interval in MAIN_INTERVALS:
+            step = _bar_interval_seconds(interval)
+            if not step or not crypto_ids:
+                continue
+            try:
+                gaps_by_sid = self._scan_gaps_sync(list(crypto_ids.values()), interval, step)
+            except Exception:
+                logger.exception(
+                    "KlineScheduler: internal gap scan failed @ %s", interval,
+                )
+                continue
+            for (symbol, asset_type), sid in crypto_ids.items():
+                try:
+                    await self._fill_internal_gaps(
+                        symbol, interval, asset_type, step, gaps_by_sid.get(sid, []),
+                    )
+                except Exception:
+                    logger.exception(
+                        "KlineScheduler: gap fill failed for %s (%s) @ %s",
+                        symbol, asset_type, interval,
+                    )
+        self._flush_writes()
+        self._metrics.stage("gap_scan", time.monotonic() - stage_start)
 
-                # Internal gap scan (crypto only).
-                if asset_type != "stock":
-                    for interval in MAIN_INTERVALS:
-                        await self._scan_and_fill_internal_gaps(
-                            symbol, interval, asset_type,
-                        )
-
-                # Auto-correct recent candles.
+        # 3) Auto-correct recent candles.
+        stage_start = time.monotonic()
+        for entry in symbols:
+            symbol = entry["symbol"]
+            asset_type = entry["asset_type"]
+            try:
                 for interval in MAIN_INTERVALS:
                     await self._auto_correct(symbol, interval, asset_type)
-
             except Exception:
                 logger.exception(
-                    "KlineScheduler: deep cycle failed for %s (%s)",
+                    "KlineScheduler: auto-correct failed for %s (%s)",
                     symbol, asset_type,
                 )
+            self._flush_writes()
             logger.info(
                 "KlineScheduler: deep cycle %s %s — done", symbol, asset_type,
             )
+        self._metrics.stage("correction", time.monotonic() - stage_start)
 
     # ── Tail fill (fast cycle) ────────────────────────────────────────────
 
     async def _tail_fill(
         self, symbol: str, interval: str, asset_type: str,
-    ) -> None:
-        """Fetch and persist only the missing candles between newest DB and now."""
+        newest_db_t: int | None,
+    ) -> bool:
+        """Fetch and persist only the missing candles between newest DB and now.
+
+        Returns False when a crypto series is still short of the latest closed
+        bar afterwards (upstream not caught up yet), so the caller can retry.
+        """
         step = _bar_interval_seconds(interval)
         if not step:
-            return
+            return True
 
         if self._is_alphavantage(symbol, asset_type):
-            return
-
-        newest_db_t, _ = self._query_db_range(symbol, asset_type, interval)
+            return True
 
         now = int(time.time())
         latest_closed = (now // step) * step - step
@@ -361,23 +1051,30 @@ class KlineScheduler:
                 "KlineScheduler: tail fill %s %s @ %s — no gap, DB is current",
                 symbol, asset_type, interval,
             )
-            return
+            return True
 
         if not klines:
             logger.info(
                 "KlineScheduler: tail fill %s %s @ %s — API returned 0 klines",
                 symbol, asset_type, interval,
             )
-            return
+            return asset_type == "stock"
 
         self._persist_klines(symbol, asset_type, interval, klines)
+        newest_fetched = max(_to_unix_seconds(k["time"]) for k in klines)
+        return asset_type == "stock" or newest_fetched >= latest_closed
 
     # ── Full-history backfill (deep cycle, empty DB) ──────────────────────
 
     async def _full_backfill(
         self, symbol: str, interval: str, asset_type: str,
     ) -> None:
-        """Walk backwards through all available API data to fill an empty DB."""
+        """Fill an empty series with up to BACKFILL_LIMIT(_1M) bars of history.
+
+        Binance series use the partitioned, checkpointed backfill engine, which
+        writes page by page and resumes unfinished partitions on the next deep
+        cycle. Stock APIs cannot page by time, so they keep a single fetch.
+        """
         backfill_limit = (
             self.BACKFILL_LIMIT_1M if interval == "1m" else self.BACKFILL_LIMIT
         )
@@ -385,17 +1082,41 @@ class KlineScheduler:
             "KlineScheduler: full backfill %s %s @ %s (limit=%d)",
             symbol, asset_type, interval, backfill_limit,
         )
-        await self._throttle(symbol, asset_type)
-        klines = await fetch_klines_from_api(
-            symbol, asset_type, interval, limit=backfill_limit,
-        )
-        if klines:
-            self._persist_klines(symbol, asset_type, interval, klines)
-        else:
-            logger.info(
-                "KlineScheduler: full backfill %s %s @ %s — API returned 0 klines",
-                symbol, asset_type, interval,
+        if use_stock_kline_api(symbol, asset_type):
+            await self._throttle(symbol, asset_type)
+            klines = await fetch_klines_from_api(
+                symbol, asset_type, interval, limit=backfill_limit,
             )
+            if klines:
+                self._persist_klines(symbol, asset_type, interval, klines)
+            else:
+                logger.info(
+                    "KlineScheduler: full backfill %s %s @ %s — API returned 0 klines",
+                    symbol, asset_type, interval,
+                )
+            return
+
+        step = _bar_interval_seconds(interval)
+        sid = self._symbol_id(symbol, asset_type)
+        if not step or sid is None:
+            return
+        latest_closed = (int(time.time()) // step) * step - step
+
+        async def throttle() -> None:
+            await self._throttle(symbol, asset_type)
+
+        saved, first_t, last_t = await backfill_range(
+            symbol, asset_type, sid, interval, step,
+            start_time=latest_closed - (backfill_limit - 1) * step,
+            end_time=latest_closed,
+            throttle=throttle,
+            partitions=self.BACKFILL_PARTITIONS,
+            concurrency=self.BACKFILL_CONCURRENCY,
+        )
+        self._metrics.rows_written(saved)
+        # Rows went straight to the DB; derived intervals still need rebuilding.
+        if first_t is not None and last_t is not None:
+            self._mark_dirty(symbol, asset_type, interval, first_t, last_t)
 
     # ── Early-gap backfill (deep cycle, crypto only) ──────────────────────
 
@@ -446,32 +1167,14 @@ class KlineScheduler:
 
     # ── Internal gap scan (deep cycle, crypto only) ───────────────────────
 
-    async def _scan_and_fill_internal_gaps(
-        self, symbol: str, interval: str, asset_type: str,
+    async def _fill_internal_gaps(
+        self, symbol: str, interval: str, asset_type: str, step: int,
+        gaps: list[tuple[int, int, int]],
     ) -> None:
-        """Scan DB for missing sequences and fill them via time-bounded API fetches.
+        """Fill gaps found by the scan via time-bounded API fetches.
 
-        Reuses the segmented scan algorithm from seed_candles.py.
         Only for crypto (Binance supports start_time/end_time).
         """
-        step = _bar_interval_seconds(interval)
-        if not step:
-            return
-
-        db = SessionLocal()
-        try:
-            upsert_symbol(db, infer_symbol_row(symbol, asset_type))
-            sym = db.query(Symbol).filter(
-                Symbol.symbol == symbol, Symbol.asset_type == asset_type,
-            ).first()
-            if not sym:
-                return
-            sym_id = sym.id
-        finally:
-            db.close()
-
-        # Segmented scan for gaps.
-        gaps = self._scan_gaps_sync(sym_id, interval, step)
         if not gaps:
             logger.info(
                 "KlineScheduler: internal gap scan %s %s @ %s — no gaps found",
@@ -505,47 +1208,19 @@ class KlineScheduler:
                 self._persist_klines(symbol, asset_type, interval, klines)
 
     def _scan_gaps_sync(
-        self, symbol_id: int, interval: str, step: int,
-    ) -> list[tuple[int, int, int]]:
-        """Segmented DB scan for gaps in ascending open_time order.
+        self, symbol_ids: list[int], interval: str, step: int,
+    ) -> dict[int, list[tuple[int, int, int]]]:
+        """Internal gaps of every given series of one interval.
 
-        Returns list of (left_open_time, right_open_time, missing_count).
+        Indexed series read their coverage ranges; the rest are indexed with a
+        single LAG(open_time) window query across all of them.
+        Returns {symbol_id: [(left_open_time, right_open_time, missing_count)]}.
         """
-        gaps: list[tuple[int, int, int]] = []
         db = SessionLocal()
         try:
-            cursor_after: int | None = None
-            while True:
-                q = (
-                    db.query(Kline.open_time)
-                    .filter(
-                        Kline.symbol_id == symbol_id,
-                        Kline.bar_interval == interval,
-                    )
-                    .order_by(Kline.open_time.asc())
-                )
-                if cursor_after is not None:
-                    q = q.filter(Kline.open_time > cursor_after)
-                q = q.limit(self.SCAN_WINDOW)
-                rows = q.all()
-                if not rows:
-                    break
-
-                times = [int(r[0]) for r in rows]
-                prev_t = times[0]
-                for t in times[1:]:
-                    delta = t - prev_t
-                    if delta > step:
-                        missing = (delta // step) - 1
-                        gaps.append((prev_t, t, missing))
-                    prev_t = t
-
-                cursor_after = times[-1]
-                if len(times) < self.SCAN_WINDOW:
-                    break
+            return find_gaps_many(db, symbol_ids, interval, step)
         finally:
             db.close()
-        return gaps
 
     # ── Auto-correct (deep cycle) ─────────────────────────────────────────
 
@@ -554,7 +1229,9 @@ class KlineScheduler:
     ) -> None:
         """Compare recent DB candles against API and fix mismatches.
 
-        Reuses the algorithm from seed_candles.py correct_recent_candles().
+        Reuses the algorithm from seed_candles.py correct_recent_candles(),
+        but only blocks whose API digest differs from the last verified one
+        are loaded from the DB and diffed row by row.
         """
         step = _bar_interval_seconds(interval)
         if not step:
@@ -586,50 +1263,74 @@ class KlineScheduler:
         max_t = max(int(k["time"]) for k in api)
         api_times = {int(k["time"]) for k in api}
 
+        sid = self._symbol_id(symbol, asset_type)
+        if sid is None:
+            return
+
+        api = [k for k in api if int(k["time"]) <= end_t]
+        block_seconds = self._correction_block_seconds(interval)
+        key = (symbol, asset_type, interval)
+        verified = self._block_digests.setdefault(key, {})
+        expired_before = time.monotonic() - self.CORRECTION_DIGEST_TTL_SECONDS
+        digests = _block_digests(api, block_seconds)
+        changed = {
+            start for start, digest in digests.items()
+            if start not in verified
+            or verified[start][0] != digest
+            or verified[start][1] < expired_before
+        }
+
         db = SessionLocal()
         try:
-            upsert_symbol(db, infer_symbol_row(symbol, asset_type))
-            sym = db.query(Symbol).filter(
-                Symbol.symbol == symbol, Symbol.asset_type == asset_type,
-            ).first()
-            if not sym:
-                return
-            sid = sym.id
-
-            rows = (
-                db.query(Kline)
-                .filter(
-                    Kline.symbol_id == sid,
-                    Kline.bar_interval == interval,
-                    Kline.open_time >= min_t,
-                    Kline.open_time <= max_t,
+            to_save: list[dict[str, Any]] = []
+            if changed:
+                rows = (
+                    db.query(
+                        Kline.open_time,
+                        Kline.open_price,
+                        Kline.high_price,
+                        Kline.low_price,
+                        Kline.close_price,
+                        Kline.base_volume,
+                    )
+                    .filter(
+                        Kline.symbol_id == sid,
+                        Kline.bar_interval == interval,
+                        Kline.open_time >= min(changed),
+                        Kline.open_time <= min(max_t, max(changed) + block_seconds - step),
+                    )
+                    .all()
                 )
-                .all()
-            )
-            by_t = {int(r.open_time): r for r in rows}
+                by_t = {int(r[0]): r[1:] for r in rows}
 
-            to_save: list[dict[str, Any]] = []
-            for k in api:
-                t = int(k["time"])
-                if t > end_t:
-                    continue
-                row = by_t.get(t)
-                if row is None:
-                    to_save.append(k)
-                elif self._row_differs(row, k):
-                    to_save.append(k)
+                for k in api:
+                    t = int(k["time"])
+                    if t // block_seconds * block_seconds not in changed:
+                        continue
+                    row = by_t.get(t)
+                    if row is None or self._row_differs(row, k):
+                        to_save.append(k)
 
             if to_save:
-                saved = save_klines(db, sid, interval, to_save)
+                self._persist_klines(symbol, asset_type, interval, to_save)
                 logger.info(
-                    "KlineScheduler: corrected %d candles for %s %s @ %s",
-                    saved, symbol, asset_type, interval,
+                    "KlineScheduler: corrected %d candles for %s %s @ %s "
+                    "(%d/%d blocks diffed)",
+                    len(to_save), symbol, asset_type, interval,
+                    len(changed), len(digests),
                 )
             else:
                 logger.info(
-                    "KlineScheduler: auto-correct %s %s @ %s — no corrections needed",
-                    symbol, asset_type, interval,
+                    "KlineScheduler: auto-correct %s %s @ %s — no corrections needed "
+                    "(%d/%d blocks diffed)",
+                    symbol, asset_type, interval, len(changed), len(digests),
                 )
+            # Recorded after _persist_klines, which forgets the blocks it writes.
+            verified_at = time.monotonic()
+            for start in changed:
+                verified[start] = (digests[start], verified_at)
+            for start in [b for b in verified if b not in digests]:
+                del verified[start]
 
             # Stock cleanup: prune zero-volume rows not in API set.
             if asset_type == "stock" and to_save:
@@ -652,6 +1353,7 @@ class KlineScheduler:
                     db.query(Kline).filter(Kline.id.in_(prune_ids)).delete(
                         synchronize_session=False,
                     )
+                    invalidate_coverage(db, sid, interval)
                     db.commit()
                     logger.info(
                         "KlineScheduler: stock prune %s %s @ %s: deleted=%d",
@@ -660,166 +1362,179 @@ class KlineScheduler:
         finally:
             db.close()
 
+    def _correction_block_seconds(self, interval: str) -> int:
+        step = _bar_interval_seconds(interval) or 1
+        return max(1, self.CORRECTION_BLOCK_BARS) * step
+
     @staticmethod
-    def _row_differs(row: Kline, api: dict[str, Any], eps: float = 1e-12) -> bool:
+    def _row_differs(row: tuple, api: dict[str, Any], eps: float = 1e-12) -> bool:
+        """`row` is (open, high, low, close, volume) as loaded from the DB."""
         return any(
             abs(float(a) - float(b)) > eps
-            for a, b in (
-                (row.open_price, api["open"]),
-                (row.high_price, api["high"]),
-                (row.low_price, api["low"]),
-                (row.close_price, api["close"]),
-                (row.base_volume, api["volume"]),
+            for a, b in zip(
+                row,
+                (api["open"], api["high"], api["low"], api["close"], api["volume"]),
             )
         )
 
     # ── Aggregation ───────────────────────────────────────────────────────
 
-    async def _aggregate_derived(
+    def _derived_spans(
         self,
+        sid: int,
         symbol: str,
+        asset_type: str,
         source_interval: str,
-        factor: int | str,
         target_interval: str,
-        asset_type: str,
-    ) -> None:
-        db = SessionLocal()
-        try:
-            source_bars = load_klines_from_db(
-                db, symbol, asset_type, source_interval, limit=2000,
-            )
-            if not source_bars:
-                logger.info(
-                    "KlineScheduler: derived %s %s %s → %s — no source bars, skipping",
-                    symbol, asset_type, source_interval, target_interval,
-                )
-                return
-
-            upsert_symbol(db, infer_symbol_row(symbol, asset_type))
-            sym = db.query(Symbol).filter(
-                Symbol.symbol == symbol, Symbol.asset_type == asset_type,
-            ).first()
-            if not sym:
-                return
-            newest_derived_row = (
-                db.query(Kline.open_time)
-                .filter(
-                    Kline.symbol_id == sym.id,
-                    Kline.bar_interval == target_interval,
-                )
-                .order_by(Kline.open_time.desc())
-                .first()
-            )
-            newest_derived_t = (
-                int(newest_derived_row[0]) if newest_derived_row else 0
-            )
-        finally:
-            db.close()
+        ranges: dict[tuple[int, str], tuple[int, int]],
+    ) -> list[tuple[int, int]]:
+        """Source open_time spans whose buckets must be (re)aggregated.
 
-        if factor == "calendar_month":
-            derived_bars = self._aggregate_calendar_month(source_bars)
+        Dirty spans from this process's writes, plus everything from the newest
+        derived bucket onward (it may have been written while still partial).
+        An empty target is bootstrapped from the last DERIVED_BOOTSTRAP_BARS.
+        """
+        src = ranges.get((sid, source_interval))
+        if src is None:
+            return []
+        src_newest, src_earliest = src
+        spans = list(self._dirty_spans.get((symbol, asset_type, source_interval), []))
+
+        derived = ranges.get((sid, target_interval))
+        if derived is None:
+            step = _bar_interval_seconds(source_interval) or 0
+            lo = max(src_earliest, src_newest - self.DERIVED_BOOTSTRAP_BARS * step)
         else:
-            derived_bars = self._aggregate_fixed(source_bars, int(factor))
+            lo = derived[0]
+        if lo <= src_newest:
+            spans.append((lo, src_newest))
+        return _merge_spans(spans)
 
-        new_bars = [b for b in derived_bars if b["time"] > newest_derived_t]
-        if not new_bars:
+    async def _aggregate_derived(
+        self,
+        db,
+        sid: int,
+        symbol: str,
+        asset_type: str,
+        source_interval: str,
+        target_interval: str,
+        spans: list[tuple[int, int]],
+    ) -> None:
+        """Rebuild the `target_interval` buckets covering `spans` of source bars.
+
+        Source bars are paged in bucket-aligned windows. Each page deletes the
+        stale target rows inside its window — e.g. legacy misaligned buckets —
+        and upserts the rebuilt buckets through `db` in one commit, so no row
+        locks are held while other sessions flush buffered writes.
+        """
+        if not spans:
             logger.info(
-                "KlineScheduler: derived %s %s %s → %s — already current, no new bars",
+                "KlineScheduler: derived %s %s %s → %s — no source bars, skipping",
                 symbol, asset_type, source_interval, target_interval,
             )
             return
 
+        written = 0
+        for lo, hi in spans:
+            cursor = bucket_start(lo, target_interval)
+            end = next_bucket_start(bucket_start(hi, target_interval), target_interval)
+            while cursor < end:
+                bars = load_klines_range(
+                    db, sid, source_interval, cursor, end, self.DERIVED_PAGE_BARS,
+                )
+                if not bars:
+                    break
+                next_cursor = end
+                if len(bars) >= self.DERIVED_PAGE_BARS:
+                    # Hold back the last bucket; it may continue on the next page.
+                    last = bucket_start(int(bars[-1]["time"]), target_interval)
+                    head = [b for b in bars if b["time"] < last]
+                    if head:
+                        bars, next_cursor = head, last
+                    else:
+                        next_cursor = int(bars[-1]["time"]) + 1
+
+                derived_bars = self._aggregate_aligned(bars, target_interval)
+                stale = db.query(Kline).filter(
+                    Kline.symbol_id == sid,
+                    Kline.bar_interval == target_interval,
+                    Kline.open_time >= cursor,
+                    Kline.open_time < next_cursor,
+                    Kline.open_time.notin_([b["time"] for b in derived_bars]),
+                ).delete(synchronize_session=False)
+                if stale:
+                    invalidate_coverage(db, sid, target_interval)
+                saved = save_klines_multi(
+                    db, {(sid, target_interval): derived_bars},
+                    chunk_size=self.WRITE_CHUNK_ROWS,
+                )
+                self._metrics.rows_written(saved)
+                written += len(derived_bars)
+                cursor = next_cursor
+
         logger.info(
-            "KlineScheduler: derived %s %s %s → %s: %d new bars",
-            symbol, asset_type, source_interval, target_interval, len(new_bars),
+            "KlineScheduler: derived %s %s %s → %s: %d bucket(s) rebuilt over %d span(s)",
+            symbol, asset_type, source_interval, target_interval, written, len(spans),
         )
 
-        db = SessionLocal()
-        try:
-            upsert_symbol(db, infer_symbol_row(symbol, asset_type))
-            sym = db.query(Symbol).filter(
-                Symbol.symbol == symbol, Symbol.asset_type == asset_type,
-            ).first()
-            if sym:
-                save_klines(db, sym.id, target_interval, new_bars)
-        finally:
-            db.close()
-
     @staticmethod
-    def _aggregate_fixed(candles: list[dict], factor: int) -> list[dict[str, Any]]:
-        """Group every `factor` consecutive candles into one OHLCV bar."""
-        if factor <= 1 or not candles:
-            return candles
-        result: list[dict[str, Any]] = []
-        for i in range(0, len(candles), factor):
-            group = candles[i : i + factor]
-            if len(group) < factor:
-                continue
-            result.append({
-                "time": group[0]["time"],
-                "open": group[0]["open"],
-                "high": max(c["high"] for c in group),
-                "low": min(c["low"] for c in group),
-                "close": group[-1]["close"],
-                "volume": sum(c["volume"] for c in group),
-            })
-        return result
-
-    @staticmethod
-    def _aggregate_calendar_month(
-        candles: list[dict],
+    def _aggregate_aligned(
+        candles: list[dict], target_interval: str,
     ) -> list[dict[str, Any]]:
-        """Group 1d bars by UTC (year, month) into 1M OHLCV bars."""
-        groups: dict[tuple[int, int], list[dict]] = {}
-        for c in candles:
-            dt = datetime.fromtimestamp(c["time"], tz=timezone.utc)
-            key = (dt.year, dt.month)
-            groups.setdefault(key, []).append(c)
-
-        result: list[dict[str, Any]] = []
-        for key in sorted(groups.keys()):
-            group = groups[key]
-            result.append({
-                "time": group[0]["time"],
-                "open": group[0]["open"],
-                "high": max(c["high"] for c in group),
-                "low": min(c["low"] for c in group),
-                "close": group[-1]["close"],
-                "volume": sum(c["volume"] for c in group),
-            })
-        return result
+        """Group ascending candles into aligned `target_interval` buckets."""
+        return to_candles(resample_interval(from_candles(candles), target_interval))
 
     # ── DB helpers ────────────────────────────────────────────────────────
 
-    def _query_db_range(
-        self, symbol: str, asset_type: str, interval: str,
-    ) -> tuple[int | None, int | None]:
-        """Return (newest_open_time, earliest_open_time) for a symbol+interval."""
+    def _resolve_symbol_ids(
+        self, symbols: list[dict[str, str]],
+    ) -> dict[tuple[str, str], int]:
+        """Upsert all cycle symbols in one statement and cache their ids."""
+        pairs = [(e["symbol"], e["asset_type"]) for e in symbols]
         db = SessionLocal()
         try:
-            upsert_symbol(db, infer_symbol_row(symbol, asset_type))
-            sym = db.query(Symbol).filter(
-                Symbol.symbol == symbol, Symbol.asset_type == asset_type,
-            ).first()
-            if not sym:
-                return None, None
-
-            newest = (
-                db.query(Kline.open_time)
-                .filter(Kline.symbol_id == sym.id, Kline.bar_interval == interval)
-                .order_by(Kline.open_time.desc())
-                .first()
-            )
-            earliest = (
-                db.query(Kline.open_time)
-                .filter(Kline.symbol_id == sym.id, Kline.bar_interval == interval)
-                .order_by(Kline.open_time.asc())
-                .first()
-            )
-            return (
-                int(newest[0]) if newest else None,
-                int(earliest[0]) if earliest else None,
+            self._symbol_ids = resolve_symbol_ids(db, pairs)
+        finally:
+            db.close()
+        return self._symbol_ids
+
+    def _symbol_id(self, symbol: str, asset_type: str) -> int | None:
+        """Cached symbols.id, resolving (and upserting) on a miss."""
+        key = (symbol, asset_type)
+        if key not in self._symbol_ids:
+            db = SessionLocal()
+            try:
+                self._symbol_ids.update(resolve_symbol_ids(db, [key]))
+            finally:
+                db.close()
+        return self._symbol_ids.get(key)
+
+    def _query_db_ranges(
+        self, symbol_ids: list[int], intervals: tuple[str, ...],
+    ) -> dict[tuple[int, str], tuple[int, int]]:
+        """Return {(symbol_id, interval): (newest, earliest)} from one grouped query."""
+        if not symbol_ids:
+            return {}
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(
+                    Kline.symbol_id,
+                    Kline.bar_interval,
+                    func.max(Kline.open_time),
+                    func.min(Kline.open_time),
+                )
+                .filter(
+                    Kline.symbol_id.in_(symbol_ids),
+                    Kline.bar_interval.in_(intervals),
+                )
+                .group_by(Kline.symbol_id, Kline.bar_interval)
+                .all()
             )
+            return {
+                (int(r[0]), r[1]): (int(r[2]), int(r[3]))
+                for r in rows
+            }
         finally:
             db.close()
 
@@ -827,34 +1542,140 @@ class KlineScheduler:
         self, symbol: str, asset_type: str, interval: str,
         klines: list[dict],
     ) -> None:
-        """Upsert klines and log result."""
+        """Queue klines for the next batched flush.
+
+        Flushes immediately once WRITE_FLUSH_ROWS rows are pending so large
+        backfills stay bounded in memory.
+        """
+        if not klines:
+            return
+        series = self._write_buffer.setdefault((symbol, asset_type, interval), {})
+        before = len(series)
+        for k in klines:
+            series[_to_unix_seconds(k["time"])] = k
+        self._buffered_rows += len(series) - before
+
+        times = [_to_unix_seconds(k["time"]) for k in klines]
+        self._mark_dirty(symbol, asset_type, interval, min(times), max(times))
+        if self._buffered_rows >= self.WRITE_FLUSH_ROWS:
+            self._flush_writes()
+
+    def _mark_dirty(
+        self, symbol: str, asset_type: str, interval: str, lo: int, hi: int,
+    ) -> None:
+        """Record written bars: forget the verified digests of the blocks they
+        fall in and queue source-interval spans for the next derived rebuild."""
+        key = (symbol, asset_type, interval)
+        digests = self._block_digests.get(key)
+        if digests:
+            span = self._correction_block_seconds(interval)
+            for start in [b for b in digests if b + span > lo and b <= hi]:
+                del digests[start]
+        if interval not in SOURCE_INTERVALS:
+            return
+        self._dirty_spans[key] = _merge_spans(
+            self._dirty_spans.get(key, []) + [(lo, hi)],
+        )
+
+    def _flush_writes(self) -> int:
+        """Upsert every buffered series through one session and a single commit.
+
+        If the batched commit fails, each series is retried on its own so one
+        bad series cannot discard the rest of the buffer; series that still
+        fail are handed back to REST (see _drop_failed_series).
+        """
+        if not self._write_buffer:
+            return 0
+        buf = self._write_buffer
+        self._write_buffer = {}
+        self._buffered_rows = 0
+
         db = SessionLocal()
         try:
-            upsert_symbol(db, infer_symbol_row(symbol, asset_type))
-            sym = db.query(Symbol).filter(
-                Symbol.symbol == symbol, Symbol.asset_type == asset_type,
-            ).first()
-            if sym:
-                saved = save_klines(db, sym.id, interval, klines)
-                logger.info(
-                    "KlineScheduler: saved %d candles for %s %s @ %s",
-                    saved, symbol, asset_type, interval,
+            series: dict[tuple[int, str], list[dict]] = {}
+            keys: dict[tuple[int, str], tuple[str, str, str]] = {}
+            try:
+                missing = [
+                    (symbol, asset_type)
+                    for symbol, asset_type, _ in buf
+                    if (symbol, asset_type) not in self._symbol_ids
+                ]
+                if missing:
+                    self._symbol_ids.update(resolve_symbol_ids(db, missing))
+
+                for key, by_t in buf.items():
+                    symbol, asset_type, interval = key
+                    sid = self._symbol_ids.get((symbol, asset_type))
+                    if sid is None:
+                        continue
+                    series[(sid, interval)] = list(by_t.values())
+                    keys[(sid, interval)] = key
+                    logger.debug(
+                        "KlineScheduler: flushing %d candles for %s %s @ %s",
+                        len(by_t), symbol, asset_type, interval,
+                    )
+
+                saved = save_klines_multi(db, series, chunk_size=self.WRITE_CHUNK_ROWS)
+            except Exception:
+                db.rollback()
+                logger.exception(
+                    "KlineScheduler: batched persist failed (%d series), "
+                    "retrying series one by one", len(buf),
                 )
-        except Exception:
-            logger.exception(
-                "KlineScheduler: persist failed for %s %s @ %s",
-                symbol, asset_type, interval,
+                if not series:
+                    self._drop_failed_series(list(buf))
+                    return 0
+                saved = 0
+                failed: list[tuple[str, str, str]] = []
+                for sid_interval, klines in series.items():
+                    try:
+                        saved += save_klines_multi(
+                            db, {sid_interval: klines}, chunk_size=self.WRITE_CHUNK_ROWS,
+                        )
+                    except Exception:
+                        db.rollback()
+                        failed.append(keys[sid_interval])
+                        logger.exception(
+                            "KlineScheduler: persist failed for %s %s @ %s",
+                            *keys[sid_interval],
+                        )
+                self._drop_failed_series(failed)
+
+            self._metrics.rows_written(saved)
+            logger.info(
+                "KlineScheduler: saved %d candles across %d series",
+                saved, len(series),
             )
+            return saved
         finally:
             db.close()
 
+    def _drop_failed_series(self, keys: list[tuple[str, str, str]]) -> None:
+        """Forget state that assumed these series' buffered bars were stored.
+
+        Corrections recorded as verified never reached the DB, and a live
+        stream can no longer be trusted to continue the stored history, so
+        the next fast cycle tail-fills the series over REST again.
+        """
+        for key in keys:
+            symbol, _, interval = key
+            self._block_digests.pop(key, None)
+            self._stream_synced.discard((symbol.upper(), interval))
+
     # ── Helpers ───────────────────────────────────────────────────────────
 
     async def _throttle(self, symbol: str, asset_type: str) -> None:
+        """Wait for the upstream's rate limiter; every API request goes through here."""
         if use_stock_kline_api(symbol, asset_type):
-            await self._yfinance_limiter.acquire()
+            limiter, weight = self._yfinance_limiter, 1
         else:
-            await self._binance_limiter.acquire()
+            # GET /klines costs 2 request-weight units on Binance.
+            limiter, weight = self._binance_limiter, 2
+        reserve = int(limiter.max_calls * self.DEEP_RATE_HEADROOM) if _deep_work.get() else 0
+        start = time.monotonic()
+        await limiter.acquire(reserve)
+        self._metrics.rate_limit_wait(limiter.name, time.monotonic() - start)
+        self._metrics.upstream_call(limiter.name, weight)
 
     @staticmethod
     def _is_alphavantage(symbol: str, asset_type: str) -> bool:
@@ -6,14 +6,25 @@ import json
 import logging
 import time
 from typing import Any
+from zoneinfo import ZoneInfo
 
 from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.database.connection import SessionLocal
 from app.database.models import Symbol, Kline
 from app.services.binance_service import binance_service
+from app.services.kline_coverage import update_coverage
 from app.services.stock_service import stock_service
-from app.config import get_redis
+from app.services.resampler import (
+    WEEK_ANCHOR_SECONDS,
+    from_candles,
+    parse_interval_seconds,
+    resample_fixed,
+    resample_session_days,
+    to_candles,
+)
+from app.config import get_redis, VALID_INTERVALS
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +36,13 @@ MAX_GAP_FILL_BARS = 10_000
 _RESPONSE_CACHE_TTL = 10  # seconds
 # Timeout for the API tail fetch; if exceeded, return DB data and let WS handle freshness.
 _TAIL_FETCH_TIMEOUT = 3.0  # seconds
+# Stored intervals that on-demand timeframes are resampled from (largest first).
+DERIVED_BASE_INTERVALS = ("1d", "4h", "1h", "15m", "1m")
+# Cap on base bars read from the DB to build one on-demand response.
+MAX_DERIVED_BASE_BARS = 20_000
+# On-demand responses cost a resample, so keep them a little longer than raw ones.
+_DERIVED_CACHE_TTL = 30  # seconds
+_ET = ZoneInfo("America/New_York")
 
 # Binance-style intervals -> seconds (approximate 1M for gap heuristics only).
 _BAR_INTERVAL_SECONDS: dict[str, int] = {
@@ -149,50 +167,119 @@ def merge_db_with_api_tail(
     return merged[-limit:] if len(merged) > limit else merged
 
 
+def _upsert(db, model, rows: list[dict], keys: tuple[str, ...], update: tuple[str, ...]):
+    """INSERT … ON DUPLICATE KEY UPDATE for MariaDB; ON CONFLICT for SQLite (tests, sims)."""
+    if db.get_bind().dialect.name == "sqlite":
+        stmt = sqlite_insert(model).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={col: stmt.excluded[col] for col in update},
+        )
+    stmt = mysql_insert(model).values(rows)
+    return stmt.on_duplicate_key_update(
+        **{col: stmt.inserted[col] for col in update}
+    )
+
+
+def _symbol_upsert_stmt(db, rows: list[dict]):
+    return _upsert(db, Symbol, [
+        {
+            "symbol": row["symbol"],
+            "base_asset": row["base_asset"],
+            "quote_asset": row["quote_asset"],
+            "asset_type": row["asset_type"],
+            "source": row["source"],
+            "name": row.get("name"),
+        }
+        for row in rows
+    ], ("symbol", "asset_type"), ("base_asset", "quote_asset", "source", "name"))
+
+
 def upsert_symbol(db, row: dict) -> None:
-    stmt = mysql_insert(Symbol).values(
-        symbol=row["symbol"],
-        base_asset=row["base_asset"],
-        quote_asset=row["quote_asset"],
-        asset_type=row["asset_type"],
-        source=row["source"],
-        name=row.get("name"),
+    db.execute(_symbol_upsert_stmt(db, [row]))
+    db.commit()
+
+
+def resolve_symbol_ids(
+    db, pairs: list[tuple[str, str]],
+) -> dict[tuple[str, str], int]:
+    """Upsert many (symbol, asset_type) pairs in one statement and return their ids."""
+    pairs = list(dict.fromkeys(pairs))
+    if not pairs:
+        return {}
+    db.execute(_symbol_upsert_stmt(db, [infer_symbol_row(s, at) for s, at in pairs]))
+    db.commit()
+    wanted = set(pairs)
+    found = (
+        db.query(Symbol.id, Symbol.symbol, Symbol.asset_type)
+        .filter(Symbol.symbol.in_({s for s, _ in pairs}))
+        .all()
     )
-    stmt = stmt.on_duplicate_key_update(
-        base_asset=stmt.inserted.base_asset,
-        quote_asset=stmt.inserted.quote_asset,
-        source=stmt.inserted.source,
-        name=stmt.inserted.name,
+    return {
+        (r.symbol, r.asset_type): int(r.id)
+        for r in found
+        if (r.symbol, r.asset_type) in wanted
+    }
+
+
+def _kline_row(symbol_id: int, bar_interval: str, k: dict) -> dict[str, Any]:
+    return {
+        "symbol_id": symbol_id,
+        "bar_interval": bar_interval,
+        "open_time": _to_unix_seconds(k["time"]),
+        "open_price": k["open"],
+        "high_price": k["high"],
+        "low_price": k["low"],
+        "close_price": k["close"],
+        "base_volume": k["volume"],
+    }
+
+
+def _kline_upsert_stmt(db, rows: list[dict]):
+    return _upsert(
+        db, Kline, rows,
+        ("symbol_id", "bar_interval", "open_time"),
+        ("open_price", "high_price", "low_price", "close_price", "base_volume"),
     )
-    db.execute(stmt)
-    db.commit()
 
 
 def save_klines(db, symbol_id: int, bar_interval: str, klines: list[dict]) -> int:
     if not klines:
         return 0
+    rows = [_kline_row(symbol_id, bar_interval, k) for k in klines]
+    db.execute(_kline_upsert_stmt(db, rows))
+    update_coverage(db, {(symbol_id, bar_interval): [r["open_time"] for r in rows]})
+    db.commit()
+    return len(rows)
+
+
+def save_klines_multi(
+    db,
+    series: dict[tuple[int, str], list[dict]],
+    chunk_size: int = 5000,
+) -> int:
+    """Upsert candles for many (symbol_id, bar_interval) series with a single commit.
+
+    Rows from all series are packed into multi-row INSERTs of at most
+    `chunk_size` rows so one round trip can carry several series.
+    """
     rows = [
-        {
-            "symbol_id": symbol_id,
-            "bar_interval": bar_interval,
-            "open_time": _to_unix_seconds(k["time"]),
-            "open_price": k["open"],
-            "high_price": k["high"],
-            "low_price": k["low"],
-            "close_price": k["close"],
-            "base_volume": k["volume"],
-        }
+        _kline_row(symbol_id, bar_interval, k)
+        for (symbol_id, bar_interval), klines in series.items()
         for k in klines
     ]
-    stmt = mysql_insert(Kline).values(rows)
-    stmt = stmt.on_duplicate_key_update(
-        open_price=stmt.inserted.open_price,
-        high_price=stmt.inserted.high_price,
-        low_price=stmt.inserted.low_price,
-        close_price=stmt.inserted.close_price,
-        base_volume=stmt.inserted.base_volume,
+    if not rows:
+        return 0
+    step = max(1, chunk_size)
+    for i in range(0, len(rows), step):
+        db.execute(_kline_upsert_stmt(db, rows[i : i + step]))
+    update_coverage(
+        db,
+        {
+            (symbol_id, bar_interval): [_to_unix_seconds(k["time"]) for k in klines]
+            for (symbol_id, bar_interval), klines in series.items()
+        },
     )
-    db.execute(stmt)
     db.commit()
     return len(rows)
 
@@ -208,6 +295,50 @@ def _kline_to_api_dict(row: Kline) -> dict[str, Any]:
     }
 
 
+def load_klines_by_symbol_id(
+    db,
+    symbol_id: int,
+    bar_interval: str,
+    limit: int,
+) -> list[dict]:
+    """Most recent `limit` candles for a known symbol id, ascending by time."""
+    q = (
+        db.query(Kline)
+        .filter(Kline.symbol_id == symbol_id, Kline.bar_interval == bar_interval)
+        .order_by(Kline.open_time.desc())
+        .limit(limit)
+    )
+    rows = list(q.all())
+    if not rows:
+        return []
+    rows.reverse()
+    return [_kline_to_api_dict(r) for r in rows]
+
+
+def load_klines_range(
+    db,
+    symbol_id: int,
+    bar_interval: str,
+    start_time: int,
+    end_time: int,
+    limit: int,
+) -> list[dict]:
+    """Up to `limit` candles with start_time <= open_time < end_time, ascending."""
+    rows = (
+        db.query(Kline)
+        .filter(
+            Kline.symbol_id == symbol_id,
+            Kline.bar_interval == bar_interval,
+            Kline.open_time >= start_time,
+            Kline.open_time < end_time,
+        )
+        .order_by(Kline.open_time.asc())
+        .limit(limit)
+        .all()
+    )
+    return [_kline_to_api_dict(r) for r in rows]
+
+
 def load_klines_from_db(
     db,
     symbol: str,
@@ -223,17 +354,7 @@ def load_klines_from_db(
     )
     if not sym:
         return []
-    q = (
-        db.query(Kline)
-        .filter(Kline.symbol_id == sym.id, Kline.bar_interval == bar_interval)
-        .order_by(Kline.open_time.desc())
-        .limit(limit)
-    )
-    rows = list(q.all())
-    if not rows:
-        return []
-    rows.reverse()
-    return [_kline_to_api_dict(r) for r in rows]
+    return load_klines_by_symbol_id(db, sym.id, bar_interval, limit)
 
 
 def _sync_backfill_and_read(
@@ -304,16 +425,13 @@ def flush_kline_buffer(groups: dict[tuple[str, str], list[dict]]) -> None:
     """
     db = SessionLocal()
     try:
-        for (symbol, interval), candles in groups.items():
-            row = infer_symbol_row(symbol, "crypto")
-            upsert_symbol(db, row)
-            sym = (
-                db.query(Symbol)
-                .filter(Symbol.symbol == symbol, Symbol.asset_type == "crypto")
-                .first()
-            )
-            if sym:
-                save_klines(db, sym.id, interval, candles)
+        ids = resolve_symbol_ids(db, [(symbol, "crypto") for symbol, _ in groups])
+        series = {
+            (ids[(symbol, "crypto")], interval): candles
+            for (symbol, interval), candles in groups.items()
+            if (symbol, "crypto") in ids
+        }
+        save_klines_multi(db, series)
     except Exception as e:
         logger.exception("flush_kline_buffer failed: %s", e)
     finally:
@@ -362,7 +480,10 @@ async def get_klines_db_first(
     t0 = time.monotonic()
 
     # ── Response cache: instant return for repeated requests ──
-    cache_key = f"klines:resp:{symbol}:{bar_interval}:{asset_type}:ext:{1 if include_extended else 0}"
+    cache_key = (
+        f"klines:resp:{symbol}:{bar_interval}:{asset_type}"
+        f":ext:{1 if include_extended else 0}:n:{limit}"
+    )
     try:
         r = get_redis()
         cached_resp = await r.get(cache_key)
@@ -467,3 +588,93 @@ async def _cache_and_persist(
             )
         except Exception:
             pass
+
+
+def derived_base_interval(bar_interval: str) -> str | None:
+    """Stored interval an on-demand timeframe is resampled from, or None.
+
+    Picks the largest base in DERIVED_BASE_INTERVALS whose length divides the
+    target (e.g. 6h → 1h, 12h → 4h, 3d → 1d). Intervals already in
+    VALID_INTERVALS are served directly and return None.
+    """
+    if bar_interval in VALID_INTERVALS:
+        return None
+    step = parse_interval_seconds(bar_interval)
+    if not step:
+        return None
+    for base in DERIVED_BASE_INTERVALS:
+        base_step = _bar_interval_seconds(base)
+        if base_step and step > base_step and step % base_step == 0:
+            return base
+    return None
+
+
+async def get_klines_derived(
+    symbol: str,
+    bar_interval: str,
+    asset_type: str,
+    limit: int = 5000,
+    include_extended: bool = False,
+) -> list[dict] | None:
+    """
+    Klines for an on-demand timeframe (2h, 6h, 12h, 3d, 2w, …) resampled at
+    request time from base bars already in the DB.
+
+    The base series is read from the DB only — never backfilled from the API
+    here; keeping it filled is the scheduler's job — and at most
+    MAX_DERIVED_BASE_BARS of it, so `limit` shrinks for large factors.
+
+    Crypto buckets are epoch-aligned (week multiples anchor on Monday like
+    Binance 1w). Intraday stock buckets are grouped per ET session day so
+    they never span an overnight gap. Results are cached briefly in Redis.
+    """
+    t0 = time.monotonic()
+    base = derived_base_interval(bar_interval)
+    if base is None:
+        return None
+    step = parse_interval_seconds(bar_interval)
+    factor = step // _bar_interval_seconds(base)
+    base_limit = min(MAX_DERIVED_BASE_BARS, (limit + 1) * factor)
+    limit = max(1, min(limit, base_limit // factor - 1))
+
+    cache_key = (
+        f"klines:derived:{symbol}:{bar_interval}:{asset_type}"
+        f":ext:{1 if include_extended else 0}:n:{limit}"
+    )
+    try:
+        r = get_redis()
+        cached_resp = await r.get(cache_key)
+        if cached_resp:
+            return json.loads(cached_resp)
+    except Exception:
+        pass
+
+    base_bars = await asyncio.to_thread(
+        _sync_read_only, symbol, asset_type, base, base_limit,
+    )
+    if not base_bars:
+        return None
+
+    series = from_candles(base_bars)
+    if asset_type == "stock" and step < 86_400:
+        derived = resample_session_days(series, factor, _ET)
+    else:
+        anchor = WEEK_ANCHOR_SECONDS if step % 604_800 == 0 else 0
+        derived = resample_fixed(series, step, anchor)
+    result = to_candles(derived)
+    # A truncated base window may start mid-bucket; drop that partial bar.
+    if len(base_bars) >= base_limit and len(result) > 1:
+        result = result[1:]
+    result = result[-limit:]
+
+    logger.info(
+        "klines %s %s @ %s → resampled from %s (%d base bars → %d, %.0fms)",
+        symbol, asset_type, bar_interval, base, len(base_bars), len(result),
+        (time.monotonic() - t0) * 1000,
+    )
+    try:
+        r = get_redis()
+        await r.setex(cache_key, _DERIVED_CACHE_TTL, json.dumps(result))
+    except Exception:
+        pass
+    return result
@@ -80,6 +80,25 @@ class MacroService:
             return {"note": "FRED API key not set"}
         return await fred_provider.get_dashboard()
 
+    async def refresh(self) -> None:
+        """Re-fetch every cached indicator, ignoring what is in the cache."""
+        jobs = (
+            ("macro:dxy", TTL_INTRADAY, self._fetch_dxy),
+            ("macro:yields", TTL_INTRADAY, self._fetch_yields),
+            ("macro:fed_rate", TTL_DAILY, self._fetch_fed_rate),
+        )
+        results = await asyncio.gather(
+            *(fetcher() for _, _, fetcher in jobs), return_exceptions=True,
+        )
+        for (key, ttl, _), data in zip(jobs, results):
+            if isinstance(data, BaseException):
+                logger.warning(f"Macro refresh failed ({key}): {data}")
+                continue
+            try:
+                await self._redis.setex(key, ttl, json.dumps(data))
+            except Exception as e:
+                logger.debug(f"Redis write error ({key}): {e}")
+
     # ── Cache helper ──
 
     async def _cached(self, key: str, ttl: int, fetcher) -> Any:
@@ -1,11 +1,15 @@
 import logging
 import asyncio
+import json
+import os
 import requests
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from urllib.parse import urlparse
 
+from app.config import get_redis
+
 logger = logging.getLogger(__name__)
 
 # ── Quality financial RSS feeds confirmed live as of 2026-05 ──
@@ -30,17 +34,62 @@ HEADERS = {
 }
 
 
+# Redis cache TTL (seconds) for the RSS and enriched feeds; the ingest worker
+# (python -m app.workers.ingest) refreshes them before they expire.
+NEWS_CACHE_TTL = int(os.getenv("NEWS_CACHE_TTL_S", "300"))
+
+
 class NewsService:
 
     def __init__(self):
         self._session = requests.Session()
         self._session.headers.update(HEADERS)
+        self._redis = get_redis()
 
     async def get_latest_news(self, limit_per_feed: int = 5) -> List[Dict[str, Any]]:
         """
-        Fetch latest news from all RSS feeds.
+        Latest news from all RSS feeds (cached).
         Returns deduplicated list ordered by recency (newest first).
         """
+        return await self._cached(
+            f"news:latest:{limit_per_feed}",
+            lambda: self._fetch_latest_news(limit_per_feed),
+        )
+
+    async def get_enriched_news(self) -> List[Dict[str, Any]]:
+        """RSS feeds + Finnhub general news + NewsAPI business headlines (cached)."""
+        return await self._cached("news:enriched", self._fetch_enriched_news)
+
+    async def refresh(self) -> None:
+        """Re-fetch the default feeds into the cache, ignoring what is there."""
+        await self._store("news:latest:5", await self._fetch_latest_news())
+        # Builds on the RSS list just stored.
+        await self._store("news:enriched", await self._fetch_enriched_news())
+
+    # ── Cache helpers ──
+
+    async def _cached(self, key: str, fetcher) -> Any:
+        """Return from Redis cache or fetch + cache."""
+        try:
+            raw = await self._redis.get(key)
+            if raw:
+                return json.loads(raw)
+        except Exception as e:
+            logger.debug(f"Redis read error ({key}): {e}")
+
+        data = await fetcher()
+        await self._store(key, data)
+        return data
+
+    async def _store(self, key: str, data: Any) -> None:
+        try:
+            await self._redis.setex(key, NEWS_CACHE_TTL, json.dumps(data))
+        except Exception as e:
+            logger.debug(f"Redis write error ({key}): {e}")
+
+    # ── Fetchers ──
+
+    async def _fetch_latest_news(self, limit_per_feed: int = 5) -> List[Dict[str, Any]]:
         seen_titles = set()
         news_items: List[Dict[str, Any]] = []
 
@@ -124,8 +173,7 @@ class NewsService:
 
     # ── Phase 2: Enriched news with Finnhub + NewsAPI ──
 
-    async def get_enriched_news(self) -> List[Dict[str, Any]]:
-        """RSS feeds + Finnhub general news + NewsAPI business headlines."""
+    async def _fetch_enriched_news(self) -> List[Dict[str, Any]]:
         from app.services.finnhub_provider import finnhub_provider
         from app.services.newsapi_provider import newsapi_provider
 
@@ -0,0 +1,260 @@
+"""
+Vectorized OHLCV resampling over array-backed series.
+
+One engine for every aggregation path: epoch-aligned fixed buckets (3m, 30m, …),
+Monday-anchored calendar weeks, UTC calendar months, plain N-bar groups and
+session-bounded groups that never cross a local (e.g. ET) trading day.
+
+Each resampler finds group start indices with NumPy and reduces with
+`ufunc.reduceat`, so cost is a few array passes regardless of series length.
+Input series must be sorted ascending by time.
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# Binance-style intervals → seconds (1M is calendar-based; value is approximate).
+INTERVAL_SECONDS: dict[str, int] = {
+    "1m": 60,
+    "3m": 180,
+    "5m": 300,
+    "15m": 900,
+    "30m": 1800,
+    "1h": 3600,
+    "4h": 14_400,
+    "1d": 86_400,
+    "1w": 604_800,
+    "1M": 30 * 86_400,
+}
+
+# Binance 1w bars open Monday 00:00 UTC; the epoch (1970-01-01) is a Thursday.
+WEEK_ANCHOR_SECONDS = 4 * 86_400
+
+# Arbitrary "<n><unit>" timeframes (e.g. 2h, 6h, 3d, 2w) served by resampling.
+_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86_400, "w": 604_800}
+_INTERVAL_PATTERN = re.compile(r"^([1-9][0-9]{0,2})([mhdw])$")
+
+
+class OHLCV(NamedTuple):
+    """Column arrays for a candle series (time in unix seconds)."""
+
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.time.shape[0])
+
+
+def from_candles(candles: list[dict[str, Any]]) -> OHLCV:
+    """Build an OHLCV series from API-shaped candle dicts."""
+    n = len(candles)
+    return OHLCV(
+        time=np.fromiter((int(c["time"]) for c in candles), dtype=np.int64, count=n),
+        open=np.fromiter((c["open"] for c in candles), dtype=np.float64, count=n),
+        high=np.fromiter((c["high"] for c in candles), dtype=np.float64, count=n),
+        low=np.fromiter((c["low"] for c in candles), dtype=np.float64, count=n),
+        close=np.fromiter((c["close"] for c in candles), dtype=np.float64, count=n),
+        volume=np.fromiter((c["volume"] for c in candles), dtype=np.float64, count=n),
+    )
+
+
+def to_candles(series: OHLCV) -> list[dict[str, Any]]:
+    """API-shaped candle dicts (time, open, high, low, close, volume)."""
+    return [
+        {"time": t, "open": o, "high": h, "low": lo, "close": c, "volume": v}
+        for t, o, h, lo, c, v in zip(
+            series.time.tolist(),
+            series.open.tolist(),
+            series.high.tolist(),
+            series.low.tolist(),
+            series.close.tolist(),
+            series.volume.tolist(),
+        )
+    ]
+
+
+def parse_interval_seconds(interval: str) -> int | None:
+    """Length in seconds of a fixed "<n><unit>" interval (m, h, d, w), else None.
+
+    Calendar months ("1M") are not fixed-length and return None.
+    """
+    m = _INTERVAL_PATTERN.match(interval)
+    if not m:
+        return None
+    return int(m.group(1)) * _UNIT_SECONDS[m.group(2)]
+
+
+# ── Bucket boundaries ─────────────────────────────────────────────────────
+
+def bucket_start(t: int, interval: str) -> int:
+    """Open time of the `interval` bucket containing unix second `t`."""
+    if interval == "1M":
+        dt = datetime.fromtimestamp(t, tz=timezone.utc)
+        return int(datetime(dt.year, dt.month, 1, tzinfo=timezone.utc).timestamp())
+    step = INTERVAL_SECONDS[interval]
+    anchor = WEEK_ANCHOR_SECONDS if interval == "1w" else 0
+    return (t - anchor) // step * step + anchor
+
+
+def next_bucket_start(start: int, interval: str) -> int:
+    """Open time of the bucket following the one that opens at `start`."""
+    if interval == "1M":
+        dt = datetime.fromtimestamp(start, tz=timezone.utc)
+        year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+        return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+    return start + INTERVAL_SECONDS[interval]
+
+
+def bucket_starts(times: np.ndarray, interval: str) -> np.ndarray:
+    """Vectorized bucket_start() over an int64 array of unix seconds."""
+    if interval == "1M":
+        return (
+            times.astype("datetime64[s]")
+            .astype("datetime64[M]")
+            .astype("datetime64[s]")
+            .astype(np.int64)
+        )
+    step = INTERVAL_SECONDS[interval]
+    anchor = WEEK_ANCHOR_SECONDS if interval == "1w" else 0
+    return (times - anchor) // step * step + anchor
+
+
+def local_day_ordinals(times: np.ndarray, tz: ZoneInfo) -> np.ndarray:
+    """Local calendar day number (days since epoch in `tz`) for each timestamp.
+
+    UTC offsets are resolved once per distinct UTC day; only days containing a
+    DST transition fall back to per-hour lookups, which is exact for zones whose
+    transitions fall on hour boundaries (all US/EU market zones).
+    """
+    if times.size == 0:
+        return times.copy()
+
+    def _offsets(points: np.ndarray) -> np.ndarray:
+        return np.fromiter(
+            (
+                datetime.fromtimestamp(int(p), tz=tz).utcoffset().total_seconds()
+                for p in points
+            ),
+            dtype=np.int64,
+            count=points.size,
+        )
+
+    days, day_inv = np.unique(times // 86_400, return_inverse=True)
+    at_start = _offsets(days * 86_400)
+    at_end = _offsets(days * 86_400 + 86_399)
+    offsets = at_start[day_inv]
+
+    mixed = (at_start != at_end)[day_inv]
+    if mixed.any():
+        hours, hour_inv = np.unique(times[mixed] // 3600, return_inverse=True)
+        offsets[mixed] = _offsets(hours * 3600)[hour_inv]
+    return (times + offsets) // 86_400
+
+
+# ── Reduction ─────────────────────────────────────────────────────────────
+
+def _starts_from_keys(keys: np.ndarray) -> np.ndarray:
+    """Indices where a run of equal consecutive keys begins."""
+    if keys.size == 0:
+        return np.empty(0, dtype=np.intp)
+    change = np.empty(keys.size, dtype=bool)
+    change[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=change[1:])
+    return np.flatnonzero(change)
+
+
+def reduce_groups(
+    series: OHLCV,
+    starts: np.ndarray,
+    labels: np.ndarray | None = None,
+) -> OHLCV:
+    """Collapse contiguous groups beginning at `starts` into one bar each.
+
+    `labels` sets each output bar's time; by default a bar is labelled with
+    the time of its first member.
+    """
+    if len(series) == 0 or starts.size == 0:
+        return series
+    ends = np.empty_like(starts)
+    ends[:-1] = starts[1:]
+    ends[-1] = len(series)
+    return OHLCV(
+        time=series.time[starts] if labels is None else labels,
+        open=series.open[starts],
+        high=np.maximum.reduceat(series.high, starts),
+        low=np.minimum.reduceat(series.low, starts),
+        close=series.close[ends - 1],
+        volume=np.add.reduceat(series.volume, starts),
+    )
+
+
+# ── Resamplers ────────────────────────────────────────────────────────────
+
+def resample_interval(series: OHLCV, interval: str) -> OHLCV:
+    """Aligned buckets for a target interval, labelled by bucket open time.
+
+    Fixed intervals are epoch-aligned, 1w is Monday-anchored and 1M follows
+    UTC calendar months. Missing source bars shorten a bucket rather than
+    shifting later ones.
+    """
+    if len(series) == 0:
+        return series
+    keys = bucket_starts(series.time, interval)
+    starts = _starts_from_keys(keys)
+    return reduce_groups(series, starts, labels=keys[starts])
+
+
+def resample_fixed(series: OHLCV, step: int, anchor: int = 0) -> OHLCV:
+    """Buckets of `step` seconds aligned to `anchor`, labelled by bucket open."""
+    if len(series) == 0:
+        return series
+    keys = (series.time - anchor) // step * step + anchor
+    starts = _starts_from_keys(keys)
+    return reduce_groups(series, starts, labels=keys[starts])
+
+
+def resample_calendar_week(series: OHLCV) -> OHLCV:
+    """Monday 00:00 UTC weeks."""
+    return resample_interval(series, "1w")
+
+
+def resample_calendar_month(series: OHLCV) -> OHLCV:
+    """UTC calendar months."""
+    return resample_interval(series, "1M")
+
+
+def resample_count(series: OHLCV, factor: int) -> OHLCV:
+    """Every `factor` consecutive bars into one, labelled by the first bar.
+
+    A trailing short group is kept.
+    """
+    if factor <= 1 or len(series) == 0:
+        return series
+    starts = np.arange(0, len(series), factor, dtype=np.intp)
+    return reduce_groups(series, starts)
+
+
+def resample_session_days(series: OHLCV, factor: int, tz: ZoneInfo) -> OHLCV:
+    """Up to `factor` consecutive bars per group, never crossing a `tz` day.
+
+    Groups restart at each local day boundary, so overnight gaps never end up
+    inside one bar. Labelled by the first bar of each group.
+    """
+    if factor <= 1 or len(series) == 0:
+        return series
+    days = local_day_ordinals(series.time, tz)
+    day_starts = _starts_from_keys(days)
+    idx = np.arange(len(series), dtype=np.intp)
+    # Position of each bar within its local day.
+    first_of_day = np.repeat(day_starts, np.diff(np.append(day_starts, len(series))))
+    within = idx - first_of_day
+    starts = np.flatnonzero(within % factor == 0)
+    return reduce_groups(series, starts)
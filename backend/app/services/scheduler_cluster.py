@@ -0,0 +1,161 @@
+"""
+Redis-lease membership, leader election and consistent-hash sharding for
+KlineScheduler replicas.
+
+Every replica heartbeats into a sorted set of members. One replica holds a
+short-lived leader lease; the leader prunes members whose heartbeat expired
+and publishes the live member list as the ring. Each (symbol, asset_type) is
+owned by exactly one member on a consistent-hash ring with virtual nodes, so a
+replica joining or leaving only moves about 1/N of the symbols.
+
+If Redis is unreachable the last known ring is kept; a replica that never saw
+a ring runs standalone and owns everything.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+from app.config import get_redis
+
+# Child of the scheduler logger so cluster events land in scheduler.log too.
+logger = logging.getLogger("app.services.kline_scheduler.cluster")
+
+_MEMBERS_KEY = "kline_scheduler:members"
+_LEADER_KEY = "kline_scheduler:leader"
+_RING_KEY = "kline_scheduler:ring"
+
+# Extend / release the leader lease only if this instance still holds it.
+_RENEW_IF_OWNER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_DELETE_IF_OWNER = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring with `vnodes` points per member."""
+
+    def __init__(self, members: list[str], vnodes: int) -> None:
+        points = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in members
+            for i in range(max(1, vnodes))
+        )
+        self._points = [p for p, _ in points]
+        self._owners = [m for _, m in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[i]
+
+
+class SchedulerCluster:
+    """This replica's view of the scheduler cluster."""
+
+    ENABLED = os.getenv("KLINE_SCHEDULER_SHARDING", "true").lower() in {"1", "true", "yes", "on"}
+    LEASE_TTL_SECONDS = int(os.getenv("KLINE_SCHEDULER_LEASE_TTL_S", "30"))
+    VNODES = int(os.getenv("KLINE_SCHEDULER_VNODES", "64"))
+
+    def __init__(self) -> None:
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        self.members: list[str] = []
+        # Bumped whenever the ring changes, so the scheduler knows to rebalance.
+        self.epoch = 0
+        self._ring = HashRing([], self.VNODES)
+
+    @property
+    def heartbeat_seconds(self) -> float:
+        return max(1.0, self.LEASE_TTL_SECONDS / 3)
+
+    def owns(self, symbol: str, asset_type: str) -> bool:
+        if not self.ENABLED:
+            return True
+        return self._ring.owner(f"{symbol}:{asset_type}") == self.instance_id
+
+    def _set_members(self, members: list[str]) -> None:
+        if members == self.members:
+            return
+        logger.info(
+            "KlineScheduler cluster: ring epoch %d → %d, members=%s",
+            self.epoch, self.epoch + 1, members,
+        )
+        self.members = members
+        self._ring = HashRing(members, self.VNODES)
+        self.epoch += 1
+
+    async def heartbeat(self) -> None:
+        """Renew membership and leadership, then refresh the ring."""
+        if not self.ENABLED:
+            return
+        r = get_redis()
+        now = time.time()
+        try:
+            await r.zadd(_MEMBERS_KEY, {self.instance_id: now})
+            leader = bool(
+                await r.set(_LEADER_KEY, self.instance_id, nx=True, ex=self.LEASE_TTL_SECONDS)
+            ) or bool(
+                await r.eval(
+                    _RENEW_IF_OWNER, 1, _LEADER_KEY, self.instance_id, self.LEASE_TTL_SECONDS,
+                )
+            )
+            if leader != self.is_leader:
+                logger.info(
+                    "KlineScheduler cluster: %s %s leadership",
+                    self.instance_id, "acquired" if leader else "lost",
+                )
+            self.is_leader = leader
+
+            if leader:
+                await r.zremrangebyscore(_MEMBERS_KEY, 0, now - self.LEASE_TTL_SECONDS)
+                members = sorted(await r.zrange(_MEMBERS_KEY, 0, -1))
+                await r.set(_RING_KEY, json.dumps(members), ex=self.LEASE_TTL_SECONDS * 2)
+            else:
+                raw = await r.get(_RING_KEY)
+                # No ring yet (leader still starting up): keep the current view.
+                members = json.loads(raw) if raw else self.members
+            self._set_members(members)
+        except Exception as e:
+            logger.warning("KlineScheduler cluster: heartbeat failed: %s", e)
+            if not self.members:
+                self._set_members([self.instance_id])
+
+    async def run(self) -> None:
+        """Heartbeat until cancelled, then leave the cluster."""
+        try:
+            while True:
+                await asyncio.sleep(self.heartbeat_seconds)
+                await self.heartbeat()
+        finally:
+            await self.leave()
+
+    async def leave(self) -> None:
+        """Drop membership (and the leader lease) so others rebalance promptly."""
+        if not self.ENABLED:
+            return
+        r = get_redis()
+        try:
+            await r.zrem(_MEMBERS_KEY, self.instance_id)
+            await r.eval(_DELETE_IF_OWNER, 1, _LEADER_KEY, self.instance_id)
+        except Exception as e:
+            logger.warning("KlineScheduler cluster: leave failed: %s", e)
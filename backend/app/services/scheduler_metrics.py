@@ -0,0 +1,185 @@
+"""
+Prometheus metrics and recent run history for KlineScheduler.
+
+Histograms and counters are process-wide and exported by the API's /metrics
+scrape, or by the scheduler worker's own metrics server when it runs
+standalone (app.workers.scheduler). Each fast cycle or deep slice also produces a summary (duration,
+per-stage seconds, upstream calls/weight, rows written, rate-limiter wait)
+kept in memory and pushed to a capped Redis list so /scheduler/status can
+show recent runs of every replica. Each running replica also keeps its state
+snapshot (queues, cluster role) in a Redis hash, so the API can serve
+/scheduler/status when the scheduler runs as a separate worker.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from prometheus_client import Counter, Histogram
+
+from app.config import get_redis
+
+# Child of the scheduler logger so history errors land in scheduler.log too.
+logger = logging.getLogger("app.services.kline_scheduler.metrics")
+
+_RUNS_KEY = "kline_scheduler:runs"
+# instance_id -> JSON state snapshot of each running replica
+_STATUS_KEY = "kline_scheduler:status"
+
+_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_h_cycle_seconds = Histogram(
+    "viewingchart_scheduler_cycle_duration_seconds",
+    "Duration of a scheduler fast cycle or deep slice",
+    ["kind"],
+    buckets=_DURATION_BUCKETS,
+)
+_h_stage_seconds = Histogram(
+    "viewingchart_scheduler_stage_duration_seconds",
+    "Duration of a scheduler stage (tail_fill, aggregation, backfill, gap_scan, correction)",
+    ["stage"],
+    buckets=_DURATION_BUCKETS,
+)
+_c_upstream_calls = Counter(
+    "viewingchart_scheduler_upstream_calls_total",
+    "Kline requests sent upstream by the scheduler",
+    ["source"],
+)
+_c_upstream_weight = Counter(
+    "viewingchart_scheduler_upstream_weight_total",
+    "Request weight spent upstream by the scheduler (Binance weight units)",
+    ["source"],
+)
+_c_rows_written = Counter(
+    "viewingchart_scheduler_rows_written_total",
+    "Kline rows upserted by the scheduler",
+)
+_h_rate_limit_wait_seconds = Histogram(
+    "viewingchart_scheduler_rate_limit_wait_seconds",
+    "Time spent waiting on a scheduler rate limiter per request",
+    ["limiter"],
+    buckets=(0, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+# Summary of the run in progress in the current task; fast cycles and deep
+# slices run concurrently in separate tasks.
+_current_run: contextvars.ContextVar[dict[str, Any] | None] = contextvars.ContextVar(
+    "kline_scheduler_current_run", default=None,
+)
+
+
+class SchedulerMetrics:
+    """Records metrics and keeps the last HISTORY_SIZE run summaries."""
+
+    HISTORY_SIZE = int(os.getenv("KLINE_SCHEDULER_HISTORY_SIZE", "50"))
+
+    def __init__(self, instance_id: str) -> None:
+        self.instance_id = instance_id
+        self._history: deque[dict[str, Any]] = deque(maxlen=max(1, self.HISTORY_SIZE))
+
+    @asynccontextmanager
+    async def cycle(self, kind: str, **fields: Any) -> AsyncIterator[dict[str, Any]]:
+        """Time one fast cycle / deep slice; the yielded summary takes extra fields."""
+        summary: dict[str, Any] = {
+            "instance": self.instance_id,
+            "kind": kind,
+            "started_at": round(time.time(), 3),
+            **fields,
+            "stages": {},
+            "upstream_calls": 0,
+            "upstream_weight": 0,
+            "rows_written": 0,
+            "rate_limit_wait_s": 0.0,
+        }
+        token = _current_run.set(summary)
+        start = time.monotonic()
+        try:
+            yield summary
+        except Exception as e:
+            summary["error"] = repr(e)
+            raise
+        finally:
+            _current_run.reset(token)
+            duration = time.monotonic() - start
+            summary["duration_s"] = round(duration, 3)
+            summary["rate_limit_wait_s"] = round(summary["rate_limit_wait_s"], 3)
+            _h_cycle_seconds.labels(kind).observe(duration)
+            self._history.append(summary)
+            await self._publish(summary)
+
+    def stage(self, name: str, seconds: float) -> None:
+        _h_stage_seconds.labels(name).observe(seconds)
+        current = _current_run.get()
+        if current is not None:
+            stages = current["stages"]
+            stages[name] = round(stages.get(name, 0.0) + seconds, 3)
+
+    def upstream_call(self, source: str, weight: int) -> None:
+        _c_upstream_calls.labels(source).inc()
+        _c_upstream_weight.labels(source).inc(weight)
+        current = _current_run.get()
+        if current is not None:
+            current["upstream_calls"] += 1
+            current["upstream_weight"] += weight
+
+    def rows_written(self, n: int) -> None:
+        if n <= 0:
+            return
+        _c_rows_written.inc(n)
+        current = _current_run.get()
+        if current is not None:
+            current["rows_written"] += n
+
+    def rate_limit_wait(self, limiter: str, seconds: float) -> None:
+        _h_rate_limit_wait_seconds.labels(limiter).observe(seconds)
+        current = _current_run.get()
+        if current is not None:
+            current["rate_limit_wait_s"] += seconds
+
+    async def _publish(self, summary: dict[str, Any]) -> None:
+        try:
+            r = get_redis()
+            await r.lpush(_RUNS_KEY, json.dumps(summary))
+            await r.ltrim(_RUNS_KEY, 0, self.HISTORY_SIZE - 1)
+        except Exception as e:
+            logger.debug("KlineScheduler metrics: run history publish failed: %s", e)
+
+    async def publish_status(self, snapshot: dict[str, Any], ttl: float) -> None:
+        """Share this replica's state snapshot; it counts as stale after `ttl` seconds."""
+        try:
+            r = get_redis()
+            await r.hset(_STATUS_KEY, self.instance_id, json.dumps(snapshot))
+            await r.expire(_STATUS_KEY, max(1, int(ttl)))
+        except Exception as e:
+            logger.debug("KlineScheduler metrics: status publish failed: %s", e)
+
+    async def instance_statuses(self, ttl: float) -> list[dict[str, Any]]:
+        """Snapshots of replicas that published within `ttl` seconds, by instance id."""
+        try:
+            raw = await get_redis().hgetall(_STATUS_KEY)
+        except Exception as e:
+            logger.debug("KlineScheduler metrics: status read failed: %s", e)
+            return []
+        cutoff = time.time() - ttl
+        statuses = []
+        for value in raw.values():
+            snapshot = json.loads(value)
+            if snapshot.get("updated_at", 0) >= cutoff:
+                statuses.append(snapshot)
+        return sorted(statuses, key=lambda s: s.get("instance_id", ""))
+
+    async def recent_runs(self, limit: int) -> list[dict[str, Any]]:
+        """Newest-first summaries from all replicas (Redis), else this process."""
+        try:
+            raw = await get_redis().lrange(_RUNS_KEY, 0, limit - 1)
+            if raw:
+                return [json.loads(item) for item in raw]
+        except Exception as e:
+            logger.debug("KlineScheduler metrics: run history read failed: %s", e)
+        return list(reversed(self._history))[:limit]
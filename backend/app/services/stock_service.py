@@ -10,6 +10,12 @@ import yfinance as yf
 from typing import List, Dict, Any, Tuple, Literal
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from app.config import settings, get_redis
+from app.services.resampler import (
+    from_candles,
+    resample_count,
+    resample_session_days,
+    to_candles,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -272,21 +278,7 @@ class StockService:
         """
         if factor <= 1 or not candles:
             return candles
-
-        aggregated = []
-        for i in range(0, len(candles), factor):
-            group = candles[i:i + factor]
-            if not group:
-                continue
-            aggregated.append({
-                "time": group[0]["time"],
-                "open": group[0]["open"],
-                "high": max(c["high"] for c in group),
-                "low": min(c["low"] for c in group),
-                "close": group[-1]["close"],
-                "volume": sum(c["volume"] for c in group),
-            })
-        return aggregated
+        return to_candles(resample_count(from_candles(candles), factor))
 
     @staticmethod
     def _filter_regular_session_intraday(
@@ -326,41 +318,7 @@ class StockService:
         """
         if factor <= 1 or not candles:
             return candles
-
-        aggregated: List[Dict[str, Any]] = []
-        i = 0
-        while i < len(candles):
-            base_day = datetime.fromtimestamp(int(candles[i]["time"]), tz=tz).date()
-            group: List[Dict[str, Any]] = []
-            while i < len(candles) and len(group) < factor:
-                day = datetime.fromtimestamp(int(candles[i]["time"]), tz=tz).date()
-                if day != base_day:
-                    break
-                group.append(candles[i])
-                i += 1
-
-            if group:
-                aggregated.append(
-                    {
-                        "time": group[0]["time"],
-                        "open": group[0]["open"],
-                        "high": max(c["high"] for c in group),
-                        "low": min(c["low"] for c in group),
-                        "close": group[-1]["close"],
-                        "volume": sum(c["volume"] for c in group),
-                    }
-                )
-
-            # If we stopped because the day changed, the next loop iteration will
-            # start a new group on the new day.
-            while i < len(candles):
-                next_day = datetime.fromtimestamp(int(candles[i]["time"]), tz=tz).date()
-                if next_day == base_day:
-                    break
-                # Skip any unexpected out-of-order rows that still belong to base_day
-                break
-
-        return aggregated
+        return to_candles(resample_session_days(from_candles(candles), factor, tz))
 
     async def _get_yf_klines(self, symbol: str, interval: str, limit: int = 1000, include_extended: bool = False) -> List[Dict[str, Any]]:
         yf_interval = self._map_yf_interval(interval)
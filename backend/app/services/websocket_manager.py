@@ -1,17 +1,38 @@
 import asyncio
 import json
 import logging
-import random
+import os
+import socket
 import time
-import websockets
+import uuid
 import redis.asyncio as redis
-from typing import List, Dict, Set
+from typing import Callable, List, Dict, Set
 from fastapi import WebSocket
-from app.config import settings, get_redis, ws_id_counter
+from app.config import settings, get_redis
+from app.services import ws_codec
+from app.services.binance_stream_pool import BinanceStreamPool
+from app.services.ws_heartbeat import HeartbeatWheel
+from app.services.ws_outbox import ClientOutbox
 
 logger = logging.getLogger(__name__)
 
 
+# Per-process viewer counts: one hash, field <worker_id> -> {"ts", "counts"} JSON.
+# Fields older than three report periods belong to dead processes.
+_VIEWERS_KEY = "ws:viewers"
+VIEWER_REPORT_SECONDS = 10
+# Every process re-announces its full kline/ticker subscriptions this often; the
+# streamer releases those of a process not heard from for three periods.
+SUBSCRIPTION_LEASE_SECONDS = 30
+
+# Channel tags on multiplexed (/market/ws) data frames.
+TICKER_CHANNEL = "tickers"
+
+
+def kline_channel(symbol: str, interval: str) -> str:
+    return f"kline:{symbol.upper()}:{interval}"
+
+
 class ConnectionManager:
     def __init__(self):
         # Map "symbol_interval" -> List of WebSockets
@@ -19,16 +40,35 @@ class ConnectionManager:
         # List of WebSockets listening to all tickers
         self.ticker_connections: List[WebSocket] = []
         self.ticker_subscriptions: Dict[WebSocket, set] = {}
+        # Inverted index: SYMBOL -> ticker clients subscribed to it
+        self._ticker_subscribers: Dict[str, Set[WebSocket]] = {}
+        # Latest ticker per symbol within the current conflation window
+        self._pending_tickers: Dict[str, dict] = {}
+        self._ticker_flush_task: asyncio.Task | None = None
+        # Outbound queue + writer task per connected client
+        self._outboxes: Dict[WebSocket, ClientOutbox] = {}
+        # One timer for every client's heartbeat
+        self._heartbeats = HeartbeatWheel(settings.WS_HEARTBEAT_S)
         self.global_watchlist_syms: Set[str] = {"BTCUSDT", "ETHUSDT", "SOLUSDT"}
         # Default watchlist anchors that should never be removed
         self._default_watchlist_syms: Set[str] = {"BTCUSDT", "ETHUSDT", "SOLUSDT"}
 
         self.binance_ws_url = settings.BINANCE_WS_URL
         self.running = False
+        # True in the process that holds the Binance connections (the streamer).
+        self.streams_upstream = False
+        # Identifies this process in cross-process subscription commands.
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # Streams / ticker symbols wanted by each process serving clients
+        # (market:cmd_* commands); the streamer subscribes their union upstream.
+        self._remote_kline_subs: Dict[str, Set[str]] = {}
+        self._remote_ticker_syms: Dict[str, Set[str]] = {}
+        # Last command (monotonic) from each of those processes; renews their lease.
+        self._remote_seen: Dict[str, float] = {}
         # Shared Redis pool (Fix #2.1)
         self.redis = get_redis()
-        self.binance_spot_ws = None
-        self.binance_futures_ws = None
+        # Sharded Binance connections per market ("spot", "futures"); streamer only
+        self._pools: Dict[str, BinanceStreamPool] = {}
         self.subscribed_streams: Set[str] = set()
         # Reference count: how many clients are watching each stream
         self._stream_refcount: Dict[str, int] = {}
@@ -40,13 +80,11 @@ class ConnectionManager:
 
         # Buffer WS kline updates for periodic DB persistence
         self._kline_write_buffer: Dict[str, dict] = {}
+        # Callbacks for closed-bar / stream-reset events (market:kline_stream)
+        self._kline_stream_listeners: List[Callable[[dict], None]] = []
 
         # Health / metrics tracking
-        self._spot_connected: bool = False
-        self._futures_connected: bool = False
         self._last_message_ts: float = 0.0
-        self._spot_reconnect_count: int = 0
-        self._futures_reconnect_count: int = 0
 
     def get_status(self) -> dict:
         """Return real-time WS health metrics for the /health and /ws/status endpoints."""
@@ -58,13 +96,16 @@ class ConnectionManager:
         )[: settings.MONITOR_STATUS_KLINE_ROOMS_CAP]
         kline_rooms = {k: n for k, n in room_items}
 
+        spot, futures = self._pools.get("spot"), self._pools.get("futures")
         return {
-            "spot_connected": self._spot_connected,
-            "futures_connected": self._futures_connected,
+            "spot_connected": bool(spot and spot.connected),
+            "futures_connected": bool(futures and futures.connected),
             "last_message_ts": self._last_message_ts,
             "last_message_age_s": round(time.time() - self._last_message_ts, 1) if self._last_message_ts else None,
-            "spot_reconnect_count": self._spot_reconnect_count,
-            "futures_reconnect_count": self._futures_reconnect_count,
+            "spot_reconnect_count": spot.reconnect_count if spot else 0,
+            "futures_reconnect_count": futures.reconnect_count if futures else 0,
+            "upstream_shard_streams": {market: pool.shard_loads() for market, pool in self._pools.items()},
+            "upstream_pending_commands": sum(pool.pending_commands() for pool in self._pools.values()),
             "active_streams": len(self.subscribed_streams),
             "kline_client_count": sum(len(v) for v in self.active_connections.values()),
             "ticker_client_count": len(self.ticker_connections),
@@ -80,178 +121,483 @@ class ConnectionManager:
             "redis_pubsub_channels": list(settings.REDIS_PUBSUB_CHANNELS),
         }
 
+    def viewer_counts(self) -> Dict[tuple, int]:
+        """Live kline viewers per (SYMBOL, interval) room on this process."""
+        counts: Dict[tuple, int] = {}
+        for key, conns in self.active_connections.items():
+            symbol, _, interval = key.rpartition("_")
+            if symbol and conns:
+                counts[(symbol.upper(), interval)] = len(conns)
+        return counts
+
+    async def shared_viewer_counts(self) -> Dict[tuple, int]:
+        """Live kline viewers per (SYMBOL, interval) across every API process.
+
+        Each process serving clients reports its counts to one Redis hash
+        every VIEWER_REPORT_SECONDS, read here with a single HGETALL; falls
+        back to this process's counts.
+        """
+        counts: Dict[tuple, int] = {}
+        cutoff = time.time() - VIEWER_REPORT_SECONDS * 3
+        try:
+            stale = []
+            for worker, raw in (await self.redis.hgetall(_VIEWERS_KEY)).items():
+                report = json.loads(raw)
+                if report.get("ts", 0) < cutoff:
+                    stale.append(worker)
+                    continue
+                for key, n in report.get("counts", {}).items():
+                    symbol, _, interval = key.partition(":")
+                    counts[(symbol, interval)] = counts.get((symbol, interval), 0) + int(n)
+            if stale:
+                await self.redis.hdel(_VIEWERS_KEY, *stale)
+        except Exception as e:
+            logger.debug(f"Shared viewer counts unavailable: {e}")
+            return self.viewer_counts()
+        return counts
+
+    async def _viewer_report_loop(self):
+        """Publish this process's viewer counts for other processes (scheduler)."""
+        while self.running:
+            counts = {f"{s}:{i}": n for (s, i), n in self.viewer_counts().items()}
+            try:
+                if counts:
+                    report = {"ts": time.time(), "counts": counts}
+                    await self.redis.hset(_VIEWERS_KEY, self.worker_id, json.dumps(report))
+                    await self.redis.expire(_VIEWERS_KEY, VIEWER_REPORT_SECONDS * 3)
+                else:
+                    await self.redis.hdel(_VIEWERS_KEY, self.worker_id)
+            except Exception as e:
+                logger.debug(f"Viewer count report failed: {e}")
+            await asyncio.sleep(VIEWER_REPORT_SECONDS)
+
+    def add_kline_stream_listener(self, callback: Callable[[dict], None]):
+        """Register a callback for events published on market:kline_stream.
+
+        Events are {"event": "closed", "symbol", "interval", "data", "market",
+        "asset_type"} for each closed bar, and {"event": "reset", "market", "shard"} whenever a Binance
+        shard connection (re)connects and may have missed bars.
+        """
+        if callback not in self._kline_stream_listeners:
+            self._kline_stream_listeners.append(callback)
+
     # ── Client connection management ──────────────────────────────────
 
-    async def connect(self, websocket: WebSocket, symbol: str, interval: str):
-        await websocket.accept()
+    async def connect(
+        self,
+        websocket: WebSocket,
+        symbol: str,
+        interval: str,
+        encoding: str = ws_codec.JSON,
+        subprotocol: str | None = None,
+    ):
+        await websocket.accept(subprotocol=subprotocol)
+        self._open_outbox(websocket, encoding)
+        await self.join_kline(websocket, symbol, interval)
+
+    def disconnect(self, websocket: WebSocket, symbol: str, interval: str):
+        self.leave_kline(websocket, symbol, interval)
+        self._close_outbox(websocket)
+
+    async def join_kline(self, websocket: WebSocket, symbol: str, interval: str):
+        """Add an accepted client to a kline room."""
         key = f"{symbol.lower()}_{interval}"
         if key not in self.active_connections:
             self.active_connections[key] = []
+        if websocket in self.active_connections[key]:
+            return
         self.active_connections[key].append(websocket)
         logger.info(f"Client connected to {key}. Total: {len(self.active_connections[key])}")
 
         stream_name = f"{symbol.lower()}@kline_{interval}"
         self._stream_refcount[stream_name] = self._stream_refcount.get(stream_name, 0) + 1
 
-        if stream_name not in self.subscribed_streams:
+        # First local viewer: tell the streamer (this or another process).
+        if self._stream_refcount[stream_name] == 1:
             try:
-                await self.redis.publish("market:cmd_kline_sub", json.dumps({"stream": stream_name}))
+                await self.redis.publish(
+                    "market:cmd_kline_sub",
+                    json.dumps({"stream": stream_name, "worker": self.worker_id}),
+                )
             except Exception as e:
                 logger.warning(f"Redis publish failed (kline_sub): {e}")
 
-    def disconnect(self, websocket: WebSocket, symbol: str, interval: str):
+    def leave_kline(self, websocket: WebSocket, symbol: str, interval: str):
         key = f"{symbol.lower()}_{interval}"
-        if key in self.active_connections:
-            if websocket in self.active_connections[key]:
-                self.active_connections[key].remove(websocket)
-            if not self.active_connections[key]:
-                del self.active_connections[key]
+        conns = self.active_connections.get(key)
+        # Idempotent: a client dropped by broadcast is disconnected again by its endpoint.
+        if conns is None or websocket not in conns:
+            return
+        conns.remove(websocket)
+        if not conns:
+            del self.active_connections[key]
 
         stream_name = f"{symbol.lower()}@kline_{interval}"
         if stream_name in self._stream_refcount:
             self._stream_refcount[stream_name] -= 1
             if self._stream_refcount[stream_name] <= 0:
                 del self._stream_refcount[stream_name]
-                # Unsubscribe from Binance if nobody is watching — awaited properly (Fix #3.2)
-                asyncio.ensure_future(self._unsubscribe_stream(stream_name))
+                # The streamer unsubscribes from Binance once no process holds it.
+                asyncio.ensure_future(self._publish_kline_unsub(stream_name))
 
         logger.info(f"Client disconnected from {key}")
 
+    async def _publish_kline_unsub(self, stream_name: str):
+        try:
+            await self.redis.publish(
+                "market:cmd_kline_unsub",
+                json.dumps({"stream": stream_name, "worker": self.worker_id}),
+            )
+        except Exception as e:
+            logger.warning(f"Redis publish failed (kline_unsub): {e}")
+
+    async def _reannounce_subscriptions(self):
+        """Re-send this process's full kline and ticker subscriptions to the streamer.
+
+        The kline set goes out as one lease message, so streams whose
+        unsubscribe was lost are released too.
+        """
+        try:
+            await self.redis.publish(
+                "market:cmd_kline_sub",
+                json.dumps({
+                    "worker": self.worker_id,
+                    "lease": True,
+                    "streams": sorted(self._stream_refcount),
+                }),
+            )
+        except Exception as e:
+            logger.warning(f"Redis publish failed (kline_sub re-announce): {e}")
+        await self._publish_ticker_symbols()
+
+    async def _subscription_lease_loop(self):
+        """Renew this process's subscription lease; release leases of silent processes."""
+        while self.running:
+            await asyncio.sleep(SUBSCRIPTION_LEASE_SECONDS)
+            await self._reannounce_subscriptions()
+            await self._expire_remote_workers()
+
+    async def _add_remote_kline_sub(self, worker: str, stream_name: str):
+        self._remote_kline_subs.setdefault(stream_name, set()).add(worker)
+        pool = self._pool_for(stream_name)
+        if pool and stream_name not in self.subscribed_streams:
+            self.subscribed_streams.add(stream_name)
+            await pool.subscribe([stream_name])
+            logger.info(f"[{pool.tag}] Dynamic subscribe: {stream_name}")
+
+    async def _drop_remote_kline_sub(self, worker: str, stream_name: str):
+        holders = self._remote_kline_subs.get(stream_name)
+        if holders is not None:
+            holders.discard(worker)
+            if not holders:
+                del self._remote_kline_subs[stream_name]
+        if stream_name not in self._remote_kline_subs:
+            await self._unsubscribe_stream(stream_name)
+
+    async def _apply_kline_lease(self, worker: str, streams: Set[str]):
+        """Make `streams` exactly the kline streams held by `worker`."""
+        held = {s for s, holders in self._remote_kline_subs.items() if worker in holders}
+        for stream_name in sorted(streams - held):
+            await self._add_remote_kline_sub(worker, stream_name)
+        for stream_name in sorted(held - streams):
+            await self._drop_remote_kline_sub(worker, stream_name)
+
+    async def _expire_remote_workers(self):
+        """Release the streams and ticker symbols of processes whose lease ran out."""
+        cutoff = time.monotonic() - 3 * SUBSCRIPTION_LEASE_SECONDS
+        expired = [
+            w for w, seen in self._remote_seen.items()
+            if seen < cutoff and w != self.worker_id
+        ]
+        tickers_changed = False
+        for worker in expired:
+            del self._remote_seen[worker]
+            logger.warning(f"Subscription lease of {worker} expired — releasing its streams")
+            await self._apply_kline_lease(worker, set())
+            tickers_changed |= self._remote_ticker_syms.pop(worker, None) is not None
+        if tickers_changed:
+            await self._rebuild_ticker_watchlist()
+
+    def _pool_for(self, stream_name: str) -> BinanceStreamPool | None:
+        """Upstream pool for a stream by its symbol's market (None outside the streamer)."""
+        base_sym = stream_name.split("@")[0].lower()
+        return self._pools.get("spot" if base_sym in self._spot_syms else "futures")
+
     async def _unsubscribe_stream(self, stream_name: str):
-        """Send UNSUBSCRIBE to the live Binance WS and remove from tracked set."""
+        """Unsubscribe from the live Binance shard and remove from tracked set."""
         if stream_name in self.subscribed_streams:
             self.subscribed_streams.discard(stream_name)
-            base_sym = stream_name.split("@")[0].lower()
-            is_spot = base_sym in self._spot_syms
-            ws = self.binance_spot_ws if is_spot else self.binance_futures_ws
-            tag = "SPOT" if is_spot else "FUTURES"
-            if ws:
-                try:
-                    payload = {
-                        "method": "UNSUBSCRIBE",
-                        "params": [stream_name],
-                        "id": next(ws_id_counter),  # Fix #3.2 — monotonic ID
-                    }
-                    await ws.send(json.dumps(payload))
-                    logger.info(f"[{tag}] Dynamic unsubscribe: {stream_name}")
-                except Exception as e:
-                    logger.error(f"Failed to unsubscribe {stream_name}: {e}")
-
-    async def connect_tickers(self, websocket: WebSocket):
-        await websocket.accept()
+            pool = self._pool_for(stream_name)
+            if pool:
+                await pool.unsubscribe([stream_name])
+                logger.info(f"[{pool.tag}] Dynamic unsubscribe: {stream_name}")
+
+    async def connect_multiplexed(
+        self,
+        websocket: WebSocket,
+        encoding: str = ws_codec.JSON,
+        subprotocol: str | None = None,
+    ):
+        """Accept a client that joins kline rooms / tickers over one socket.
+
+        Its data frames are wrapped as {"channel": ..., "data": ...}.
+        """
+        await websocket.accept(subprotocol=subprotocol)
+        self._open_outbox(websocket, encoding, multiplexed=True)
+
+    async def disconnect_multiplexed(self, websocket: WebSocket, kline_rooms):
+        for symbol, interval in list(kline_rooms):
+            self.leave_kline(websocket, symbol, interval)
+        await self.leave_tickers(websocket)
+        self._close_outbox(websocket)
+
+    def send_control(self, websocket: WebSocket, message: dict):
+        """Queue a JSON text control frame (error, ack) behind the client's data."""
+        outbox = self._outboxes.get(websocket)
+        if outbox is not None:
+            outbox.put(ws_codec.encode(message, ws_codec.JSON))
+
+    async def connect_tickers(
+        self,
+        websocket: WebSocket,
+        encoding: str = ws_codec.JSON,
+        subprotocol: str | None = None,
+    ):
+        await websocket.accept(subprotocol=subprotocol)
+        self._open_outbox(websocket, encoding)
+        self.join_tickers(websocket)
+
+    def join_tickers(self, websocket: WebSocket):
+        """Add an accepted client to the ticker stream (no symbols until subscribe_tickers)."""
+        if websocket in self.ticker_subscriptions:
+            return
         self.ticker_connections.append(websocket)
         self.ticker_subscriptions[websocket] = set()
         logger.info(f"Client connected to global ticker stream. Total: {len(self.ticker_connections)}")
 
     async def subscribe_tickers(self, websocket: WebSocket, symbols: List[str]):
         if websocket in self.ticker_subscriptions:
-            self.ticker_subscriptions[websocket] = set(s.upper() for s in symbols)
-
-        # Rebuild the global set from all active subscriptions + defaults
-        new_syms = set(self._default_watchlist_syms)
-        for sub_set in self.ticker_subscriptions.values():
-            new_syms.update(sub_set)
-
-        old_syms = self.global_watchlist_syms
-        self.global_watchlist_syms = new_syms
-
-        # Fix #3.3 — dynamically subscribe/unsubscribe per-symbol ticker streams
-        added = new_syms - old_syms
-        removed = old_syms - new_syms
-        if added or removed:
-            await self._update_ticker_streams(added, removed)
+            new_syms = set(s.upper() for s in symbols)
+            self._unindex_ticker_client(websocket)
+            self.ticker_subscriptions[websocket] = new_syms
+            for sym in new_syms:
+                self._ticker_subscribers.setdefault(sym, set()).add(websocket)
+        await self._publish_ticker_symbols()
+        await self._rebuild_ticker_watchlist()
 
     async def disconnect_tickers(self, websocket: WebSocket):
+        await self.leave_tickers(websocket)
+        self._close_outbox(websocket)
+
+    async def leave_tickers(self, websocket: WebSocket):
+        if websocket not in self.ticker_subscriptions:
+            return
         if websocket in self.ticker_connections:
             self.ticker_connections.remove(websocket)
-        if websocket in self.ticker_subscriptions:
-            del self.ticker_subscriptions[websocket]
+        self._unindex_ticker_client(websocket)
+        del self.ticker_subscriptions[websocket]
+        await self._publish_ticker_symbols()
+        await self._rebuild_ticker_watchlist()
+
+        logger.info("Client disconnected from global ticker stream")
 
-        new_syms = set(self._default_watchlist_syms)
-        for sub_set in self.ticker_subscriptions.values():
+    def _unindex_ticker_client(self, websocket: WebSocket):
+        for sym in self.ticker_subscriptions.get(websocket, ()):
+            subscribers = self._ticker_subscribers.get(sym)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del self._ticker_subscribers[sym]
+
+    def _local_ticker_syms(self) -> Set[str]:
+        return set(self._ticker_subscribers)
+
+    async def _publish_ticker_symbols(self):
+        """Share this process's ticker symbols with the streamer process."""
+        try:
+            await self.redis.publish(
+                "market:cmd_ticker_sub",
+                json.dumps({
+                    "worker": self.worker_id,
+                    "symbols": sorted(self._local_ticker_syms()),
+                }),
+            )
+        except Exception as e:
+            logger.warning(f"Redis publish failed (ticker_sub): {e}")
+
+    async def _rebuild_ticker_watchlist(self):
+        """Defaults + local + remote subscriptions; (un)subscribe the difference."""
+        new_syms = set(self._default_watchlist_syms) | self._local_ticker_syms()
+        for sub_set in self._remote_ticker_syms.values():
             new_syms.update(sub_set)
+
         old_syms = self.global_watchlist_syms
         self.global_watchlist_syms = new_syms
+
+        # Fix #3.3 — dynamically subscribe/unsubscribe per-symbol ticker streams
         added = new_syms - old_syms
         removed = old_syms - new_syms
         if added or removed:
             await self._update_ticker_streams(added, removed)
 
-        logger.info("Client disconnected from global ticker stream")
-
     # ── Per-symbol ticker stream management (Fix #3.3) ────────────────
 
     async def _update_ticker_streams(self, added: Set[str], removed: Set[str]):
         """Subscribe/unsubscribe individual <symbol>@ticker streams instead of !ticker@arr."""
-        for sym in added:
-            stream = f"{sym.lower()}@ticker"
-            is_spot = sym.lower() in self._spot_syms
-            tag = "SPOT" if is_spot else "FUTURES"
-            ws = self.binance_spot_ws if is_spot else self.binance_futures_ws
-            target_set = self._subscribed_ticker_streams["spot" if is_spot else "futures"]
-
-            if ws and stream not in target_set:
-                try:
-                    payload = {"method": "SUBSCRIBE", "params": [stream], "id": next(ws_id_counter)}
-                    await ws.send(json.dumps(payload))
-                    target_set.add(stream)
-                    logger.info(f"[{tag}] ✅ Ticker subscribe: {stream}")
-                except Exception as e:
-                    logger.error(f"Failed to subscribe ticker {stream}: {e}")
-
-        for sym in removed:
-            stream = f"{sym.lower()}@ticker"
-            is_spot = sym.lower() in self._spot_syms
-            tag = "SPOT" if is_spot else "FUTURES"
-            ws = self.binance_spot_ws if is_spot else self.binance_futures_ws
-            target_set = self._subscribed_ticker_streams["spot" if is_spot else "futures"]
-
-            if ws and stream in target_set:
-                try:
-                    payload = {"method": "UNSUBSCRIBE", "params": [stream], "id": next(ws_id_counter)}
-                    await ws.send(json.dumps(payload))
-                    target_set.discard(stream)
-                    logger.info(f"[{tag}] ❌ Ticker unsubscribe: {stream}")
-                except Exception as e:
-                    logger.error(f"Failed to unsubscribe ticker {stream}: {e}")
+        for syms, subscribe in ((added, True), (removed, False)):
+            by_market: Dict[str, List[str]] = {}
+            for sym in syms:
+                market = "spot" if sym.lower() in self._spot_syms else "futures"
+                by_market.setdefault(market, []).append(f"{sym.lower()}@ticker")
+            for market, streams in by_market.items():
+                pool = self._pools.get(market)
+                if not pool:
+                    continue
+                target_set = self._subscribed_ticker_streams[market]
+                if subscribe:
+                    streams = [st for st in streams if st not in target_set]
+                    await pool.subscribe(streams)
+                    target_set.update(streams)
+                else:
+                    streams = [st for st in streams if st in target_set]
+                    await pool.unsubscribe(streams)
+                    target_set.difference_update(streams)
+                if streams:
+                    logger.info(
+                        f"[{pool.tag}] Ticker {'subscribe' if subscribe else 'unsubscribe'}: "
+                        f"{len(streams)} stream(s)"
+                    )
 
     async def _subscribe_initial_ticker_streams(self):
         """Subscribe the initial watchlist symbols as individual ticker streams."""
-        for sym in self.global_watchlist_syms:
-            stream = f"{sym.lower()}@ticker"
-            is_spot = sym.lower() in self._spot_syms
-            ws = self.binance_spot_ws if is_spot else self.binance_futures_ws
-            target_set = self._subscribed_ticker_streams["spot" if is_spot else "futures"]
-            if ws and stream not in target_set:
-                try:
-                    payload = {"method": "SUBSCRIBE", "params": [stream], "id": next(ws_id_counter)}
-                    await ws.send(json.dumps(payload))
-                    target_set.add(stream)
-                except Exception as e:
-                    logger.error(f"Failed initial ticker subscribe {stream}: {e}")
+        await self._update_ticker_streams(set(self.global_watchlist_syms), set())
         logger.info(f"Subscribed {len(self.global_watchlist_syms)} initial ticker streams")
 
     # ── Broadcasting ──────────────────────────────────────────────────
 
+    def _open_outbox(self, websocket: WebSocket, encoding: str, multiplexed: bool = False):
+        if websocket not in self._outboxes:
+            outbox = self._outboxes[websocket] = ClientOutbox(
+                websocket,
+                max_frames=settings.WS_OUTBOX_MAX_FRAMES,
+                stall_seconds=settings.WS_SLOW_CLIENT_DROP_S,
+                send_timeout=settings.WS_SEND_TIMEOUT_S,
+                on_drop=self._drop_client,
+                encoding=encoding,
+                multiplexed=multiplexed,
+            )
+            self._heartbeats.add(outbox)
+
+    def _close_outbox(self, websocket: WebSocket):
+        outbox = self._outboxes.pop(websocket, None)
+        if outbox is not None:
+            outbox.close()
+
+    def _drop_client(self, websocket: WebSocket):
+        """Slow or broken client: close it; its endpoint then disconnects it."""
+        self._outboxes.pop(websocket, None)
+        asyncio.ensure_future(self._close_quietly(websocket))
+
+    def _fan_out(self, connections: List[WebSocket], message: dict, channel: str, key: object):
+        """Serialize `message` once per frame format and queue it on every outbox.
+
+        Never waits on a client: each outbox's writer task sends on its own,
+        conflating frames that share `key`. Multiplexed clients get the
+        message tagged with `channel`.
+        """
+        frames: Dict[tuple, str | bytes] = {}
+        for connection in connections:
+            outbox = self._outboxes.get(connection)
+            if outbox is None:
+                continue
+            fmt = (outbox.encoding, outbox.multiplexed)
+            frame = frames.get(fmt)
+            if frame is None:
+                payload = {"channel": channel, "data": message} if outbox.multiplexed else message
+                frame = frames[fmt] = ws_codec.encode(payload, outbox.encoding)
+            outbox.put(frame, key)
+
     async def broadcast_ticker(self, message: dict):
-        # Iterate over a COPY to avoid mutation during iteration
-        for connection in list(self.ticker_connections):
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting ticker to client: {e}")
-                await self.disconnect_tickers(connection)
+        """Merge ticker updates for WS_TICKER_CONFLATE_MS, then send them.
+
+        Within a window only the latest values per symbol are kept, so each
+        client gets at most one ticker frame per window however many symbols
+        changed.
+        """
+        if settings.WS_TICKER_CONFLATE_MS <= 0:
+            self._send_tickers(message)
+            return
+        self._pending_tickers.update(message)
+        if self._ticker_flush_task is None or self._ticker_flush_task.done():
+            self._ticker_flush_task = asyncio.create_task(self._flush_tickers_later())
+
+    async def _flush_tickers_later(self):
+        await asyncio.sleep(settings.WS_TICKER_CONFLATE_MS / 1000)
+        pending, self._pending_tickers = self._pending_tickers, {}
+        self._send_tickers(pending)
+
+    def _send_tickers(self, message: dict):
+        """Send each ticker client only the symbols it subscribed to.
+
+        A client gets one frame per message with all of its symbols in it.
+        Each symbol's JSON entry is serialized once, and clients with the same
+        symbol set and encoding share the frame.
+        """
+        wanted: Dict[WebSocket, List[str]] = {}
+        for sym in message:
+            for connection in self._ticker_subscribers.get(sym, ()):
+                wanted.setdefault(connection, []).append(sym)
+        if not wanted:
+            return
+
+        entries: Dict[str, str] = {}
+        frames: Dict[tuple, str | bytes] = {}
+        for connection, syms in wanted.items():
+            outbox = self._outboxes.get(connection)
+            if outbox is None:
+                continue
+            frame_key = (outbox.encoding, outbox.multiplexed, *syms)
+            frame = frames.get(frame_key)
+            if frame is None:
+                if outbox.encoding == ws_codec.JSON:
+                    parts = []
+                    for sym in syms:
+                        entry = entries.get(sym)
+                        if entry is None:
+                            entry = entries[sym] = (
+                                f"{ws_codec.encode(sym, ws_codec.JSON)}:"
+                                f"{ws_codec.encode(message[sym], ws_codec.JSON)}"
+                            )
+                        parts.append(entry)
+                    frame = "{" + ",".join(parts) + "}"
+                    if outbox.multiplexed:
+                        frame = f'{{"channel":"{TICKER_CHANNEL}","data":{frame}}}'
+                else:
+                    data = {sym: message[sym] for sym in syms}
+                    if outbox.multiplexed:
+                        data = {"channel": TICKER_CHANNEL, "data": data}
+                    frame = ws_codec.encode(data, outbox.encoding)
+                frames[frame_key] = frame
+            # Single-symbol updates (the common case) conflate per symbol.
+            outbox.put(frame, ("ticker", *sorted(syms)))
 
     async def broadcast(self, symbol: str, interval: str, message: dict):
         key = f"{symbol.lower()}_{interval}"
-        if key in self.active_connections:
-            # Iterate over a COPY to avoid mutation during iteration
-            for connection in list(self.active_connections.get(key, [])):
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to client: {e}")
-                    self.disconnect(connection, symbol, interval)
+        # Updates to the same (in-progress) bar replace each other.
+        self._fan_out(
+            self.active_connections.get(key, []),
+            message,
+            kline_channel(symbol, interval),
+            ("kline", key, message.get("time")),
+        )
+
+    @staticmethod
+    async def _close_quietly(connection: WebSocket):
+        """Close a dropped client so its endpoint loop exits too."""
+        try:
+            await asyncio.wait_for(connection.close(code=1011), settings.WS_SEND_TIMEOUT_S)
+        except Exception:
+            pass
 
     # ── Redis Listener ────────────────────────────────────────────────
 
@@ -284,39 +630,41 @@ class ConnectionManager:
                             logger.debug(f"Broadcasting KLINE -> {symbol.upper()}@{interval} (close: {update['close']})")
                             await self.broadcast(symbol, interval, update)
 
+                        elif channel == "market:kline_stream":
+                            if data.get("event") == "reset":
+                                # A (possibly restarted) streamer reconnected.
+                                await self._reannounce_subscriptions()
+                            for callback in list(self._kline_stream_listeners):
+                                try:
+                                    callback(data)
+                                except Exception as e:
+                                    logger.error(f"Kline stream listener failed: {e}")
+
                         elif channel == "market:cmd_kline_sub":
-                            stream_name = data.get("stream")
-                            if stream_name and stream_name not in self.subscribed_streams:
-                                base_sym = stream_name.split("@")[0].lower()
-                                is_spot = base_sym in self._spot_syms
-                                ws = self.binance_spot_ws if is_spot else self.binance_futures_ws
-                                tag = "SPOT" if is_spot else "FUTURES"
-                                if ws:
-                                    payload = {
-                                        "method": "SUBSCRIBE",
-                                        "params": [stream_name],
-                                        "id": next(ws_id_counter),
-                                    }
-                                    try:
-                                        await ws.send(json.dumps(payload))
-                                        self.subscribed_streams.add(stream_name)
-                                        logger.info(f"[{tag}] Dynamic subscribe: {stream_name}")
-                                    except Exception as e:
-                                        logger.error(f"Failed to dynamic subscribe to {stream_name}: {e}")
+                            worker = data.get("worker", "")
+                            self._remote_seen[worker] = time.monotonic()
+                            if data.get("lease"):
+                                await self._apply_kline_lease(worker, set(data.get("streams", [])))
+                            elif data.get("stream"):
+                                await self._add_remote_kline_sub(worker, data["stream"])
+
+                        elif channel == "market:cmd_kline_unsub":
+                            worker = data.get("worker", "")
+                            self._remote_seen[worker] = time.monotonic()
+                            if data.get("stream"):
+                                await self._drop_remote_kline_sub(worker, data["stream"])
 
                         elif channel == "market:cmd_ticker_sub":
-                            tickers = data.get("symbols", [])
-                            new_syms = set(self._default_watchlist_syms)
-                            new_syms.update(t.upper() for t in tickers)
-                            for sub_set in self.ticker_subscriptions.values():
-                                new_syms.update(sub_set)
-
-                            added = new_syms - self.global_watchlist_syms
-                            removed = self.global_watchlist_syms - new_syms
-                            self.global_watchlist_syms = new_syms
-
-                            if added or removed:
-                                await self._update_ticker_streams(added, removed)
+                            worker = data.get("worker", "")
+                            tickers = {t.upper() for t in data.get("symbols", [])}
+                            if worker == self.worker_id:
+                                continue
+                            self._remote_seen[worker] = time.monotonic()
+                            if tickers:
+                                self._remote_ticker_syms[worker] = tickers
+                            else:
+                                self._remote_ticker_syms.pop(worker, None)
+                            await self._rebuild_ticker_watchlist()
 
                             logger.info(f"Global watchlist updated: {len(self.global_watchlist_syms)} symbols tracked.")
 
@@ -331,149 +679,104 @@ class ConnectionManager:
 
     # ── Binance Stream Runners ────────────────────────────────────────
 
-    async def _run_stream_loop(self, base_url: str, streams: List[str], is_spot: bool = True):
-        """
-        Independent reconnect loop for a single Binance endpoint (Spot or Futures).
-        Each endpoint manages its own lifecycle so one crash doesn't affect the other.
-        """
-        tag = "SPOT" if is_spot else "FUTURES"
-        reconnect_attempt = 0
-
-        while self.running:
-            if not streams:
-                logger.warning(f"[{tag}] No streams to connect, sleeping...")
-                await asyncio.sleep(30)
-                continue
-
-            stream_string = "/".join(streams)
-            url = f"{base_url}/stream?streams={stream_string}"
-            logger.info(f"[{tag}] Connecting to WS with {len(streams)} streams...")
-            logger.debug(f"[{tag}] URL: {url[:120]}...")
-
+    async def _on_upstream_connect(self, tag: str, shard: int):
+        """A shard (re)connected and may have missed bars: tell schedulers and API workers."""
+        try:
+            await self.redis.publish(
+                "market:kline_stream",
+                json.dumps({"event": "reset", "market": tag.lower(), "shard": shard}),
+            )
+        except Exception as e:
+            logger.warning(f"Redis publish failed (kline_stream reset): {e}")
+
+    def _on_upstream_reject(self, tag: str, streams: List[str]):
+        """Binance refused these streams: stop counting them as subscribed so a later request retries."""
+        market = tag.lower()
+        for stream_name in streams:
+            if stream_name.endswith("@ticker"):
+                self._subscribed_ticker_streams.get(market, set()).discard(stream_name)
+            else:
+                self.subscribed_streams.discard(stream_name)
+        logger.warning(f"[{tag}] Upstream rejected {len(streams)} stream(s): {streams[:5]}")
+
+    async def _on_upstream_message(self, data, tag: str):
+        """Publish one Binance combined-stream payload (ticker or kline) to Redis."""
+        self._last_message_ts = time.time()
+
+        if isinstance(data, dict) and "e" in data and data["e"] == "24hrTicker":
+            s = data["s"]
+            if s in self.global_watchlist_syms:
+                update = {
+                    s: {
+                        "lastPrice": float(data["c"]),
+                        "priceChange": float(data["p"]),
+                        "priceChangePercent": float(data["P"]),
+                    }
+                }
+                try:
+                    await self.redis.publish("market:ticker", json.dumps(update))
+                    await self.redis.hset("binance:tickers", s, json.dumps(update[s]))
+                except Exception as e:
+                    logger.warning(f"Redis publish/hset failed (ticker): {e}")
+            return
+
+        if isinstance(data, list):
+            updates = {}
+            for item in data:
+                s = item["s"]
+                if s in self.global_watchlist_syms:
+                    updates[s] = {
+                        "lastPrice": float(item["c"]),
+                        "priceChange": float(item["p"]),
+                        "priceChangePercent": float(item["P"]),
+                    }
+            if updates:
+                try:
+                    await self.redis.publish("market:ticker", json.dumps(updates))
+                except Exception as e:
+                    logger.warning(f"Redis publish failed (ticker array): {e}")
+                syms = list(updates.keys())[:5]
+                logger.debug(f"[{tag}] Ticker update: {syms} ({len(updates)} symbols)")
+            return
+
+        if "k" in data:
+            kline = data["k"]
+            symbol = data["s"].lower()
+            interval = kline["i"]
+
+            formatted_update = {
+                "time": kline["t"] // 1000,
+                "open": float(kline["o"]),
+                "high": float(kline["h"]),
+                "low": float(kline["l"]),
+                "close": float(kline["c"]),
+                "volume": float(kline["v"]),
+            }
+
+            payload = {
+                "symbol": symbol,
+                "interval": interval,
+                "data": formatted_update,
+            }
             try:
-                async with websockets.connect(url, ping_interval=20, ping_timeout=20, close_timeout=10) as ws:
-                    logger.info(f"[{tag}] WebSocket connected!")
-                    reconnect_attempt = 0
-                    if is_spot:
-                        self.binance_spot_ws = ws
-                        self._spot_connected = True
-                        self._subscribed_ticker_streams["spot"].clear()
-                    else:
-                        self.binance_futures_ws = ws
-                        self._futures_connected = True
-                        self._subscribed_ticker_streams["futures"].clear()
-
-                    await self._subscribe_initial_ticker_streams()
-
-                    msg_count = 0
-                    while self.running:
-                        try:
-                            msg = await asyncio.wait_for(ws.recv(), timeout=90)
-                        except asyncio.TimeoutError:
-                            logger.error(f"[{tag}] No data received in 90s — forcing reconnect")
-                            break
-                        except websockets.exceptions.ConnectionClosed as e:
-                            logger.error(f"[{tag}] Binance closed connection: code={e.code}, reason={e.reason}")
-                            break
-
-                        self._last_message_ts = time.time()
-                        raw_data = json.loads(msg)
-                        data = raw_data.get("data", raw_data)
-                        msg_count += 1
-
-                        if isinstance(data, dict) and "e" in data and data["e"] == "24hrTicker":
-                            s = data["s"]
-                            if s in self.global_watchlist_syms:
-                                update = {
-                                    s: {
-                                        "lastPrice": float(data["c"]),
-                                        "priceChange": float(data["p"]),
-                                        "priceChangePercent": float(data["P"]),
-                                    }
-                                }
-                                try:
-                                    await self.redis.publish("market:ticker", json.dumps(update))
-                                    await self.redis.hset("binance:tickers", s, json.dumps(update[s]))
-                                except Exception as e:
-                                    logger.warning(f"Redis publish/hset failed (ticker): {e}")
-                            continue
-
-                        if isinstance(data, list):
-                            updates = {}
-                            for item in data:
-                                s = item["s"]
-                                if s in self.global_watchlist_syms:
-                                    updates[s] = {
-                                        "lastPrice": float(item["c"]),
-                                        "priceChange": float(item["p"]),
-                                        "priceChangePercent": float(item["P"]),
-                                    }
-                            if updates:
-                                try:
-                                    await self.redis.publish("market:ticker", json.dumps(updates))
-                                except Exception as e:
-                                    logger.warning(f"Redis publish failed (ticker array): {e}")
-                                if msg_count % 10 == 1:
-                                    syms = list(updates.keys())[:5]
-                                    logger.debug(f"[{tag}] Ticker update #{msg_count}: {syms} ({len(updates)} symbols)")
-                            continue
-
-                        if "k" in data:
-                            kline = data["k"]
-                            symbol = data["s"].lower()
-                            interval = kline["i"]
-
-                            formatted_update = {
-                                "time": kline["t"] // 1000,
-                                "open": float(kline["o"]),
-                                "high": float(kline["h"]),
-                                "low": float(kline["l"]),
-                                "close": float(kline["c"]),
-                                "volume": float(kline["v"]),
-                            }
-
-                            payload = {
-                                "symbol": symbol,
-                                "interval": interval,
-                                "data": formatted_update,
-                            }
-                            try:
-                                await self.redis.publish("market:kline", json.dumps(payload))
-                            except Exception as e:
-                                logger.warning(f"Redis publish failed (kline): {e}")
-
-                            buf_key = f"{symbol}:{interval}:{formatted_update['time']}"
-                            self._kline_write_buffer[buf_key] = formatted_update
-
-                            logger.debug(f"[{tag}] Kline -> {symbol.upper()}@{interval}: close={formatted_update['close']}")
-
-            except websockets.exceptions.InvalidURI as e:
-                logger.error(f"[{tag}] Invalid WS URI: {url} - Error: {e}")
-            except websockets.exceptions.InvalidHandshake as e:
-                logger.error(f"[{tag}] WS Handshake Failed (Check IP Bans!): {e}")
-            except asyncio.CancelledError:
-                logger.warning(f"[{tag}] Stream loop cancelled cleanly.")
-                break
+                await self.redis.publish("market:kline", json.dumps(payload))
+                if kline.get("x"):
+                    await self.redis.publish(
+                        "market:kline_stream",
+                        json.dumps({
+                            "event": "closed",
+                            "market": tag.split("#")[0].lower(),
+                            "asset_type": "crypto",
+                            **payload,
+                        }),
+                    )
             except Exception as e:
-                logger.error(f"[{tag}] Unhandled WS connection error: type={type(e).__name__}, err={e}")
-            finally:
-                if is_spot:
-                    self._spot_connected = False
-                else:
-                    self._futures_connected = False
+                logger.warning(f"Redis publish failed (kline): {e}")
 
-            # Exponential backoff with jitter: 5s, 10s, 20s, … capped at 60s
-            if self.running:
-                if is_spot:
-                    self._spot_reconnect_count += 1
-                else:
-                    self._futures_reconnect_count += 1
-                base_delay = min(5 * (2 ** reconnect_attempt), 60)
-                jitter = random.uniform(0, base_delay * 0.3)
-                delay = base_delay + jitter
-                reconnect_attempt += 1
-                logger.info(f"[{tag}] Reconnecting in {delay:.1f}s (attempt {reconnect_attempt})")
-                await asyncio.sleep(delay)
+            buf_key = f"{symbol}:{interval}:{formatted_update['time']}"
+            self._kline_write_buffer[buf_key] = formatted_update
+
+            logger.debug(f"[{tag}] Kline -> {symbol.upper()}@{interval}: close={formatted_update['close']}")
 
     async def _load_symbols(self):
         """Load spot and futures symbol names from Redis. Retries until populated."""
@@ -531,15 +834,30 @@ class ConnectionManager:
             except Exception as e:
                 logger.error(f"Symbol refresh failed: {e}")
 
+    async def start_listener(self):
+        """
+        Serve clients of this process from Redis Pub/Sub without connecting to
+        Binance; used when the streamer runs as its own worker process.
+        """
+        self.running = True
+        asyncio.create_task(self.redis_listener())
+        asyncio.create_task(self._viewer_report_loop())
+        asyncio.create_task(self._subscription_lease_loop())
+        while self.running:
+            await asyncio.sleep(60)
+
     async def start_binance_stream(self):
         """
         Background task to start Binance WebSocket streams and publish to Redis.
-        Spot and Futures run in independent tasks with their own reconnect loops.
+        Spot and Futures each run a pool of shard connections with their own reconnect loops.
         """
         self.running = True
+        self.streams_upstream = True
 
         # Start the local Redis subscriber
         asyncio.create_task(self.redis_listener())
+        asyncio.create_task(self._viewer_report_loop())
+        asyncio.create_task(self._subscription_lease_loop())
 
         # Give binance_service a moment to populate the futures list on first boot
         await asyncio.sleep(2)
@@ -548,34 +866,35 @@ class ConnectionManager:
         spot_ws_base = self.binance_ws_url.replace("/ws", "")
         futures_ws_base = settings.BINANCE_FUTURES_WS_URL
 
-        # Fix #3.3 — Start light with NO !ticker@arr; individual ticker streams
-        # are subscribed dynamically after connection via _subscribe_initial_ticker_streams()
-        spot_streams: List[str] = []
-        futures_streams: List[str] = []
+        # Independent shard connections per market — one crash doesn't kill the others
+        for market, base_url in (("spot", spot_ws_base), ("futures", futures_ws_base)):
+            self._pools[market] = BinanceStreamPool(
+                market.upper(),
+                base_url,
+                settings.BINANCE_WS_MAX_STREAMS_PER_CONN,
+                settings.BINANCE_WS_SUBSCRIBE_BATCH,
+                settings.BINANCE_WS_COMMANDS_PER_S,
+                on_message=self._on_upstream_message,
+                on_connect=self._on_upstream_connect,
+                on_reject=self._on_upstream_reject,
+            )
+
+        # Keep one kline stream per market so both stay connected (health) even
+        # before any client subscribes.
+        self.subscribed_streams.update({"btcusdt@kline_1d", "xauusdt@kline_1d"})
+        for stream in sorted(self.subscribed_streams):
+            await self._pool_for(stream).subscribe([stream])
+
+        # Fix #3.3 — no !ticker@arr; individual ticker streams per watchlist symbol
+        await self._subscribe_initial_ticker_streams()
+
+        for pool in self._pools.values():
+            pool.start()
+        logger.info(
+            "Upstream streams per shard: "
+            + ", ".join(f"{m}={p.shard_loads()}" for m, p in self._pools.items())
+        )
 
-        for s in self.subscribed_streams:
-            base_sym = s.split("@")[0].lower()
-            if base_sym in self._spot_syms:
-                spot_streams.append(s)
-            else:
-                futures_streams.append(s)
-
-        # Need at least one stream for the initial connection URL to be valid;
-        # use a single default kline stream as a seed if nothing else is subscribed
-        if not spot_streams:
-            seed = "btcusdt@kline_1d"
-            spot_streams.append(seed)
-            self.subscribed_streams.add(seed)
-        if not futures_streams:
-            seed = "xauusdt@kline_1d"
-            futures_streams.append(seed)
-            self.subscribed_streams.add(seed)
-
-        logger.info(f"Spot streams: {len(spot_streams)} | Futures streams: {len(futures_streams)}")
-
-        # Launch independent tasks — one crash doesn't kill the other
-        asyncio.create_task(self._run_stream_loop(spot_ws_base, spot_streams, is_spot=True))
-        asyncio.create_task(self._run_stream_loop(futures_ws_base, futures_streams, is_spot=False))
         asyncio.create_task(self._kline_db_writer())
         asyncio.create_task(self._symbol_refresh_loop())
 
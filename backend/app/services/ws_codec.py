@@ -0,0 +1,38 @@
+"""
+Wire encodings for browser WebSocket data frames.
+
+JSON text frames are the default. Clients may opt into MessagePack binary
+frames (same structure, smaller and cheaper to encode/decode) with the
+`msgpack` subprotocol or an `?encoding=msgpack` query param. Control frames
+such as heartbeats stay JSON text, so clients tell them apart by frame type.
+"""
+
+import json
+from typing import Optional, Tuple, Union
+
+import msgpack
+from fastapi import WebSocket
+
+JSON = "json"
+MSGPACK = "msgpack"
+ENCODINGS = (JSON, MSGPACK)
+
+
+def negotiate(websocket: WebSocket, requested: Optional[str]) -> Optional[Tuple[str, Optional[str]]]:
+    """Return (encoding, subprotocol to accept), or None for an unknown encoding.
+
+    An offered `msgpack` subprotocol wins over the query param.
+    """
+    if MSGPACK in websocket.scope.get("subprotocols", []):
+        return MSGPACK, MSGPACK
+    encoding = (requested or JSON).lower()
+    if encoding not in ENCODINGS:
+        return None
+    return encoding, None
+
+
+def encode(value, encoding: str) -> Union[str, bytes]:
+    if encoding == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    # Same wire format as WebSocket.send_json().
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
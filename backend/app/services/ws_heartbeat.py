@@ -0,0 +1,72 @@
+"""
+Process-wide heartbeat scheduler for browser WebSockets.
+
+Instead of one sleeping task per connection, every client outbox sits in a
+timing wheel with one slot per tick. A single task advances the wheel each
+tick and only looks at the outboxes in the current slot: one that has sent
+nothing for `interval` seconds gets a heartbeat frame, the others are
+re-slotted to when they will next become idle.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import time
+from typing import List, Optional
+
+from app.services.ws_outbox import ClientOutbox
+
+logger = logging.getLogger(__name__)
+
+# Conflation key: at most one heartbeat queued per client.
+_HEARTBEAT_KEY = ("heartbeat",)
+
+
+class HeartbeatWheel:
+    def __init__(self, interval: float, tick: float = 1.0):
+        self.interval = max(interval, tick)
+        self.tick = tick
+        self._slots: List[List[ClientOutbox]] = [
+            [] for _ in range(math.ceil(self.interval / tick) + 1)
+        ]
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, outbox: ClientOutbox) -> None:
+        """Start heartbeating a client; it leaves the wheel once its outbox closes."""
+        self._schedule(outbox, self.interval)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _schedule(self, outbox: ClientOutbox, delay: float) -> None:
+        ticks = min(len(self._slots) - 1, max(1, math.ceil(delay / self.tick)))
+        self._slots[(self._cursor + ticks) % len(self._slots)].append(outbox)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self._advance()
+            except Exception as e:
+                logger.error(f"Heartbeat wheel tick failed: {e}")
+
+    def _advance(self) -> None:
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        due, self._slots[self._cursor] = self._slots[self._cursor], []
+        if not due:
+            return
+        now = time.monotonic()
+        frame: Optional[str] = None
+        for outbox in due:
+            if outbox.closed:
+                continue
+            idle = now - outbox.last_sent
+            if idle < self.interval:
+                self._schedule(outbox, self.interval - idle)
+                continue
+            if frame is None:
+                # Control frame: JSON text for every encoding (see ws_codec).
+                frame = json.dumps({"type": "heartbeat", "ts": int(time.time())})
+            outbox.put(frame, _HEARTBEAT_KEY)
+            self._schedule(outbox, self.interval)
@@ -0,0 +1,120 @@
+"""
+Per-connection outbound queue for browser WebSockets.
+
+Broadcasts only enqueue pre-serialized frames; each connection's own writer
+task sends them, so a slow client never delays the others. Frames carry a
+conflation key (e.g. one kline room + bar, or one ticker symbol set): a newer
+frame with the same key replaces the queued one and moves to the back, so a
+lagging client skips intermediate updates instead of falling further behind,
+and frames with overlapping keys (ticker frames for different symbol sets)
+still arrive newest last. The queue is bounded;
+a client whose queue stays full for longer than `stall_seconds` is dropped.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Union
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Keys for frames that must not be conflated (e.g. control messages).
+_unique_keys = itertools.count()
+
+
+class ClientOutbox:
+    """Bounded, conflating send queue with a dedicated writer task."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_frames: int,
+        stall_seconds: float,
+        send_timeout: float,
+        on_drop: Callable[[WebSocket], None],
+        encoding: str = "json",
+        multiplexed: bool = False,
+    ):
+        self.websocket = websocket
+        # Wire encoding of this client's data frames (see ws_codec).
+        self.encoding = encoding
+        # Data frames are wrapped as {"channel", "data"} (multiplexed socket).
+        self.multiplexed = multiplexed
+        self.max_frames = max(1, max_frames)
+        self.stall_seconds = stall_seconds
+        self.send_timeout = send_timeout
+        self._on_drop = on_drop
+        self._pending: "OrderedDict[object, Union[str, bytes]]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._full_since: Optional[float] = None
+        self.conflated = 0
+        self.evicted = 0
+        self.closed = False
+        # Monotonic time of the last completed send (heartbeat idleness).
+        self.last_sent = time.monotonic()
+        self._task = asyncio.create_task(self._writer())
+
+    def put(self, frame: Union[str, bytes], key: object = None) -> None:
+        """Queue a frame; a queued frame with the same `key` is replaced and
+        the new one goes to the back of the queue."""
+        if self.closed:
+            return
+        if key is None:
+            key = ("_", next(_unique_keys))
+        elif key in self._pending:
+            self._pending[key] = frame
+            self._pending.move_to_end(key)
+            self.conflated += 1
+            return
+
+        if len(self._pending) >= self.max_frames:
+            now = time.monotonic()
+            if self._full_since is None:
+                self._full_since = now
+            elif now - self._full_since > self.stall_seconds:
+                logger.warning(
+                    f"Client outbox full for {self.stall_seconds}s "
+                    f"({len(self._pending)} frames), dropping slow client"
+                )
+                self._drop()
+                return
+            # Oldest frame is the stalest; make room for the new one.
+            self._pending.popitem(last=False)
+            self.evicted += 1
+        self._pending[key] = frame
+        self._ready.set()
+
+    def close(self) -> None:
+        """Stop the writer and discard anything still queued."""
+        self.closed = True
+        self._pending.clear()
+        self._task.cancel()
+
+    def _drop(self) -> None:
+        self.close()
+        self._on_drop(self.websocket)
+
+    async def _writer(self) -> None:
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                while self._pending:
+                    _, frame = self._pending.popitem(last=False)
+                    send = self.websocket.send_bytes if isinstance(frame, bytes) else self.websocket.send_text
+                    await asyncio.wait_for(send(frame), self.send_timeout)
+                    self.last_sent = time.monotonic()
+                    if len(self._pending) < self.max_frames:
+                        self._full_since = None
+                self._ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            logger.warning(f"Client send timed out after {self.send_timeout}s, dropping it")
+            self._drop()
+        except Exception as e:
+            logger.error(f"Error sending to client: {e}")
+            self._drop()
@@ -0,0 +1,10 @@
+"""
+Standalone background workers, each its own process with its own DB pool:
+
+  python -m app.workers.streamer    Binance WebSocket streamer → Redis Pub/Sub
+  python -m app.workers.scheduler   kline scheduler (shards across replicas)
+  python -m app.workers.ingest      news / macro cache refreshers
+
+Run them with EMBEDDED_WORKERS=false on the API so it only serves clients
+(from Redis) and can scale to any number of uvicorn workers.
+"""
@@ -0,0 +1,39 @@
+"""
+News and macro ingesters: keep the Redis caches behind /news and /macro warm
+so API requests never wait on RSS feeds, FRED or yfinance.
+"""
+
+import asyncio
+import logging
+import os
+
+from app.services.macro_service import macro_service
+from app.services.news_service import news_service
+from app.workers.runner import run_worker
+
+logger = logging.getLogger(__name__)
+
+# Below the cache TTLs (macro 60s, news NEWS_CACHE_TTL_S) so entries never lapse.
+MACRO_REFRESH_SECONDS = int(os.getenv("INGEST_MACRO_REFRESH_S", "45"))
+NEWS_REFRESH_SECONDS = int(os.getenv("INGEST_NEWS_REFRESH_S", "240"))
+
+
+async def _every(seconds: int, name: str, refresh) -> None:
+    while True:
+        try:
+            await refresh()
+            logger.info(f"Ingest: {name} refreshed")
+        except Exception as e:
+            logger.error(f"Ingest: {name} refresh failed: {e}")
+        await asyncio.sleep(seconds)
+
+
+async def main() -> None:
+    await asyncio.gather(
+        _every(MACRO_REFRESH_SECONDS, "macro", macro_service.refresh),
+        _every(NEWS_REFRESH_SECONDS, "news", news_service.refresh),
+    )
+
+
+if __name__ == "__main__":
+    run_worker("ingest", main)
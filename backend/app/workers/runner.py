@@ -0,0 +1,39 @@
+"""Shared process setup for the standalone workers."""
+
+import asyncio
+import logging
+import signal
+from typing import Awaitable, Callable
+
+from app.config import validate_secrets
+from app.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def _serve(name: str, main: Callable[[], Awaitable[None]]) -> None:
+    from app.services.binance_service import binance_service
+    from app.services.stock_service import stock_service
+
+    task = asyncio.create_task(main())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+
+    logger.info(f"Worker '{name}' started.")
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        logger.info(f"Worker '{name}' shutting down...")
+        await binance_service.close()
+        await stock_service.close()
+        logger.info(f"Worker '{name}' stopped.")
+
+
+def run_worker(name: str, main: Callable[[], Awaitable[None]]) -> None:
+    """Configure logging, then run `main()` until SIGINT/SIGTERM."""
+    setup_logging()
+    validate_secrets()
+    asyncio.run(_serve(name, main))
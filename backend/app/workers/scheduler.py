@@ -0,0 +1,41 @@
+"""Kline scheduler. Several replicas split symbols via the Redis hash ring."""
+
+import asyncio
+import logging
+import os
+
+from prometheus_client import start_http_server
+
+from app.services.kline_scheduler import kline_scheduler
+from app.services.websocket_manager import manager
+from app.workers.runner import run_worker
+
+logger = logging.getLogger(__name__)
+
+# The API's /metrics only covers its own process, so this worker serves the
+# scheduler histograms/counters itself. Internal network only; 0 disables.
+METRICS_PORT = int(os.getenv("SCHEDULER_METRICS_PORT", "9101"))
+
+
+def start_metrics_server() -> None:
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        logger.info(f"Scheduler metrics served on :{METRICS_PORT}/metrics")
+
+
+async def main() -> None:
+    start_metrics_server()
+    # Closed-bar and reset events from the streamer reach the scheduler
+    # through the Redis listener.
+    manager.running = True
+    listener = asyncio.create_task(manager.redis_listener())
+    try:
+        await kline_scheduler.run()
+    finally:
+        kline_scheduler.running = False
+        manager.running = False
+        listener.cancel()
+
+
+if __name__ == "__main__":
+    run_worker("scheduler", main)
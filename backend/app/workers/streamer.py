@@ -0,0 +1,15 @@
+"""Binance WebSocket streamer: the only process holding upstream connections."""
+
+from app.services.websocket_manager import manager
+from app.workers.runner import run_worker
+
+
+async def main() -> None:
+    try:
+        await manager.start_binance_stream()
+    finally:
+        manager.running = False
+
+
+if __name__ == "__main__":
+    run_worker("streamer", main)
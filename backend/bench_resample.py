@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark the OHLCV resampler on synthetic series.
+
+Usage: python bench_resample.py [--bars 1000000] [--repeat 3]
+"""
+import argparse
+import time
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from app.services.resampler import (
+    OHLCV,
+    from_candles,
+    resample_calendar_month,
+    resample_calendar_week,
+    resample_count,
+    resample_interval,
+    resample_session_days,
+    to_candles,
+)
+
+
+def _synthetic_series(n: int, step: int, start: int, seed: int = 7) -> OHLCV:
+    """Random-walk bars with ~1% of bars missing, ascending by time."""
+    rng = np.random.default_rng(seed)
+    gaps = 1 + (rng.random(n) < 0.01) * rng.integers(1, 30, n)
+    times = start + np.cumsum(gaps) * step
+    close = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    open_ = np.roll(close, 1)
+    open_[0] = close[0]
+    spread = rng.random(n) * 0.2
+    return OHLCV(
+        time=times.astype(np.int64),
+        open=open_,
+        high=np.maximum(open_, close) + spread,
+        low=np.minimum(open_, close) - spread,
+        close=close,
+        volume=rng.random(n) * 10,
+    )
+
+
+def _time_it(label: str, fn, repeat: int) -> None:
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    size = len(out) if out is not None else 0
+    print(f"{label:<40} {best * 1000:9.1f} ms   -> {size} bars")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark OHLCV resampling")
+    parser.add_argument("--bars", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tz = ZoneInfo("America/New_York")
+    minute = _synthetic_series(args.bars, 60, 1_600_000_000)
+    hourly = _synthetic_series(args.bars, 3600, 1_000_000_000)
+    daily = _synthetic_series(args.bars, 86_400, 0)
+    print(f"bars={args.bars} repeat={args.repeat} (best of)")
+
+    _time_it("fixed 1m -> 3m", lambda: resample_interval(minute, "3m"), args.repeat)
+    _time_it("fixed 1m -> 5m", lambda: resample_interval(minute, "5m"), args.repeat)
+    _time_it("calendar week 1d -> 1w", lambda: resample_calendar_week(daily), args.repeat)
+    _time_it("calendar month 1d -> 1M", lambda: resample_calendar_month(daily), args.repeat)
+    _time_it("count 1h x4", lambda: resample_count(hourly, 4), args.repeat)
+    _time_it("session day (ET) 1h x4", lambda: resample_session_days(hourly, 4, tz), args.repeat)
+
+    candles = to_candles(minute)
+    _time_it("from_candles (dict -> arrays)", lambda: from_candles(candles), args.repeat)
+    _time_it("to_candles (arrays -> dict)", lambda: to_candles(minute), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
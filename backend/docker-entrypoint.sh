@@ -4,6 +4,11 @@ set -e
 retries=30
 delay=2
 
+# Worker containers leave migrations to the API container.
+if [ "${SKIP_MIGRATIONS:-false}" = "true" ]; then
+  exec "$@"
+fi
+
 echo "Waiting for database..."
 for i in $(seq 1 "$retries"); do
   if alembic upgrade head 2>&1; then
@@ -4,6 +4,7 @@ import asyncio
 from datetime import UTC, datetime
 import json
 import logging
+import sys
 import time
 from typing import Any
 
@@ -13,6 +14,7 @@ from sqlalchemy.exc import OperationalError
 from app.config import settings
 from app.database.connection import SessionLocal
 from app.database.models import Kline, Symbol
+from app.services.kline_coverage import coverage_ranges, gaps_between, invalidate_coverage
 from app.services.klines_db_service import (
     fetch_klines_from_api,
     infer_symbol_row,
@@ -70,64 +72,6 @@ def _missing_span(left_t: int, right_t: int, step: int) -> tuple[int | None, int
     return start, end
 
 
-def _scan_internal_gaps_segmented(
-    db,
-    symbol_id: int,
-    interval: str,
-    step: int,
-    batch_size: int,
-    scan_start_time: int | None = None,
-    scan_end_time: int | None = None,
-) -> tuple[list[tuple[int, int, int]], int, int | None, int | None]:
-    """
-    Scan all DB history in ascending open_time order using segmented reads.
-    Returns: (gaps, rows_scanned, first_open_time, last_open_time)
-    """
-    gaps: list[tuple[int, int, int]] = []
-    rows_scanned = 0
-    first_open_time: int | None = None
-    last_open_time: int | None = None
-    prev_t: int | None = None
-    cursor_after: int | None = None
-
-    while True:
-        q = (
-            db.query(Kline.open_time)
-            .filter(Kline.symbol_id == symbol_id, Kline.bar_interval == interval)
-            .order_by(Kline.open_time.asc())
-        )
-        if scan_start_time is not None:
-            q = q.filter(Kline.open_time >= scan_start_time)
-        if scan_end_time is not None:
-            q = q.filter(Kline.open_time <= scan_end_time)
-        if cursor_after is not None:
-            q = q.filter(Kline.open_time > cursor_after)
-        q = q.limit(batch_size)
-        rows = q.all()
-        if not rows:
-            break
-
-        times = [int(r[0]) for r in rows]
-        if first_open_time is None:
-            first_open_time = times[0]
-        last_open_time = times[-1]
-        rows_scanned += len(times)
-
-        for t in times:
-            if prev_t is not None:
-                delta = t - prev_t
-                if delta > step:
-                    missing = (delta // step) - 1
-                    gaps.append((prev_t, t, missing))
-            prev_t = t
-
-        cursor_after = times[-1]
-        if len(times) < batch_size:
-            break
-
-    return gaps, rows_scanned, first_open_time, last_open_time
-
-
 def _symbol_id(db, symbol: str, asset_type: str) -> int | None:
     row = (
         db.query(Symbol)
@@ -292,6 +236,7 @@ async def correct_recent_candles(
                     )
                 else:
                     db.query(Kline).filter(Kline.id.in_(prune_ids)).delete(synchronize_session=False)
+                    invalidate_coverage(db, sid, interval)
                     db.commit()
                     logger.info(
                         "Stock prune: deleted=%d rows (volume=0, not in API set)",
@@ -355,7 +300,6 @@ async def fill_gaps(
     symbol: str,
     interval: str,
     asset_type: str,
-    scan_window: int,
     scan_start_time: int | None,
     scan_end_time: int | None,
     fill_tail: bool,
@@ -449,32 +393,31 @@ async def fill_gaps(
 
         # 2) Internal gaps: scan timeline for jumps > 1 interval.
         if scan_internal and sid:
-            gaps, scanned_rows, scan_start_t, scan_end_t = _scan_internal_gaps_segmented(
+            ranges = coverage_ranges(
                 db,
                 sid,
                 interval,
                 step,
-                max(2, scan_window),
-                scan_start_time=scan_start_time,
-                scan_end_time=scan_end_time,
+                start_time=scan_start_time,
+                end_time=scan_end_time,
             )
-            if scan_start_t is None:
-                logger.info("Internal segmented scan: no rows for %s @ %s", symbol_u, interval)
+            gaps = gaps_between(ranges, step)
+            if not ranges:
+                logger.info("Internal coverage scan: no rows for %s @ %s", symbol_u, interval)
             else:
                 logger.info(
-                    "Internal segmented scan: rows=%d batch_size=%d effective_range=[%s -> %s] filter=[%s -> %s]",
-                    scanned_rows,
-                    max(2, scan_window),
-                    _fmt_ts(scan_start_t),
-                    _fmt_ts(scan_end_t),
+                    "Internal coverage scan: ranges=%d effective_range=[%s -> %s] filter=[%s -> %s]",
+                    len(ranges),
+                    _fmt_ts(ranges[0][0]),
+                    _fmt_ts(ranges[-1][1]),
                     _fmt_ts(scan_start_time),
                     _fmt_ts(scan_end_time),
                 )
 
             if gaps:
-                logger.info("Internal segmented scan found %d gaps", len(gaps))
+                logger.info("Internal coverage scan found %d gaps", len(gaps))
             else:
-                logger.info("Internal segmented scan found no gaps")
+                logger.info("Internal coverage scan found no gaps")
 
             for left_t, right_t, missing in gaps:
                 # Pull exactly this gap span (time-bounded) and keep only candles in this hole.
@@ -651,8 +594,8 @@ async def main() -> None:
     parser.add_argument(
         "--scan-window",
         type=int,
-        default=5000,
-        help="fill-gaps mode: internal scan segment size (rows per DB batch, full-history scan)",
+        default=None,
+        help="deprecated, ignored: gaps come from the coverage index, no DB scan batching",
     )
     parser.add_argument(
         "--scan-start-time",
@@ -706,6 +649,12 @@ async def main() -> None:
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.scan_window is not None:
+        print(
+            "seed_candles.py: --scan-window is deprecated and ignored "
+            "(internal gaps come from the coverage index); drop it from your command.",
+            file=sys.stderr,
+        )
     scan_start_time = _parse_human_ts(args.scan_start_time) if args.scan_start_time else None
     scan_end_time = _parse_human_ts(args.scan_end_time) if args.scan_end_time else None
     if scan_start_time is not None and scan_end_time is not None and scan_start_time > scan_end_time:
@@ -737,7 +686,6 @@ async def main() -> None:
             args.symbol,
             args.interval,
             args.asset_type,
-            scan_window=args.scan_window,
             scan_start_time=scan_start_time,
             scan_end_time=scan_end_time,
             fill_tail=not args.no_tail,
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Deterministic simulation of the kline scheduler's upstream and DB budget.
+
+Drives KlineScheduler.step() and deep_step() on a fake clock against an
+in-memory fake Binance (no network) and a disposable local MariaDB, and
+reports upstream requests, request weight, DB queries, rows written and wall
+time per fast cycle / deep slice. The same inputs always produce the same request counts, so a change
+that spends more upstream budget shows up as a diff or a failed budget flag.
+
+Usage:
+  python sim_scheduler.py --database-url mysql+pymysql://user:pw@localhost/viewingchart_sim \\
+      [--symbols 20] [--hours 6] [--listed-days 30] \\
+      [--max-fast-requests N] [--max-fast-queries N] [--quiet]
+
+The database must be a throwaway one: tables are created if missing and all
+simulated series (SIM*USDT) are deleted before the run. Redis, sharding and
+the live kline stream are not used. Exits 1 if a --max-* budget is exceeded.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import types
+import zlib
+from contextlib import asynccontextmanager
+
+# Fake upstream paging: Binance returns at most 1000 klines per request and
+# GET /klines costs 2 request-weight units.
+PAGE_BARS = 1000
+REQUEST_WEIGHT = 2
+
+# 2026-01-01 00:00 UTC; a fixed start keeps runs reproducible.
+DEFAULT_START = 1_767_225_600
+
+
+class FakeClock:
+    """Stands in for the `time` module and asyncio.sleep inside the scheduler."""
+
+    def __init__(self, start: float) -> None:
+        self.now = float(start)
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += max(0.0, seconds)
+
+    async def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+
+class FakeUpstream:
+    """In-memory Binance: deterministic bars from `listed_since` up to the clock."""
+
+    def __init__(self, clock: FakeClock, listed_since: int) -> None:
+        self.clock = clock
+        self.listed_since = listed_since
+        self.requests = 0
+        self.weight = 0
+
+    @staticmethod
+    def _candle(symbol: str, t: int, step: int) -> dict:
+        seed = zlib.crc32(f"{symbol}:{step}:{t}".encode())
+        open_ = 100 + (seed % 10_000) / 100
+        close = open_ + ((seed >> 8) % 200 - 100) / 100
+        return {
+            "time": t,
+            "open": open_,
+            "high": max(open_, close) + (seed >> 16) % 50 / 100,
+            "low": min(open_, close) - (seed >> 20) % 50 / 100,
+            "close": close,
+            "volume": float((seed >> 4) % 1000),
+        }
+
+    async def fetch_klines(
+        self,
+        symbol: str,
+        asset_type: str,
+        bar_interval: str,
+        limit: int,
+        include_extended: bool = False,
+        start_time: int | None = None,
+        end_time: int | None = None,
+    ) -> list[dict]:
+        from app.services.resampler import INTERVAL_SECONDS, bucket_start
+
+        step = INTERVAL_SECONDS[bar_interval]
+        first_open = bucket_start(self.listed_since, bar_interval)
+        # Like Binance, the still-open bar is included.
+        last_open = bucket_start(int(self.clock.now), bar_interval)
+        if end_time is not None:
+            last_open = min(last_open, bucket_start(int(end_time), bar_interval))
+        limit = max(1, limit)
+        if start_time is not None:
+            lo = max(first_open, -(-int(start_time) // step) * step)
+            times = list(range(lo, last_open + 1, step))[:limit]
+        else:
+            lo = max(first_open, last_open - (limit - 1) * step)
+            times = list(range(lo, last_open + 1, step))
+
+        # binance_service pages 1000 bars per request; an empty answer is one request.
+        pages = max(1, -(-len(times) // PAGE_BARS))
+        self.requests += pages
+        self.weight += pages * REQUEST_WEIGHT
+        return [self._candle(symbol, t, step) for t in times]
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Simulate kline scheduler cycles")
+    parser.add_argument("--database-url", required=True, help="Disposable MariaDB URL")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--hours", type=float, default=6.0, help="Simulated duration")
+    parser.add_argument("--start", type=int, default=DEFAULT_START, help="Unix start time")
+    parser.add_argument("--listed-days", type=int, default=30, help="Upstream history length")
+    parser.add_argument("--max-fast-requests", type=int, default=None)
+    parser.add_argument("--max-fast-queries", type=int, default=None)
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    return parser.parse_args()
+
+
+def _reset_sim_series(symbols: list[str]) -> None:
+    from app.database.connection import SessionLocal
+    from app.database.models import Kline, KlineBackfillPartition, KlineCoverage, Symbol
+
+    db = SessionLocal()
+    try:
+        ids = [
+            sid for (sid,) in db.query(Symbol.id).filter(Symbol.symbol.in_(symbols)).all()
+        ]
+        if ids:
+            for model in (Kline, KlineCoverage, KlineBackfillPartition):
+                db.query(model).filter(model.symbol_id.in_(ids)).delete(
+                    synchronize_session=False,
+                )
+            db.commit()
+    finally:
+        db.close()
+
+
+async def _simulate(args: argparse.Namespace) -> int:
+    from sqlalchemy import event
+
+    import app.services.kline_backfill as kline_backfill
+    import app.services.kline_scheduler as ks
+    import app.services.scheduler_metrics as scheduler_metrics
+    from app.database import models
+    from app.database.connection import engine
+    from app.services.scheduler_cluster import SchedulerCluster
+    from app.services.scheduler_metrics import SchedulerMetrics
+
+    models.Base.metadata.create_all(bind=engine)
+    symbols = [f"SIM{i:03d}USDT" for i in range(args.symbols)]
+    _reset_sim_series(symbols)
+
+    clock = FakeClock(args.start)
+    upstream = FakeUpstream(clock, args.start - args.listed_days * 86_400)
+    ks.time = clock
+    scheduler_metrics.time = clock
+    ks.asyncio = types.SimpleNamespace(**{**vars(asyncio), "sleep": clock.sleep})
+    ks.fetch_klines_from_api = upstream.fetch_klines
+    kline_backfill.fetch_klines_from_api = upstream.fetch_klines
+    SchedulerCluster.ENABLED = False
+
+    queries = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    cycles: list[dict] = []
+
+    class SimMetrics(SchedulerMetrics):
+        """Adds fake-upstream, DB and wall-clock counters to every run summary."""
+
+        @asynccontextmanager
+        async def cycle(self, kind, **fields):
+            requests, weight, q0 = upstream.requests, upstream.weight, queries
+            wall = time.perf_counter()
+            async with super().cycle(kind, **fields) as summary:
+                try:
+                    yield summary
+                finally:
+                    summary.update(
+                        sim_offset_s=round(clock.now - args.start),
+                        api_requests=upstream.requests - requests,
+                        api_weight=upstream.weight - weight,
+                        db_queries=queries - q0,
+                        wall_ms=round((time.perf_counter() - wall) * 1000, 1),
+                    )
+                    cycles.append(summary)
+
+        async def _publish(self, summary):
+            return None
+
+    scheduler = ks.KlineScheduler()
+    scheduler._metrics = SimMetrics(scheduler._cluster.instance_id)
+    scheduler._load_superadmin_symbols_sync = lambda: [
+        {"symbol": s, "asset_type": "crypto"} for s in symbols
+    ]
+
+    end = clock.now + args.hours * 3600
+    while clock.now < end:
+        fast_sleep = await scheduler.step()
+        clock.advance(min(fast_sleep, await scheduler.deep_step()))
+
+    if not args.quiet:
+        print(f"{'t+s':>8} {'kind':<5} {'size':>5} {'api':>6} {'weight':>7} "
+              f"{'queries':>8} {'rows':>8} {'sim_s':>7} {'wall_ms':>9}")
+        for c in cycles:
+            size = c.get("due") if c["kind"] == "fast" else len(c.get("symbols", []))
+            print(f"{c['sim_offset_s']:>8} {c['kind']:<5} {size:>5} {c['api_requests']:>6} "
+                  f"{c['api_weight']:>7} {c['db_queries']:>8} {c['rows_written']:>8} "
+                  f"{c['duration_s']:>7.1f} {c['wall_ms']:>9.1f}")
+
+    print(f"symbols={args.symbols} hours={args.hours} listed_days={args.listed_days}")
+    for kind in ("fast", "deep"):
+        runs = [c for c in cycles if c["kind"] == kind]
+        if not runs:
+            continue
+        print(
+            f"{kind:<5} runs={len(runs):<5} "
+            f"api avg={sum(c['api_requests'] for c in runs) / len(runs):.1f} "
+            f"max={max(c['api_requests'] for c in runs)}  "
+            f"weight total={sum(c['api_weight'] for c in runs)}  "
+            f"queries avg={sum(c['db_queries'] for c in runs) / len(runs):.1f} "
+            f"max={max(c['db_queries'] for c in runs)}  "
+            f"wall avg={sum(c['wall_ms'] for c in runs) / len(runs):.1f}ms"
+        )
+    print(f"total api_requests={upstream.requests} weight={upstream.weight} db_queries={queries}")
+
+    fast = [c for c in cycles if c["kind"] == "fast"]
+    failed = False
+    if args.max_fast_requests is not None:
+        worst = max((c["api_requests"] for c in fast), default=0)
+        if worst > args.max_fast_requests:
+            print(f"FAIL: fast cycle made {worst} upstream requests (> {args.max_fast_requests})")
+            failed = True
+    if args.max_fast_queries is not None:
+        worst = max((c["db_queries"] for c in fast), default=0)
+        if worst > args.max_fast_queries:
+            print(f"FAIL: fast cycle ran {worst} DB queries (> {args.max_fast_queries})")
+            failed = True
+    return 1 if failed else 0
+
+
+def main() -> None:
+    args = _parse_args()
+    # Must be set before app.database.connection builds its engine.
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.exit(asyncio.run(_simulate(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -39,3 +39,27 @@ CREATE TABLE IF NOT EXISTS klines (
     INDEX idx_kline_symbol_bar_time (symbol_id, bar_interval, open_time),
     FOREIGN KEY (symbol_id) REFERENCES symbols(id) ON DELETE CASCADE
 );
+
+-- Kline coverage: contiguous filled open_time ranges per series (gap index)
+CREATE TABLE IF NOT EXISTS kline_coverage (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    symbol_id INT NOT NULL,
+    bar_interval VARCHAR(8) NOT NULL,
+    start_time INT NOT NULL COMMENT 'Unix seconds, first open_time of the range',
+    end_time INT NOT NULL COMMENT 'Unix seconds, last open_time of the range',
+    INDEX idx_kline_coverage_series (symbol_id, bar_interval, start_time),
+    FOREIGN KEY (symbol_id) REFERENCES symbols(id) ON DELETE CASCADE
+);
+
+-- Backfill checkpoints: one row per in-flight partition (next open_time to fetch)
+CREATE TABLE IF NOT EXISTS kline_backfill_partitions (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    symbol_id INT NOT NULL,
+    bar_interval VARCHAR(8) NOT NULL,
+    range_start INT NOT NULL COMMENT 'Unix seconds, first open_time of the partition',
+    range_end INT NOT NULL COMMENT 'Unix seconds, last open_time of the partition',
+    cursor_time INT NOT NULL COMMENT 'Unix seconds, next open_time to fetch',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uk_backfill_partition (symbol_id, bar_interval, range_start),
+    FOREIGN KEY (symbol_id) REFERENCES symbols(id) ON DELETE CASCADE
+);
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+# Before any app module is imported: kline_scheduler attaches its file handler
+# at import time, and test runs must not write into the real logs/scheduler.log.
+os.environ["KLINE_SCHEDULER_LOG_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="scheduler-log-"), "scheduler.log",
+)
+
+import pytest
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.connection import Base
+from app.database import models  # noqa: F401  (registers the tables)
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns.
+    return "INTEGER"
+
+
+@pytest.fixture
+def session_factory():
+    """sessionmaker bound to a fresh in-memory SQLite database with every table."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
@@ -0,0 +1,109 @@
+import time
+
+from app.services.binance_stream_pool import ACK_TIMEOUT_S, BinanceStreamPool
+
+
+async def _noop(*args):
+    return None
+
+
+def _pool(max_streams=2):
+    # Not started: shards are placed but never connect.
+    return BinanceStreamPool(
+        "spot", "wss://example.invalid", max_streams=max_streams, batch_size=10,
+        commands_per_s=5, on_message=_noop, on_connect=_noop,
+    )
+
+
+class _FakeWs:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+        if self.fail:
+            raise RuntimeError("socket already gone")
+
+
+async def test_streams_fill_the_least_loaded_shard_then_open_a_new_one():
+    pool = _pool(max_streams=2)
+
+    await pool.subscribe(["a@kline_1m", "b@kline_1m", "c@kline_1m"])
+    assert pool.shard_loads() == [2, 1]
+
+    await pool.unsubscribe(["a@kline_1m", "b@kline_1m"])
+    await pool.subscribe(["d@kline_1m", "c@kline_1m"])
+    # "c" stays where it is; "d" goes to the emptier shard.
+    assert pool.shard_loads() == [1, 1]
+    assert pool._owner["d@kline_1m"] is pool._shards[0]
+
+
+async def test_emptied_shard_takes_no_streams_until_it_disconnects():
+    pool = _pool(max_streams=2)
+    await pool.subscribe(["a@kline_1m"])
+    shard = pool._shards[0]
+    shard.connected, shard.ws = True, _FakeWs(fail=True)
+
+    # A failing close is logged, not raised.
+    await pool.unsubscribe(["a@kline_1m"])
+    assert shard.ws.closed and shard.draining
+
+    await pool.subscribe(["b@kline_1m"])
+    assert pool._owner["b@kline_1m"] is not shard
+    assert pool.shard_loads() == [0, 1]
+
+
+def _inflight(pool, stream_names, method="SUBSCRIBE", command_id=7, sent_at=None):
+    """Place streams on a connected shard with one command awaiting its ack."""
+    shard = pool._least_loaded()
+    for stream in stream_names:
+        shard.streams.add(stream)
+        pool._owner[stream] = shard
+    shard.connected = True
+    shard.live = set(stream_names)
+    shard.inflight[command_id] = (
+        method, list(stream_names), time.monotonic() if sent_at is None else sent_at,
+    )
+    return shard
+
+
+async def test_rejected_subscribe_drops_the_streams_and_reports_them():
+    rejected = []
+    pool = BinanceStreamPool(
+        "SPOT", "wss://example.invalid", max_streams=5, batch_size=10, commands_per_s=5,
+        on_message=_noop, on_connect=_noop, on_reject=lambda tag, s: rejected.append((tag, s)),
+    )
+    shard = _inflight(pool, ["bad@kline_1m", "good@kline_1m"])
+    # "good" moved to another shard before the reply arrived.
+    pool._owner["good@kline_1m"] = object()
+
+    pool._on_ack(shard, {"id": 7, "error": {"code": 2, "msg": "Invalid request"}})
+
+    assert rejected == [("SPOT", ["bad@kline_1m"])]
+    assert "bad@kline_1m" not in shard.streams and "bad@kline_1m" not in pool._owner
+    assert shard.inflight == {}
+
+
+async def test_acked_subscribe_keeps_the_streams():
+    pool = _pool()
+    shard = _inflight(pool, ["a@kline_1m"])
+
+    pool._on_ack(shard, {"id": 7, "result": None})
+
+    assert shard.inflight == {} and shard.live == {"a@kline_1m"}
+    assert pool._owner["a@kline_1m"] is shard
+
+
+async def test_missing_ack_requeues_the_command():
+    pool = _pool()
+    shard = _inflight(pool, ["a@kline_1m"], sent_at=time.monotonic() - ACK_TIMEOUT_S - 1)
+    shard.inflight[8] = ("UNSUBSCRIBE", ["gone@kline_1m"], 0.0)
+    shard.dirty.clear()
+
+    assert pool._expire_acks(shard) is None
+
+    # The subscribe is sent again, the unsubscribe too since the stream is unwanted.
+    assert shard.inflight == {} and shard.dirty.is_set()
+    assert shard.live == {"gone@kline_1m"}
+    assert shard.streams - shard.live == {"a@kline_1m"}
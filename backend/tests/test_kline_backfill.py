@@ -0,0 +1,71 @@
+import pytest
+
+import app.services.kline_backfill as kline_backfill
+from app.database.models import Kline, KlineBackfillPartition
+
+STEP = 60
+START = 1_767_225_600
+
+
+def _bar(t):
+    return {"time": t, "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}
+
+
+class _Upstream:
+    """Bars from `listed_at` on; calls listed in `fail_calls` come back empty like an error."""
+
+    def __init__(self, listed_at=START, fail_calls=()):
+        self.listed_at = listed_at
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+
+    async def fetch_klines(self, symbol, asset_type, bar_interval, limit, start_time=None, end_time=None):
+        self.calls += 1
+        if self.calls in self.fail_calls:
+            return []
+        lo = max(start_time, self.listed_at)
+        return [_bar(t) for t in range(lo, end_time + 1, STEP)][:limit]
+
+
+@pytest.fixture
+def upstream(monkeypatch, session_factory):
+    monkeypatch.setattr(kline_backfill, "SessionLocal", session_factory)
+    fake = _Upstream()
+    monkeypatch.setattr(kline_backfill, "fetch_klines_from_api", fake.fetch_klines)
+    return fake
+
+
+async def _throttle():
+    return None
+
+
+async def _backfill(start, end, partitions=1):
+    return await kline_backfill.backfill_range(
+        "BTCUSDT", "crypto", 1, "1m", STEP, start, end, _throttle, partitions=partitions,
+    )
+
+
+async def test_empty_page_mid_range_keeps_the_checkpoint(upstream, db):
+    upstream.fail_calls = {2}
+    end = START + 2499 * STEP
+
+    saved, first_t, last_t = await _backfill(START, end)
+
+    assert (saved, first_t, last_t) == (1000, START, START + 999 * STEP)
+    part = db.query(KlineBackfillPartition).one()
+    assert part.cursor_time == START + 1000 * STEP
+
+    # The next deep pass resumes from the cursor and finishes the range.
+    saved, first_t, _ = await _backfill(START, end)
+    assert (saved, first_t) == (1500, START + 1000 * STEP)
+    assert db.query(KlineBackfillPartition).count() == 0
+    assert db.query(Kline).count() == 2500
+
+
+async def test_partitions_before_the_listing_are_finished(upstream, db):
+    upstream.listed_at = START + 1500 * STEP
+
+    saved, first_t, _ = await _backfill(START, START + 2999 * STEP, partitions=3)
+
+    assert (saved, first_t) == (1500, upstream.listed_at)
+    assert db.query(KlineBackfillPartition).count() == 0
@@ -0,0 +1,99 @@
+from app.database.models import Kline, KlineCoverage, Symbol
+from app.services.kline_coverage import (
+    coverage_ranges,
+    find_gaps_many,
+    invalidate_coverage,
+    runs_from_times,
+    scan_runs,
+    update_coverage,
+)
+
+STEP = 60
+
+
+def _add_symbol(db, symbol="BTCUSDT"):
+    sym = Symbol(
+        symbol=symbol, base_asset=symbol[:3], quote_asset="USDT",
+        asset_type="crypto", source="binance",
+    )
+    db.add(sym)
+    db.commit()
+    return sym.id
+
+
+def _add_klines(db, sid, times, interval="1m"):
+    db.add_all(
+        Kline(
+            symbol_id=sid, bar_interval=interval, open_time=t,
+            open_price=1, high_price=1, low_price=1, close_price=1, base_volume=1,
+        )
+        for t in times
+    )
+    db.commit()
+
+
+def _stored(db, sid, interval="1m"):
+    rows = (
+        db.query(KlineCoverage.start_time, KlineCoverage.end_time)
+        .filter(KlineCoverage.symbol_id == sid, KlineCoverage.bar_interval == interval)
+        .order_by(KlineCoverage.start_time)
+        .all()
+    )
+    return [(r[0], r[1]) for r in rows]
+
+
+def test_runs_from_times_splits_on_holes():
+    assert runs_from_times([180, 0, 60, 60, 120, 600], STEP) == [(0, 180), (600, 600)]
+    assert runs_from_times([], STEP) == []
+
+
+def test_scan_runs_finds_runs_of_several_series(db):
+    a, b = _add_symbol(db, "BTCUSDT"), _add_symbol(db, "ETHUSDT")
+    _add_klines(db, a, [0, 60, 120, 300, 360, 900])
+    _add_klines(db, b, [0, 60])
+
+    runs = scan_runs(db, [a, b], "1m", STEP)
+
+    assert runs == {a: [(0, 120), (300, 360), (900, 900)], b: [(0, 60)]}
+    assert scan_runs(db, [a], "1m", STEP, start_time=300, end_time=600) == {a: [(300, 360)]}
+
+
+def test_first_lookup_builds_the_index_and_gaps(db):
+    sid = _add_symbol(db)
+    _add_klines(db, sid, [0, 60, 120, 300, 360])
+
+    assert find_gaps_many(db, [sid], "1m", STEP) == {sid: [(120, 300, 2)]}
+    assert _stored(db, sid) == [(0, 120), (300, 360)]
+
+
+def test_writes_merge_into_indexed_coverage(db):
+    sid = _add_symbol(db)
+    _add_klines(db, sid, [0, 60, 300])
+    coverage_ranges(db, sid, "1m", STEP)
+
+    # Filling the hole joins both ranges; a later bar extends the last one.
+    _add_klines(db, sid, [120, 180, 240, 360])
+    update_coverage(db, {(sid, "1m"): [120, 180, 240, 360]})
+    db.commit()
+
+    assert _stored(db, sid) == [(0, 360)]
+    assert find_gaps_many(db, [sid], "1m", STEP) == {sid: []}
+
+
+def test_writes_leave_unindexed_series_alone(db):
+    sid = _add_symbol(db)
+    update_coverage(db, {(sid, "1m"): [0, 60]})
+    db.commit()
+
+    assert _stored(db, sid) == []
+
+
+def test_invalidate_forces_a_rebuild(db):
+    sid = _add_symbol(db)
+    _add_klines(db, sid, [0, 60, 120])
+    coverage_ranges(db, sid, "1m", STEP)
+    db.query(Kline).filter(Kline.open_time == 60).delete()
+    invalidate_coverage(db, sid, "1m")
+    db.commit()
+
+    assert coverage_ranges(db, sid, "1m", STEP) == [(0, 0), (120, 120)]
@@ -0,0 +1,190 @@
+import pytest
+
+from app.services import kline_scheduler as ks
+
+
+class _FakeSession:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+def _candle(t, close=1.0):
+    return {"time": t, "open": close, "high": close, "low": close, "close": close, "volume": 1.0}
+
+
+def _scheduler(monkeypatch):
+    monkeypatch.setattr(ks, "SessionLocal", _FakeSession)
+    sched = ks.KlineScheduler()
+    sched._symbol_ids = {("BTCUSDT", "crypto"): 1, ("ETHUSDT", "crypto"): 2}
+    return sched
+
+
+def test_flush_writes_batches_all_series(monkeypatch):
+    sched = _scheduler(monkeypatch)
+    calls = []
+
+    def save(db, series, chunk_size):
+        calls.append(dict(series))
+        return sum(len(v) for v in series.values())
+
+    monkeypatch.setattr(ks, "save_klines_multi", save)
+    sched._persist_klines("BTCUSDT", "crypto", "1m", [_candle(60), _candle(120)])
+    sched._persist_klines("ETHUSDT", "crypto", "1m", [_candle(60)])
+
+    assert sched._flush_writes() == 3
+    assert len(calls) == 1
+    assert set(calls[0]) == {(1, "1m"), (2, "1m")}
+    assert sched._write_buffer == {} and sched._buffered_rows == 0
+
+
+def test_flush_writes_falls_back_to_per_series(monkeypatch):
+    sched = _scheduler(monkeypatch)
+    saved_series = []
+
+    def save(db, series, chunk_size):
+        if len(series) > 1 or (2, "1m") in series:
+            raise RuntimeError("lock wait timeout")
+        saved_series.extend(series)
+        return sum(len(v) for v in series.values())
+
+    monkeypatch.setattr(ks, "save_klines_multi", save)
+    sched._stream_synced = {("BTCUSDT", "1m"), ("ETHUSDT", "1m")}
+    sched._block_digests[("ETHUSDT", "crypto", "1m")] = {0: ("digest", 0.0)}
+    sched._persist_klines("BTCUSDT", "crypto", "1m", [_candle(60), _candle(120)])
+    sched._persist_klines("ETHUSDT", "crypto", "1m", [_candle(60)])
+
+    assert sched._flush_writes() == 2
+    assert saved_series == [(1, "1m")]
+    # The failed series goes back to REST; the stored one keeps its stream.
+    assert sched._stream_synced == {("BTCUSDT", "1m")}
+    assert ("ETHUSDT", "crypto", "1m") not in sched._block_digests
+
+
+class _RecordingSession(_FakeSession):
+    """Records deletes and commits; query(...).filter(...).delete() chains."""
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def query(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def delete(self, synchronize_session=None):
+        self.events.append("delete")
+        return 0
+
+    def commit(self):
+        self.events.append("commit")
+
+
+async def test_aggregate_derived_commits_each_page_in_its_session(monkeypatch):
+    sched = _scheduler(monkeypatch)
+    sched.DERIVED_PAGE_BARS = 7
+    source = [_candle(t * 60) for t in range(12)]
+
+    def load(db, sid, interval, start, end, limit):
+        return [b for b in source if start <= b["time"] < end][:limit]
+
+    def save(db, series, chunk_size):
+        ((key, bars),) = series.items()
+        db.events.append(("save", key, [b["time"] for b in bars]))
+        db.commit()
+        return len(bars)
+
+    monkeypatch.setattr(ks, "load_klines_range", load)
+    monkeypatch.setattr(ks, "save_klines_multi", save)
+    db = _RecordingSession()
+
+    await sched._aggregate_derived(db, 1, "BTCUSDT", "crypto", "1m", "3m", [(0, 660)])
+
+    assert db.events == [
+        "delete", ("save", (1, "3m"), [0, 180]), "commit",
+        "delete", ("save", (1, "3m"), [360, 540]), "commit",
+    ]
+    # Nothing is left on the shared write buffer for another session to flush.
+    assert sched._write_buffer == {}
+
+
+def _closed(symbol, interval, t, **extra):
+    return {"event": "closed", "symbol": symbol, "interval": interval, "data": _candle(t), **extra}
+
+
+def test_stream_event_persists_every_watched_asset_type(monkeypatch):
+    sched = _scheduler(monkeypatch)
+    sched._sync_due([
+        {"symbol": "BTCUSDT", "asset_type": "crypto"},
+        {"symbol": "AAPL", "asset_type": "stock"},
+    ])
+
+    sched.on_stream_event(_closed("btcusdt", "1m", 60, market="spot", asset_type="crypto"))
+    sched.on_stream_event(_closed("aapl", "1m", 60, market="spot", asset_type="crypto"))
+    # Events from publishers without asset_type still reach the watched series.
+    sched.on_stream_event(_closed("btcusdt", "1m", 120))
+
+    assert list(sched._write_buffer) == [("BTCUSDT", "crypto", "1m")]
+    assert sorted(sched._write_buffer[("BTCUSDT", "crypto", "1m")]) == [60, 120]
+
+
+def test_stream_event_ignores_other_asset_types(monkeypatch):
+    sched = _scheduler(monkeypatch)
+    sched._sync_due([{"symbol": "BTCUSDT", "asset_type": "crypto"}])
+
+    sched.on_stream_event(_closed("btcusdt", "1m", 60, asset_type="futures"))
+
+    assert sched._write_buffer == {}
+
+
+async def test_rate_limiter_reserve_leaves_slots_free():
+    limiter = ks.RateLimiter(4, "test")
+    for _ in range(3):
+        await limiter.acquire(reserve=1)
+    # The reserved slot is still free for a caller without a reserve.
+    await limiter.acquire()
+    assert len(limiter._timestamps) == 4
+
+
+async def test_step_runs_no_deep_work(monkeypatch):
+    sched = _scheduler(monkeypatch)
+    sched._next_refresh = float("inf")
+    sched._deep_rotation.extend([("BTCUSDT", "crypto")])
+    sched._deep_urgent = [("BTCUSDT", "crypto")]
+
+    async def deep(batch):
+        raise AssertionError("deep work must not run inside step()")
+
+    monkeypatch.setattr(sched, "_process_deep_cycle", deep)
+    await sched.step()
+
+    assert sched._deep_urgent == [("BTCUSDT", "crypto")]
+
+
+async def test_deep_step_serves_urgent_then_waits_for_credit(monkeypatch):
+    sched = _scheduler(monkeypatch)
+    sched.DEEP_CYCLE_INTERVAL_SECONDS = 1000
+    sched._deep_rotation.extend([("BTCUSDT", "crypto"), ("ETHUSDT", "crypto")])
+    sched._deep_urgent = [("ETHUSDT", "crypto")]
+    processed = []
+
+    async def deep(batch):
+        processed.append([e["symbol"] for e in batch])
+
+    monkeypatch.setattr(sched, "_process_deep_cycle", deep)
+
+    sleep_for = await sched.deep_step()
+
+    assert processed == [["ETHUSDT"]]
+    # No credit yet: the next slice is one rotation step (1000s / 2) away,
+    # capped by the symbol refresh period.
+    assert sleep_for == min(sched.SYMBOL_REFRESH_SECONDS, 500)
+    assert await sched.deep_step() == pytest.approx(sleep_for, abs=1)
+    assert processed == [["ETHUSDT"]]
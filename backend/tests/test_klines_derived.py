@@ -0,0 +1,49 @@
+from app.services import klines_db_service as kds
+
+
+def _hourly(n):
+    return [
+        {"time": i * 3600, "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5, "volume": 1.0}
+        for i in range(n)
+    ]
+
+
+def _no_redis():
+    raise ConnectionError("redis unavailable")
+
+
+async def test_derived_reads_base_from_db_only(monkeypatch):
+    reads = []
+
+    def read_only(symbol, asset_type, interval, limit):
+        reads.append((symbol, asset_type, interval, limit))
+        return _hourly(min(limit, 48))
+
+    async def db_first(*args, **kwargs):
+        raise AssertionError("derived timeframes must not trigger API backfill")
+
+    monkeypatch.setattr(kds, "_sync_read_only", read_only)
+    monkeypatch.setattr(kds, "get_klines_db_first", db_first)
+    monkeypatch.setattr(kds, "get_redis", _no_redis)
+
+    result = await kds.get_klines_derived("BTCUSDT", "6h", "crypto", limit=5000)
+
+    assert reads == [("BTCUSDT", "crypto", "1h", kds.MAX_DERIVED_BASE_BARS)]
+    assert [c["time"] for c in result] == [i * 6 * 3600 for i in range(8)]
+    assert result[0]["volume"] == 6.0
+
+
+async def test_derived_limit_is_capped_by_base_bars(monkeypatch):
+    monkeypatch.setattr(kds, "_sync_read_only", lambda *args: _hourly(kds.MAX_DERIVED_BASE_BARS))
+    monkeypatch.setattr(kds, "get_redis", _no_redis)
+
+    result = await kds.get_klines_derived("BTCUSDT", "2h", "crypto", limit=50_000)
+
+    assert len(result) <= kds.MAX_DERIVED_BASE_BARS // 2
+
+
+async def test_derived_returns_none_for_empty_db(monkeypatch):
+    monkeypatch.setattr(kds, "_sync_read_only", lambda *args: [])
+    monkeypatch.setattr(kds, "get_redis", _no_redis)
+
+    assert await kds.get_klines_derived("BTCUSDT", "6h", "crypto") is None
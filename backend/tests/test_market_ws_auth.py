@@ -0,0 +1,54 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth.security import create_access_token
+from app.database.connection import get_db
+from app.routers import market_data
+from app.services.websocket_manager import manager
+
+
+def _client(db):
+    app = FastAPI()
+    app.include_router(market_data.router)
+    app.dependency_overrides[get_db] = lambda: db
+    return TestClient(app)
+
+
+def test_mux_treats_a_bad_token_as_anonymous(db):
+    with _client(db).websocket_connect("/market/ws?token=expired.or.forged") as ws:
+        ws.send_json({"action": "subscribe", "channel": "tickers", "watchlistId": 3})
+        assert ws.receive_json() == {
+            "type": "error",
+            "message": "Auth required for watchlist subscription",
+        }
+        # Still open: later requests are answered on the same socket.
+        ws.send_json({"action": "subscribe", "channel": "nope"})
+        assert ws.receive_json() == {"type": "error", "message": "Unknown channel: nope"}
+
+
+def test_mux_treats_an_unknown_user_as_anonymous(db):
+    token = create_access_token(subject="999")
+    with _client(db).websocket_connect(f"/market/ws?token={token}") as ws:
+        ws.send_json({"action": "subscribe", "channel": "tickers", "watchlistId": 1})
+        assert ws.receive_json()["message"] == "Auth required for watchlist subscription"
+
+
+class _FakeRedis:
+    async def publish(self, channel, message):
+        return 0
+
+
+def test_mux_bad_token_falls_back_to_the_watchlist_symbols(db, monkeypatch):
+    monkeypatch.setattr(manager, "redis", _FakeRedis())
+    with _client(db).websocket_connect("/market/ws?token=expired.or.forged") as ws:
+        ws.send_json({
+            "action": "subscribe", "channel": "tickers",
+            "watchlistId": 3, "symbols": ["btcusdt", "ETHUSDT"],
+        })
+        ws.send_json({"action": "subscribe", "channel": "nope"})
+        # No auth error: the first reply is the one for the second message.
+        assert ws.receive_json()["message"] == "Unknown channel: nope"
+
+        (client,) = manager.ticker_subscriptions
+        assert manager.ticker_subscriptions[client] == {"BTCUSDT", "ETHUSDT"}
+    assert not manager.ticker_subscriptions
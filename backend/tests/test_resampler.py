@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from app.services.resampler import (
+    bucket_start,
+    from_candles,
+    next_bucket_start,
+    parse_interval_seconds,
+    resample_count,
+    resample_interval,
+    resample_session_days,
+    to_candles,
+)
+
+
+def _bars(times, step_price=1.0):
+    return [
+        {
+            "time": t,
+            "open": i * step_price,
+            "high": i * step_price + 0.5,
+            "low": i * step_price - 0.5,
+            "close": i * step_price + 0.25,
+            "volume": 1.0,
+        }
+        for i, t in enumerate(times)
+    ]
+
+
+def _ts(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_resample_interval_aggregates_aligned_buckets():
+    out = to_candles(resample_interval(from_candles(_bars(range(0, 600, 60))), "5m"))
+
+    assert [c["time"] for c in out] == [0, 300]
+    first = out[0]
+    assert (first["open"], first["high"], first["low"], first["close"]) == (0.0, 4.5, -0.5, 4.25)
+    assert first["volume"] == 5.0
+
+
+def test_missing_bars_shorten_a_bucket_without_shifting_later_ones():
+    times = [0, 60, 240, 300, 360]
+    out = to_candles(resample_interval(from_candles(_bars(times)), "3m"))
+
+    assert [c["time"] for c in out] == [0, 180, 360]
+    assert [c["volume"] for c in out] == [2.0, 2.0, 1.0]
+
+
+def test_weeks_open_on_monday_and_months_on_the_first():
+    thursday = _ts(2024, 1, 4)
+    assert bucket_start(thursday, "1w") == _ts(2024, 1, 1)
+    assert next_bucket_start(_ts(2024, 1, 1), "1w") == _ts(2024, 1, 8)
+    assert bucket_start(_ts(2024, 2, 29, 12), "1M") == _ts(2024, 2, 1)
+    assert next_bucket_start(_ts(2024, 12, 1), "1M") == _ts(2025, 1, 1)
+
+    days = [_ts(2024, 1, 30), _ts(2024, 1, 31), _ts(2024, 2, 1)]
+    out = to_candles(resample_interval(from_candles(_bars(days)), "1M"))
+    assert [c["time"] for c in out] == [_ts(2024, 1, 1), _ts(2024, 2, 1)]
+
+
+def test_resample_count_keeps_trailing_group():
+    out = to_candles(resample_count(from_candles(_bars(range(0, 300, 60))), 2))
+
+    assert [c["time"] for c in out] == [0, 120, 240]
+    assert out[-1]["volume"] == 1.0
+
+
+def test_session_groups_never_cross_a_local_day():
+    et = ZoneInfo("America/New_York")
+    # 15:00 and 16:00 ET on one day, 09:00 ET the next.
+    times = [_ts(2024, 3, 4, 20), _ts(2024, 3, 4, 21), _ts(2024, 3, 5, 14)]
+    out = to_candles(resample_session_days(from_candles(_bars(times)), 4, et))
+
+    assert [c["time"] for c in out] == [times[0], times[2]]
+
+
+def test_empty_series_passes_through():
+    assert to_candles(resample_interval(from_candles([]), "1h")) == []
+
+
+def test_parse_interval_seconds():
+    assert parse_interval_seconds("2h") == 7200
+    assert parse_interval_seconds("3d") == 3 * 86_400
+    assert parse_interval_seconds("1M") is None
+    assert parse_interval_seconds("0m") is None
@@ -0,0 +1,108 @@
+"""
+Upstream and DB budget of the scheduler on a fake clock, against the fake
+Binance from sim_scheduler and an in-memory SQLite database.
+"""
+import asyncio
+import types
+
+import pytest
+from sqlalchemy import func
+
+import app.services.kline_backfill as kline_backfill
+import app.services.kline_scheduler as ks
+import app.services.scheduler_metrics as scheduler_metrics
+from app.database.models import Kline
+from app.services.scheduler_cluster import SchedulerCluster
+from sim_scheduler import DEFAULT_START, FakeClock, FakeUpstream
+
+SYMBOLS = ["SIM000USDT", "SIM001USDT", "SIM002USDT"]
+LISTED_DAYS = 1
+
+
+@pytest.fixture
+def sim(monkeypatch, session_factory):
+    clock = FakeClock(DEFAULT_START)
+    upstream = FakeUpstream(clock, DEFAULT_START - LISTED_DAYS * 86_400)
+    monkeypatch.setattr(ks, "SessionLocal", session_factory)
+    monkeypatch.setattr(kline_backfill, "SessionLocal", session_factory)
+    monkeypatch.setattr(ks, "time", clock)
+    monkeypatch.setattr(scheduler_metrics, "time", clock)
+    monkeypatch.setattr(
+        ks, "asyncio", types.SimpleNamespace(**{**vars(asyncio), "sleep": clock.sleep}),
+    )
+    monkeypatch.setattr(ks, "fetch_klines_from_api", upstream.fetch_klines)
+    monkeypatch.setattr(kline_backfill, "fetch_klines_from_api", upstream.fetch_klines)
+    monkeypatch.setattr(SchedulerCluster, "ENABLED", False)
+
+    async def no_viewers():
+        return {}
+
+    monkeypatch.setattr(ks.manager, "shared_viewer_counts", no_viewers)
+
+    runs = []
+
+    async def record(summary):
+        runs.append(summary)
+
+    scheduler = ks.KlineScheduler()
+    monkeypatch.setattr(scheduler._metrics, "_publish", record)
+    scheduler._load_superadmin_symbols_sync = lambda: [
+        {"symbol": s, "asset_type": "crypto"} for s in SYMBOLS
+    ]
+
+    async def run_for(seconds):
+        end = clock.now + seconds
+        while clock.now < end:
+            fast_sleep = await scheduler.step()
+            clock.advance(min(fast_sleep, await scheduler.deep_step()))
+        return runs
+
+    return types.SimpleNamespace(
+        clock=clock, upstream=upstream, scheduler=scheduler, run_for=run_for,
+        session_factory=session_factory,
+    )
+
+
+def _row_count(session_factory, interval):
+    db = session_factory()
+    try:
+        return db.query(func.count(Kline.id)).filter(Kline.bar_interval == interval).scalar()
+    finally:
+        db.close()
+
+
+async def test_cold_start_backfills_then_stays_within_budget(sim):
+    runs = await sim.run_for(3600)
+    fast = [r for r in runs if r["kind"] == "fast"]
+    deep = [r for r in runs if r["kind"] == "deep"]
+
+    # Every symbol was new, so deep slices backfilled all of them.
+    assert sorted({s for r in deep for s in r["symbols"]}) == SYMBOLS
+    history_1m = LISTED_DAYS * 1440
+    assert _row_count(sim.session_factory, "1m") >= len(SYMBOLS) * history_1m
+
+    # Each request costs 2 weight units and every run's counters add up.
+    assert all(r["upstream_weight"] == 2 * r["upstream_calls"] for r in runs)
+    assert sum(r["upstream_calls"] for r in runs) == sim.upstream.requests
+
+    # Once warm, a fast cycle costs at most one request per due series and
+    # writes only the newly closed bars and the derived buckets they touch.
+    warm = fast[len(fast) // 2:]
+    assert warm
+    for run in warm:
+        assert run["upstream_calls"] <= run["due"]
+        assert run["rows_written"] <= 8 * run["due"]
+        assert run["duration_s"] < 5
+
+
+async def test_steady_state_request_budget(sim):
+    await sim.run_for(1800)
+    steady_requests = sim.upstream.requests
+
+    runs = await sim.run_for(15 * 60)
+    fast = [r for r in runs if r["kind"] == "fast" and r["started_at"] >= sim.clock.now - 15 * 60]
+
+    # Fifteen minutes of 1m closes for three symbols: about one request per
+    # symbol per minute, plus 15m closes.
+    assert 15 <= len(fast) <= 20
+    assert sim.upstream.requests - steady_requests <= len(SYMBOLS) * 20
@@ -0,0 +1,46 @@
+from app.services import scheduler_cluster
+from app.services.scheduler_cluster import HashRing, SchedulerCluster
+
+KEYS = [f"SYM{i}USDT:crypto" for i in range(2000)]
+
+
+def _owners(ring):
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([], 64).owner("BTCUSDT:crypto") is None
+
+
+def test_owners_are_stable_and_balanced():
+    members = ["a", "b", "c", "d"]
+    owners = _owners(HashRing(members, 64))
+
+    assert owners == _owners(HashRing(list(reversed(members)), 64))
+    counts = {m: list(owners.values()).count(m) for m in members}
+    assert min(counts.values()) > len(KEYS) / len(members) / 2
+
+
+def test_joining_member_moves_only_its_share():
+    before = _owners(HashRing(["a", "b", "c"], 64))
+    after = _owners(HashRing(["a", "b", "c", "d"], 64))
+
+    moved = [k for k in KEYS if before[k] != after[k]]
+    # Only keys taken over by the new member move, about 1/4 of them.
+    assert all(after[k] == "d" for k in moved)
+    assert len(moved) < len(KEYS) / 2
+
+
+async def test_cluster_without_redis_runs_standalone(monkeypatch):
+    class DownRedis:
+        async def zadd(self, *args, **kwargs):
+            raise ConnectionError("redis unavailable")
+
+    monkeypatch.setattr(scheduler_cluster, "get_redis", DownRedis)
+    monkeypatch.setattr(SchedulerCluster, "ENABLED", True)
+    cluster = SchedulerCluster()
+
+    await cluster.heartbeat()
+
+    assert cluster.members == [cluster.instance_id]
+    assert cluster.owns("BTCUSDT", "crypto")
@@ -0,0 +1,57 @@
+import app.services.scheduler_metrics as scheduler_metrics
+from app.services.kline_scheduler import KlineScheduler
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def lrange(self, key, start, end):
+        return []
+
+
+def _replica(instance_id):
+    scheduler = KlineScheduler()
+    scheduler._cluster.instance_id = instance_id
+    scheduler._metrics.instance_id = instance_id
+    return scheduler
+
+
+async def test_api_process_reports_the_scheduler_worker(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(scheduler_metrics, "get_redis", lambda: redis)
+    worker = _replica("worker-1")
+    worker.running = True
+    worker._watched = {("BTCUSDT", "crypto", "1m")}
+    await worker._metrics.publish_status(worker._local_status(), worker._status_ttl())
+
+    status = await _replica("api-1").status()
+
+    assert status["running"] is True
+    assert status["instance_id"] == "worker-1"
+    assert status["watched_series"] == 1
+    assert [s["instance_id"] for s in status["instances"]] == ["worker-1"]
+
+
+async def test_stale_snapshots_are_ignored(monkeypatch):
+    redis = _FakeRedis()
+    monkeypatch.setattr(scheduler_metrics, "get_redis", lambda: redis)
+    worker = _replica("worker-1")
+    worker.running = True
+    snapshot = worker._local_status()
+    snapshot["updated_at"] -= 2 * worker._status_ttl()
+    await worker._metrics.publish_status(snapshot, worker._status_ttl())
+
+    status = await _replica("api-1").status()
+
+    assert status["running"] is False and status["instance_id"] == "api-1"
+    assert status["instances"] == []
@@ -0,0 +1,33 @@
+import socket
+import urllib.request
+
+from app.services.scheduler_metrics import SchedulerMetrics
+from app.workers import scheduler as scheduler_worker
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def test_worker_exposes_scheduler_metrics(monkeypatch):
+    port = _free_port()
+    monkeypatch.setattr(scheduler_worker, "METRICS_PORT", port)
+    metrics = SchedulerMetrics("worker-test")
+
+    async def no_publish(summary):
+        return None
+
+    monkeypatch.setattr(metrics, "_publish", no_publish)
+    async with metrics.cycle("fast", due=1):
+        metrics.upstream_call("binance", 2)
+        metrics.rows_written(5)
+
+    scheduler_worker.start_metrics_server()
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        body = response.read().decode()
+
+    assert 'viewingchart_scheduler_cycle_duration_seconds_count{kind="fast"}' in body
+    assert 'viewingchart_scheduler_upstream_calls_total{source="binance"}' in body
+    assert "viewingchart_scheduler_rows_written_total" in body
@@ -0,0 +1,139 @@
+import json
+import time
+
+from app.services import websocket_manager as wsm
+
+
+class _FakePool:
+    tag = "SPOT"
+
+    def __init__(self):
+        self.streams = set()
+
+    async def subscribe(self, streams):
+        self.streams.update(streams)
+
+    async def unsubscribe(self, streams):
+        self.streams.difference_update(streams)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.published = []
+        self.hashes = {}
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def expire(self, key, seconds):
+        return True
+
+
+def _streamer():
+    mgr = wsm.ConnectionManager()
+    mgr.redis = _FakeRedis()
+    pool = _FakePool()
+    mgr._pools = {"spot": pool, "futures": pool}
+    mgr._spot_syms = {"btcusdt", "ethusdt"}
+    return mgr, pool
+
+
+async def test_lease_replaces_a_workers_streams():
+    mgr, pool = _streamer()
+    await mgr._add_remote_kline_sub("w1", "btcusdt@kline_1m")
+    await mgr._add_remote_kline_sub("w2", "btcusdt@kline_1m")
+    await mgr._add_remote_kline_sub("w1", "ethusdt@kline_1m")
+
+    # w1's unsubscribe for ethusdt was lost; its next lease no longer lists it.
+    await mgr._apply_kline_lease("w1", {"btcusdt@kline_1m", "btcusdt@kline_5m"})
+
+    assert pool.streams == {"btcusdt@kline_1m", "btcusdt@kline_5m"}
+    assert mgr._remote_kline_subs["btcusdt@kline_1m"] == {"w1", "w2"}
+
+
+async def test_silent_workers_lose_their_subscriptions(monkeypatch):
+    mgr, pool = _streamer()
+    now = time.monotonic()
+    await mgr._add_remote_kline_sub("alive", "btcusdt@kline_1m")
+    await mgr._add_remote_kline_sub("crashed", "btcusdt@kline_1m")
+    await mgr._add_remote_kline_sub("crashed", "ethusdt@kline_1m")
+    mgr._remote_ticker_syms["crashed"] = {"DOGEUSDT"}
+    mgr._remote_seen = {
+        "alive": now,
+        "crashed": now - 4 * wsm.SUBSCRIPTION_LEASE_SECONDS,
+        mgr.worker_id: now - 4 * wsm.SUBSCRIPTION_LEASE_SECONDS,
+    }
+    rebuilt = []
+
+    async def rebuild():
+        rebuilt.append(True)
+
+    monkeypatch.setattr(mgr, "_rebuild_ticker_watchlist", rebuild)
+
+    await mgr._expire_remote_workers()
+
+    assert pool.streams == {"btcusdt@kline_1m"}
+    assert mgr._remote_kline_subs == {"btcusdt@kline_1m": {"alive"}}
+    assert "crashed" not in mgr._remote_ticker_syms and rebuilt
+    # This process's own lease is never expired by itself.
+    assert set(mgr._remote_seen) == {"alive", mgr.worker_id}
+
+
+async def test_reannounce_sends_one_lease_message():
+    mgr, _ = _streamer()
+    mgr._stream_refcount = {"ethusdt@kline_1m": 2, "btcusdt@kline_1m": 1}
+
+    await mgr._reannounce_subscriptions()
+
+    channel, message = mgr.redis.published[0]
+    assert channel == "market:cmd_kline_sub"
+    assert wsm.json.loads(message) == {
+        "worker": mgr.worker_id,
+        "lease": True,
+        "streams": ["btcusdt@kline_1m", "ethusdt@kline_1m"],
+    }
+
+
+async def test_rejected_streams_are_retried_by_the_next_request():
+    mgr, pool = _streamer()
+    await mgr._add_remote_kline_sub("w1", "btcusdt@kline_1m")
+    await mgr._update_ticker_streams({"ETHUSDT"}, set())
+
+    mgr._on_upstream_reject("SPOT", ["btcusdt@kline_1m", "ethusdt@ticker"])
+    pool.streams.clear()
+
+    assert "btcusdt@kline_1m" not in mgr.subscribed_streams
+    assert mgr._subscribed_ticker_streams["spot"] == set()
+    await mgr._add_remote_kline_sub("w2", "btcusdt@kline_1m")
+    await mgr._update_ticker_streams({"ETHUSDT"}, set())
+    assert pool.streams == {"btcusdt@kline_1m", "ethusdt@ticker"}
+
+
+async def test_viewer_counts_are_summed_from_one_hash(monkeypatch):
+    mgr, _ = _streamer()
+    mgr.active_connections = {"btcusdt_1m": {object(), object()}, "ethusdt_1h": set()}
+
+    async def stop_after_one_report(seconds):
+        mgr.running = False
+
+    monkeypatch.setattr(wsm.asyncio, "sleep", stop_after_one_report)
+    mgr.running = True
+    await mgr._viewer_report_loop()
+    other = {"ts": time.time(), "counts": {"BTCUSDT:1m": 1, "ETHUSDT:4h": 3}}
+    dead = {"ts": time.time() - 4 * wsm.VIEWER_REPORT_SECONDS, "counts": {"BTCUSDT:1m": 9}}
+    await mgr.redis.hset(wsm._VIEWERS_KEY, "other", json.dumps(other))
+    await mgr.redis.hset(wsm._VIEWERS_KEY, "dead", json.dumps(dead))
+
+    assert await mgr.shared_viewer_counts() == {("BTCUSDT", "1m"): 3, ("ETHUSDT", "4h"): 3}
+    # The dead process's report is dropped from the hash.
+    assert set(mgr.redis.hashes[wsm._VIEWERS_KEY]) == {mgr.worker_id, "other"}
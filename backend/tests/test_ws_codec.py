@@ -0,0 +1,37 @@
+import json
+from types import SimpleNamespace
+
+import msgpack
+
+from app.services.ws_codec import JSON, MSGPACK, encode, negotiate
+
+
+def _socket(*subprotocols):
+    return SimpleNamespace(scope={"subprotocols": list(subprotocols)})
+
+
+def test_json_is_the_default_encoding():
+    assert negotiate(_socket(), None) == (JSON, None)
+
+
+def test_query_param_selects_msgpack_without_a_subprotocol():
+    assert negotiate(_socket(), "MsgPack") == (MSGPACK, None)
+
+
+def test_offered_subprotocol_wins_over_the_query_param():
+    assert negotiate(_socket("other", "msgpack"), "json") == (MSGPACK, MSGPACK)
+
+
+def test_unknown_encoding_is_rejected():
+    assert negotiate(_socket(), "cbor") is None
+
+
+def test_both_encodings_carry_the_same_structure():
+    frame = {"type": "kline", "data": {"time": 60, "close": 1.5, "symbol": "BTCUSDT"}}
+
+    text = encode(frame, JSON)
+    packed = encode(frame, MSGPACK)
+
+    assert isinstance(text, str) and json.loads(text) == frame
+    assert isinstance(packed, bytes) and msgpack.unpackb(packed, raw=False) == frame
+    assert len(packed) < len(text.encode())
@@ -0,0 +1,63 @@
+import json
+import time
+
+from app.services.ws_heartbeat import HeartbeatWheel
+
+
+class _FakeOutbox:
+    def __init__(self, idle_for: float):
+        self.last_sent = time.monotonic() - idle_for
+        self.closed = False
+        self.frames = []
+
+    def put(self, frame, key=None):
+        self.frames.append((key, json.loads(frame)))
+        self.last_sent = time.monotonic()
+
+
+def _tick(wheel, ticks):
+    for _ in range(ticks):
+        wheel._advance()
+
+
+def test_idle_client_gets_one_heartbeat_per_interval():
+    wheel = HeartbeatWheel(interval=3, tick=1)
+    outbox = _FakeOutbox(idle_for=10)
+    wheel._schedule(outbox, wheel.interval)
+
+    _tick(wheel, 2)
+    assert outbox.frames == []
+
+    _tick(wheel, 1)
+    assert [f["type"] for _, f in outbox.frames] == ["heartbeat"]
+    assert outbox.frames[0][0] == ("heartbeat",)
+
+    # Rescheduled a full interval later, not on every tick.
+    outbox.last_sent -= 10
+    _tick(wheel, 2)
+    assert len(outbox.frames) == 1
+    _tick(wheel, 1)
+    assert len(outbox.frames) == 2
+
+
+def test_busy_client_is_reslotted_without_a_heartbeat():
+    wheel = HeartbeatWheel(interval=3, tick=1)
+    outbox = _FakeOutbox(idle_for=0)
+    wheel._schedule(outbox, wheel.interval)
+
+    _tick(wheel, 3)
+
+    assert outbox.frames == []
+    assert sum(slot.count(outbox) for slot in wheel._slots) == 1
+
+
+def test_closed_client_leaves_the_wheel():
+    wheel = HeartbeatWheel(interval=3, tick=1)
+    outbox = _FakeOutbox(idle_for=10)
+    wheel._schedule(outbox, wheel.interval)
+    outbox.closed = True
+
+    _tick(wheel, 3)
+
+    assert outbox.frames == []
+    assert not any(wheel._slots)
@@ -0,0 +1,80 @@
+import asyncio
+
+from app.services.ws_outbox import ClientOutbox
+
+
+class _FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.blocked = asyncio.Event()
+        self.blocked.set()
+
+    async def send_text(self, frame):
+        await self.blocked.wait()
+        self.sent.append(frame)
+
+    async def send_bytes(self, frame):
+        await self.send_text(frame)
+
+
+def _outbox(socket, dropped=None, max_frames=8, stall_seconds=10.0):
+    return ClientOutbox(
+        socket,
+        max_frames=max_frames,
+        stall_seconds=stall_seconds,
+        send_timeout=1.0,
+        on_drop=(dropped.append if dropped is not None else lambda ws: None),
+    )
+
+
+async def _drain():
+    for _ in range(50):
+        await asyncio.sleep(0)
+
+
+async def test_same_key_is_conflated_to_the_latest_frame():
+    socket = _FakeSocket()
+    outbox = _outbox(socket)
+    outbox.put("bar-1", ("kline", "btcusdt_1m", 60))
+    outbox.put("bar-2", ("kline", "btcusdt_1m", 60))
+    outbox.put("control")
+    outbox.put("control")
+
+    await _drain()
+
+    assert socket.sent == ["bar-2", "control", "control"]
+    assert outbox.conflated == 1
+    outbox.close()
+
+
+async def test_replaced_frame_moves_behind_overlapping_keys():
+    socket = _FakeSocket()
+    outbox = _outbox(socket)
+    outbox.put('{"BTC":1,"ETH":1}', ("ticker", "BTC", "ETH"))
+    outbox.put('{"BTC":2}', ("ticker", "BTC"))
+    outbox.put('{"BTC":3,"ETH":3}', ("ticker", "BTC", "ETH"))
+
+    await _drain()
+
+    # The newest BTC price is the last one the client sees.
+    assert socket.sent == ['{"BTC":2}', '{"BTC":3,"ETH":3}']
+    outbox.close()
+
+
+async def test_full_queue_evicts_oldest_then_drops_a_stalled_client():
+    socket = _FakeSocket()
+    socket.blocked.clear()
+    dropped = []
+    outbox = _outbox(socket, dropped, max_frames=2, stall_seconds=0.0)
+    outbox.put("a")
+    await _drain()  # "a" is stuck in send; the queue is empty again
+    outbox.put("b")
+    outbox.put("c")
+    outbox.put("d")
+
+    assert outbox.evicted == 1 and list(outbox._pending.values()) == ["c", "d"]
+
+    await asyncio.sleep(0.01)
+    outbox.put("e")
+
+    assert dropped == [socket] and outbox.closed
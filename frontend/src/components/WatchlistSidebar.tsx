@@ -3,7 +3,7 @@
 import React, { useEffect, useState, useRef, useMemo } from 'react';
 import { PriceHighlight } from './Highlighting';
 import { SymbolDetailPanel } from './SymbolDetailPanel';
-import { API_URL, websocketApiBase } from '@/config';
+import { API_URL } from '@/config';
 import type { KlineData, TickerData, WatchlistItem } from '@/types/market';
 import type { WsStatus } from '@/hooks/useMarketData';
 import { formatCountdownMs, useCountdownMs } from '@/hooks/useCountdown';
@@ -14,9 +14,23 @@ import {
 } from '@/lib/connectionResilience';
 import { buildPrePostSegments, formatPrePostDelta } from '@/lib/prepost';
 import { getAccessToken } from '@/lib/auth';
+import { marketSocket, subscribeTickers, updateTickerRequest, type TickerRequest } from '@/lib/marketSocket';
 import { useResizable } from '@/hooks/useResizable';
 import { ResizeHandle } from '@/components/ResizeHandle';
 
+/**
+ * Ticker subscription for the socket: the selected watchlist when signed in, else its crypto
+ * symbols. The symbols ride along with the watchlist so an expired token still gets prices
+ * (the server falls back to anonymous symbol access).
+ */
+function tickerRequest(watchlistId: number | null, cryptoWatchlist: WatchlistItem[]): TickerRequest {
+    const symbols = cryptoWatchlist.map(i => i.sym);
+    if (getAccessToken() && watchlistId) {
+        return { watchlistId, symbols };
+    }
+    return { symbols };
+}
+
 export interface WatchlistSummary {
     id: number;
     name: string;
@@ -79,7 +93,6 @@ export function WatchlistSidebar({
 }: WatchlistSidebarProps) {
     const [tickers, setTickers] = useState<Record<string, TickerData>>({});
     const [tickerWsStatus, setTickerWsStatus] = useState<WsStatus>('disconnected');
-    const wsRef = useRef<WebSocket | null>(null);
     const selectedWatchlistIdRef = useRef<number | null>(selectedWatchlistId ?? null);
     const [nextStockPollAtMs, setNextStockPollAtMs] = useState<number | null>(null);
     const [stockPollError, setStockPollError] = useState<string | null>(null);
@@ -182,11 +195,9 @@ export function WatchlistSidebar({
         };
     }, [stockWatchlist, cryptoWatchlist]);
 
-    // WebSocket sync for cryptos — Fix #3.4: exponential backoff
+    // WebSocket sync for cryptos (tickers channel of the shared multiplexed socket)
     useEffect(() => {
-        let reconnectTimeout: ReturnType<typeof setTimeout>;
         let isUnmounted = false;
-        let reconnectAttempt = 0;
         /** Any frame including heartbeat (transport alive). */
         let transportTimeout: ReturnType<typeof setTimeout>;
         /** Non-heartbeat quote payload only. */
@@ -211,8 +222,8 @@ export function WatchlistSidebar({
                 console.error(
                     `[Watchlist WS] Transport idle (no frame for ${TRANSPORT_IDLE_TICKER_MS / 1000}s while tab visible). Forcing reconnect...`
                 );
-                if (wsRef.current?.readyState === WebSocket.OPEN) {
-                    wsRef.current.close();
+                if (marketSocket.isOpen()) {
+                    marketSocket.reconnect();
                 }
             }, TRANSPORT_IDLE_TICKER_MS);
         }
@@ -246,21 +257,6 @@ export function WatchlistSidebar({
             }
         }
 
-        function reconnectTickerWsSafely() {
-            if (isUnmounted) return;
-            const w = wsRef.current;
-            if (w) {
-                w.onclose = null;
-                clearTimeout(reconnectTimeout);
-                try {
-                    w.close();
-                } catch {
-                    /* ignore */
-                }
-            }
-            connectWS();
-        }
-
         function onVisibilityChange() {
             if (document.visibilityState === 'hidden') {
                 lastHiddenAt = Date.now();
@@ -274,118 +270,61 @@ export function WatchlistSidebar({
             armMarketStaleWatchdog();
             void refreshPricesFromRest();
             const awayMs = lastHiddenAt ? Date.now() - lastHiddenAt : 0;
-            // Ticker WS can stay OPEN but stop receiving (proxy / server); kline WS still works.
+            // Socket can stay OPEN but stop receiving (proxy / server).
             if (lastHiddenAt && awayMs >= RESYNC_AFTER_HIDDEN_MS) {
-                reconnectTickerWsSafely();
-            } else if (wsRef.current?.readyState === WebSocket.CLOSED && !isUnmounted) {
-                connectWS();
+                marketSocket.reconnect();
+            } else if (!isUnmounted) {
+                marketSocket.ensureConnected();
             }
         }
 
-        function connectWS() {
-            if (isUnmounted) return;
-
-            const wsBase = websocketApiBase();
-            const token = getAccessToken();
-            const url = token
-                ? `${wsBase}/market/ws/tickers?token=${encodeURIComponent(token)}`
-                : `${wsBase}/market/ws/tickers`;
-            const socket = new WebSocket(url);
-            wsRef.current = socket;
-
-            socket.onopen = () => {
-                const hadReconnect = reconnectAttempt > 0;
-                console.info(`[Watchlist WS] Connected successfully to ${wsBase}/market/ws/tickers`);
-                reconnectAttempt = 0;
+        const initialRequest = tickerRequest(selectedWatchlistIdRef.current, cryptoWatchlistRef.current);
+        const unsubscribe = subscribeTickers(initialRequest, {
+            onOpen: (reconnected) => {
                 setTickerWsStatus('connected');
                 armTransportWatchdog();
                 armMarketStaleWatchdog();
-                if (hadReconnect) {
+                if (reconnected) {
                     void refreshPricesFromRest();
                 }
-                const tokenNow = getAccessToken();
-                const wlId = selectedWatchlistIdRef.current;
-                if (tokenNow && wlId) {
-                    socket.send(JSON.stringify({ action: 'subscribe', watchlistId: wlId }));
-                } else {
-                    socket.send(JSON.stringify({
-                        action: 'subscribe',
-                        symbols: cryptoWatchlistRef.current.map(i => i.sym)
-                    }));
-                }
-            };
-
-            socket.onmessage = (event) => {
-                armTransportWatchdog();
-                try {
-                    const payload = JSON.parse(event.data);
-                    if (payload && typeof payload === 'object' && payload.type === 'heartbeat') {
-                        return;
-                    }
-                    if (payload && typeof payload === 'object') {
-                        armMarketStaleWatchdog();
-                        setTickers(prev => ({ ...prev, ...payload }));
-                    }
-                } catch (e) {
-                    console.error('[Watchlist WS] Ticker JSON parsing error', e, 'Raw data:', event.data);
+            },
+            onFrame: armTransportWatchdog,
+            onData: (payload) => {
+                if (payload && typeof payload === 'object') {
+                    armMarketStaleWatchdog();
+                    setTickers(prev => ({ ...prev, ...(payload as Record<string, TickerData>) }));
                 }
-            };
-
-            socket.onerror = (err) => {
-                console.error(`[Watchlist WS] Connection error:`, err);
-            };
-
-            socket.onclose = (event) => {
+            },
+            onClose: (event, willReconnect) => {
                 clearTransportWatchdog();
                 clearMarketStaleWatchdog();
-
-                if (!isUnmounted) {
+                if (willReconnect && !isUnmounted) {
                     setTickerWsStatus('reconnecting');
-                    const delay = Math.min(3000 * Math.pow(2, reconnectAttempt), 30000);
-                    reconnectAttempt++;
                     console.warn(
-                        `[Watchlist WS] Closed with code: ${event.code}, reason: ${event.reason}. Reconnecting in ${delay / 1000}s... (Attempt ${reconnectAttempt})`
+                        `[Watchlist WS] Socket closed with code: ${event.code}, reason: ${event.reason}. Waiting for reconnect...`
                     );
-                    reconnectTimeout = setTimeout(connectWS, delay);
-                } else {
-                    setTickerWsStatus('disconnected');
-                    console.info(`[Watchlist WS] Closed cleanly (component unmounted)`);
                 }
-            };
-        }
+            },
+        });
 
         if (typeof document !== 'undefined') {
             document.addEventListener('visibilitychange', onVisibilityChange);
         }
-        connectWS();
 
         return () => {
             isUnmounted = true;
-            clearTimeout(reconnectTimeout);
             clearTransportWatchdog();
             clearMarketStaleWatchdog();
             if (typeof document !== 'undefined') {
                 document.removeEventListener('visibilitychange', onVisibilityChange);
             }
-            if (wsRef.current) {
-                wsRef.current.onclose = null;
-                wsRef.current.close();
-            }
+            unsubscribe();
+            setTickerWsStatus('disconnected');
         };
     }, []); // Initialize once
 
     useEffect(() => {
-        if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
-            const tokenNow = getAccessToken();
-            if (tokenNow && selectedWatchlistId) {
-                wsRef.current.send(JSON.stringify({ action: 'subscribe', watchlistId: selectedWatchlistId }));
-            } else {
-                wsRef.current.send(JSON.stringify({
-                    action: 'subscribe',
-                    symbols: cryptoWatchlist.map(i => i.sym)
-                }));
-            }
-        }
+        updateTickerRequest(tickerRequest(selectedWatchlistId ?? null, cryptoWatchlist));
     }, [cryptoWatchlist, selectedWatchlistId]);
 
     const watchlistMeta = useMemo(() => {
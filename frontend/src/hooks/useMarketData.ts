@@ -1,12 +1,13 @@
 import useSWR from 'swr';
 import { useEffect, useState, useRef, useCallback } from 'react';
-import { API_URL, websocketApiBase } from '@/config';
+import { API_URL } from '@/config';
 import type { KlineData } from '@/types/market';
 import {
     RESYNC_AFTER_HIDDEN_MS,
     TRANSPORT_IDLE_KLINE_MS,
     klineMarketStaleThresholdMs,
 } from '@/lib/connectionResilience';
+import { marketSocket, subscribeKline } from '@/lib/marketSocket';
 
 export type WsStatus = 'connected' | 'disconnected' | 'reconnecting';
 
@@ -44,16 +45,6 @@ export function useMarketData(
 
     const [realtimeData, setRealtimeData] = useState<KlineData[] | undefined>(undefined);
     const [wsStatus, setWsStatus] = useState<WsStatus>('disconnected');
-    const wsRef = useRef<WebSocket | null>(null);
-
-    // Refs to prevent stale closures in reconnect callbacks
-    const symbolRef = useRef(symbol);
-    const intervalRef = useRef(interval);
-    const assetTypeRef = useRef(assetType);
-
-    useEffect(() => { symbolRef.current = symbol; }, [symbol]);
-    useEffect(() => { intervalRef.current = interval; }, [interval]);
-    useEffect(() => { assetTypeRef.current = assetType; }, [assetType]);
 
     const initialDataRef = useRef<KlineData[]>([]);
     /** Avoid wiping on first mount — that runs after the initialData effect and empties the ref, so WS updates never apply */
@@ -136,18 +127,11 @@ export function useMarketData(
         };
     }, [applyUpdate]);
 
-    // WebSocket logic for Crypto
+    // WebSocket logic for Crypto (one multiplexed socket shared with other charts / the watchlist)
     useEffect(() => {
         if (assetType !== 'crypto' || !symbol) return;
 
-        // Cleanup previous connection
-        if (wsRef.current) {
-            wsRef.current.close();
-        }
-
-        let reconnectTimeout: ReturnType<typeof setTimeout>;
         let cancelled = false;
-        let reconnectAttempt = 0;
         /** Transport: any frame including JSON heartbeat. */
         let transportTimeout: ReturnType<typeof setTimeout>;
         /** Market: last kline payload only (heartbeats do not reset). */
@@ -165,28 +149,28 @@ export function useMarketData(
             clearTimeout(marketStaleTimeout);
         }
 
-        function armTransportWatchdog(currentSymbol: string, currentInterval: string) {
+        function armTransportWatchdog() {
             clearTransportWatchdog();
             if (tabHidden || cancelled) return;
             transportTimeout = setTimeout(() => {
                 if (tabHidden || cancelled) return;
                 console.error(
-                    `[KLINE WS] Transport idle for ${currentSymbol}@${currentInterval} (no frame for ${TRANSPORT_IDLE_KLINE_MS / 1000}s while tab visible). Forcing reconnect...`
+                    `[KLINE WS] Transport idle for ${symbol}@${interval} (no frame for ${TRANSPORT_IDLE_KLINE_MS / 1000}s while tab visible). Forcing reconnect...`
                 );
-                if (wsRef.current?.readyState === WebSocket.OPEN) {
-                    wsRef.current.close();
+                if (marketSocket.isOpen()) {
+                    marketSocket.reconnect();
                 }
             }, TRANSPORT_IDLE_KLINE_MS);
         }
 
-        function armMarketStaleWatchdog(currentSymbol: string, currentInterval: string) {
+        function armMarketStaleWatchdog() {
             clearMarketStaleWatchdog();
             if (tabHidden || cancelled) return;
-            const ms = klineMarketStaleThresholdMs(currentInterval);
+            const ms = klineMarketStaleThresholdMs(interval);
             marketStaleTimeout = setTimeout(() => {
                 if (tabHidden || cancelled) return;
                 console.warn(
-                    `[KLINE WS] Market data stale for ${currentSymbol}@${currentInterval} (no candle for ${ms / 1000}s). REST resync...`
+                    `[KLINE WS] Market data stale for ${symbol}@${interval} (no candle for ${ms / 1000}s). REST resync...`
                 );
                 void mutate();
             }, ms);
@@ -203,92 +187,53 @@ export function useMarketData(
                 if (lastHiddenAt && awayMs >= RESYNC_AFTER_HIDDEN_MS) {
                     void mutate();
                 }
-                armTransportWatchdog(symbolRef.current, intervalRef.current);
-                armMarketStaleWatchdog(symbolRef.current, intervalRef.current);
-                const w = wsRef.current;
-                if (w?.readyState === WebSocket.CLOSED && !cancelled) {
-                    connectWS();
+                armTransportWatchdog();
+                armMarketStaleWatchdog();
+                if (!cancelled) {
+                    marketSocket.ensureConnected();
                 }
             }
         }
 
-        function connectWS() {
-            if (cancelled) return;
-
-            const currentSymbol = symbolRef.current;
-            const currentInterval = intervalRef.current;
-            const currentAssetType = assetTypeRef.current;
-
-            if (currentAssetType !== 'crypto') return;
-
-            const wsBase = websocketApiBase();
-            const ws = new WebSocket(`${wsBase}/market/ws/${currentSymbol}/${currentInterval}`);
-            wsRef.current = ws;
-
-            ws.onopen = () => {
-                console.info(`[KLINE WS] Connected successfully to ${wsBase}/market/ws/${currentSymbol}/${currentInterval}`);
-                if (reconnectAttempt > 0) {
+        const unsubscribe = subscribeKline(symbol, interval, {
+            onOpen: (reconnected) => {
+                if (reconnected) {
                     mutate();
                 }
-                reconnectAttempt = 0;
                 setWsStatus('connected');
-                armTransportWatchdog(currentSymbol, currentInterval);
-                armMarketStaleWatchdog(currentSymbol, currentInterval);
-            };
-
-            ws.onmessage = (event) => {
-                armTransportWatchdog(currentSymbol, currentInterval);
-                try {
-                    const msg = JSON.parse(event.data) as Record<string, unknown>;
-                    if (msg && msg.type === 'heartbeat') {
-                        return;
-                    }
-                    armMarketStaleWatchdog(currentSymbol, currentInterval);
-                    pendingUpdateRef.current = msg as unknown as KlineData;
-                } catch (e) {
-                    console.error(`[KLINE WS] JSON parsing error for ${currentSymbol}@${currentInterval}:`, e, "Raw data:", event.data);
-                }
-            };
-
-            ws.onerror = (err) => {
-                console.error(`[KLINE WS] Connection error for ${currentSymbol}@${currentInterval}:`, err);
-            };
-
-            ws.onclose = (event) => {
+                armTransportWatchdog();
+                armMarketStaleWatchdog();
+            },
+            onFrame: armTransportWatchdog,
+            onData: (data) => {
+                armMarketStaleWatchdog();
+                pendingUpdateRef.current = data as KlineData;
+            },
+            onClose: (event, willReconnect) => {
                 clearTransportWatchdog();
                 clearMarketStaleWatchdog();
-                if (!cancelled) {
+                if (willReconnect && !cancelled) {
                     setWsStatus('reconnecting');
-                    const delay = Math.min(3000 * Math.pow(2, reconnectAttempt), 30000);
-                    reconnectAttempt++;
                     console.warn(
-                        `[KLINE WS] Closed for ${currentSymbol}@${currentInterval} with code: ${event.code}, reason: ${event.reason}. Reconnecting in ${delay / 1000}s... (Attempt ${reconnectAttempt})`
+                        `[KLINE WS] Socket closed for ${symbol}@${interval} with code: ${event.code}, reason: ${event.reason}. Waiting for reconnect...`
                     );
-                    reconnectTimeout = setTimeout(connectWS, delay);
-                } else {
-                    setWsStatus('disconnected');
-                    console.info(`[KLINE WS] Closed cleanly for ${currentSymbol}@${currentInterval} (component unmounted/changed)`);
                 }
-            };
-        }
+            },
+        });
 
         if (typeof document !== 'undefined') {
             document.addEventListener('visibilitychange', onVisibilityChange);
         }
-        connectWS();
 
         return () => {
             cancelled = true;
-            clearTimeout(reconnectTimeout);
             clearTransportWatchdog();
             clearMarketStaleWatchdog();
             if (typeof document !== 'undefined') {
                 document.removeEventListener('visibilitychange', onVisibilityChange);
             }
-            if (wsRef.current) {
-                wsRef.current.onclose = null;
-                wsRef.current.close();
-            }
+            unsubscribe();
+            setWsStatus('disconnected');
         };
     }, [symbol, interval, assetType, mutate]);
 
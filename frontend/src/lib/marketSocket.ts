@@ -0,0 +1,223 @@
+/**
+ * One multiplexed market WebSocket (`/market/ws`) shared by every chart and the watchlist.
+ *
+ * Consumers subscribe to channels (`kline:<SYMBOL>:<interval>`, `tickers`); the socket opens
+ * with the first subscription, closes with the last, reconnects with exponential backoff and
+ * re-sends all subscriptions after each reconnect.
+ */
+import { websocketApiBase } from '@/config';
+import { getAccessToken } from '@/lib/auth';
+
+export const TICKER_CHANNEL = 'tickers';
+
+export function klineChannel(symbol: string, interval: string): string {
+    return `kline:${symbol.toUpperCase()}:${interval}`;
+}
+
+export interface ChannelListener {
+    /** Data payload for this listener's channel. */
+    onData: (data: unknown) => void;
+    /** Any frame on the socket, heartbeats included (transport watchdogs). */
+    onFrame?: () => void;
+    /** Socket (re)opened and subscriptions were sent; `reconnected` is false on the first open. */
+    onOpen?: (reconnected: boolean) => void;
+    /** Socket closed; `willReconnect` is false when no subscriptions remain. */
+    onClose?: (event: CloseEvent, willReconnect: boolean) => void;
+}
+
+/**
+ * Ticker subscription body: a watchlist (authenticated) or explicit symbols. Symbols sent with a
+ * watchlist are the fallback the server uses when the token turns out to be invalid.
+ */
+export type TickerRequest = { watchlistId: number; symbols?: string[] } | { symbols: string[] };
+
+interface ChannelState {
+    listeners: Set<ChannelListener>;
+    /** Subscribe message sent for this channel (without `action`). */
+    request: Record<string, unknown>;
+}
+
+class MarketSocket {
+    private ws: WebSocket | null = null;
+    private channels = new Map<string, ChannelState>();
+    private reconnectAttempt = 0;
+    private reconnectTimeout: ReturnType<typeof setTimeout> | undefined;
+    private hasOpened = false;
+
+    subscribe(channel: string, request: Record<string, unknown>, listener: ChannelListener): () => void {
+        let state = this.channels.get(channel);
+        if (!state) {
+            state = { listeners: new Set(), request };
+            this.channels.set(channel, state);
+            this.send({ action: 'subscribe', ...request });
+        }
+        state.listeners.add(listener);
+        if (this.ws?.readyState === WebSocket.OPEN) {
+            listener.onOpen?.(false);
+        }
+        this.ensureConnected();
+
+        return () => {
+            const current = this.channels.get(channel);
+            if (!current) return;
+            current.listeners.delete(listener);
+            if (current.listeners.size > 0) return;
+            this.channels.delete(channel);
+            this.send({ action: 'unsubscribe', channel: current.request.channel, ...unsubscribeKeys(current.request) });
+            if (this.channels.size === 0) {
+                this.close();
+            }
+        };
+    }
+
+    /** Replace a channel's subscribe message (e.g. watchlist changed) and re-send it. */
+    updateRequest(channel: string, request: Record<string, unknown>): void {
+        const state = this.channels.get(channel);
+        if (!state) return;
+        state.request = request;
+        this.send({ action: 'subscribe', ...request });
+    }
+
+    /** Open the socket now if it is closed and wanted (e.g. tab became visible). */
+    ensureConnected(): void {
+        if (this.channels.size === 0) return;
+        const ws = this.ws;
+        if (ws && (ws.readyState === WebSocket.OPEN || ws.readyState === WebSocket.CONNECTING)) return;
+        clearTimeout(this.reconnectTimeout);
+        this.connect();
+    }
+
+    /** Drop the current socket (e.g. transport watchdog fired) and reconnect immediately. */
+    reconnect(): void {
+        const ws = this.ws;
+        if (ws) {
+            ws.onclose = null;
+            try {
+                ws.close();
+            } catch {
+                /* ignore */
+            }
+            this.ws = null;
+            this.notifyClose(new CloseEvent('close', { code: 4000, reason: 'client reconnect' }), true);
+        }
+        clearTimeout(this.reconnectTimeout);
+        this.connect();
+    }
+
+    isOpen(): boolean {
+        return this.ws?.readyState === WebSocket.OPEN;
+    }
+
+    private connect() {
+        if (this.channels.size === 0) return;
+        const wsBase = websocketApiBase();
+        const token = getAccessToken();
+        const url = token
+            ? `${wsBase}/market/ws?token=${encodeURIComponent(token)}`
+            : `${wsBase}/market/ws`;
+        const ws = new WebSocket(url);
+        this.ws = ws;
+
+        ws.onopen = () => {
+            console.info(`[Market WS] Connected successfully to ${wsBase}/market/ws`);
+            const reconnected = this.hasOpened;
+            this.hasOpened = true;
+            this.reconnectAttempt = 0;
+            for (const state of this.channels.values()) {
+                ws.send(JSON.stringify({ action: 'subscribe', ...state.request }));
+            }
+            for (const state of [...this.channels.values()]) {
+                state.listeners.forEach(l => l.onOpen?.(reconnected));
+            }
+        };
+
+        ws.onmessage = (event) => {
+            let msg: Record<string, unknown>;
+            try {
+                msg = JSON.parse(event.data) as Record<string, unknown>;
+            } catch (e) {
+                console.error('[Market WS] JSON parsing error', e, 'Raw data:', event.data);
+                return;
+            }
+            for (const state of this.channels.values()) {
+                state.listeners.forEach(l => l.onFrame?.());
+            }
+            if (msg.type === 'error') {
+                console.warn('[Market WS] Server error:', msg.message);
+                return;
+            }
+            if (typeof msg.channel !== 'string') return;
+            const state = this.channels.get(msg.channel);
+            state?.listeners.forEach(l => l.onData(msg.data));
+        };
+
+        ws.onerror = (err) => {
+            console.error('[Market WS] Connection error:', err);
+        };
+
+        ws.onclose = (event) => {
+            if (this.ws !== ws) return;
+            this.ws = null;
+            const willReconnect = this.channels.size > 0;
+            this.notifyClose(event, willReconnect);
+            if (!willReconnect) return;
+            const delay = Math.min(3000 * Math.pow(2, this.reconnectAttempt), 30000);
+            this.reconnectAttempt++;
+            console.warn(
+                `[Market WS] Closed with code: ${event.code}, reason: ${event.reason}. Reconnecting in ${delay / 1000}s... (Attempt ${this.reconnectAttempt})`
+            );
+            this.reconnectTimeout = setTimeout(() => this.connect(), delay);
+        };
+    }
+
+    private close() {
+        clearTimeout(this.reconnectTimeout);
+        const ws = this.ws;
+        this.ws = null;
+        this.hasOpened = false;
+        this.reconnectAttempt = 0;
+        if (ws) {
+            ws.onclose = null;
+            ws.close();
+            console.info('[Market WS] Closed cleanly (no subscriptions left)');
+        }
+    }
+
+    private notifyClose(event: CloseEvent, willReconnect: boolean) {
+        for (const state of [...this.channels.values()]) {
+            state.listeners.forEach(l => l.onClose?.(event, willReconnect));
+        }
+    }
+
+    private send(msg: Record<string, unknown>) {
+        if (this.ws?.readyState === WebSocket.OPEN) {
+            this.ws.send(JSON.stringify(msg));
+        }
+    }
+}
+
+/** Keys that identify a subscription in an unsubscribe message. */
+function unsubscribeKeys(request: Record<string, unknown>): Record<string, unknown> {
+    if (request.channel === 'kline') {
+        return { symbol: request.symbol, interval: request.interval };
+    }
+    return {};
+}
+
+export const marketSocket = new MarketSocket();
+
+export function subscribeKline(symbol: string, interval: string, listener: ChannelListener): () => void {
+    return marketSocket.subscribe(
+        klineChannel(symbol, interval),
+        { channel: 'kline', symbol: symbol.toUpperCase(), interval },
+        listener,
+    );
+}
+
+export function subscribeTickers(request: TickerRequest, listener: ChannelListener): () => void {
+    return marketSocket.subscribe(TICKER_CHANNEL, { channel: TICKER_CHANNEL, ...request }, listener);
+}
+
+export function updateTickerRequest(request: TickerRequest): void {
+    marketSocket.updateRequest(TICKER_CHANNEL, { channel: TICKER_CHANNEL, ...request });
+}